@@ -0,0 +1,282 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from database import db, current_engine
+from outbox import outbox_handler
+from borrow_events import APPROVED, RETURNED, backfill_events
+
+ROLLUP_CURSOR = 'lending-rollups'
+
+LENDER = 'lender'
+BORROWER = 'borrower'
+
+# Residents whose apartment number has no building prefix
+DEFAULT_BUILDING = 'main'
+
+# Ids per IN (...) list, well below SQLite's bind parameter limit
+_CHUNK = 500
+
+
+def building_of(apartment_number):
+    """Building code of an apartment: the part before '-' ('B-204' -> 'B')."""
+    if apartment_number and '-' in apartment_number:
+        return apartment_number.split('-', 1)[0]
+    return DEFAULT_BUILDING
+
+
+def _day(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).date()
+
+
+def _chunks(items, size=_CHUNK):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+# ── Incremental maintenance ──
+
+def roll_up_batch(batch_size=5000):
+    """
+    Fold the next batch of logged borrow events into the daily rollups.
+
+    The cursor is advanced with a compare-and-set before anything else is
+    written, so when two processes race for the same batch only one of
+    them counts it; the other gets 0 and its transaction writes nothing.
+    Does not commit.
+
+    Returns:
+        Number of events consumed (0 when the rollups are up to date)
+    """
+    from models import BorrowEvent, RollupCursor
+
+    last_id = db.session.execute(
+        db.select(RollupCursor.last_event_id)
+        .where(RollupCursor.name == ROLLUP_CURSOR)
+    ).scalar()
+
+    rows = db.session.execute(
+        db.select(
+            BorrowEvent.id,
+            BorrowEvent.event,
+            BorrowEvent.occurred_at,
+            BorrowEvent.request_id,
+            BorrowEvent.book_id,
+            BorrowEvent.borrower_id,
+            BorrowEvent.lender_id
+        )
+        .where(BorrowEvent.id > (last_id or 0))
+        .order_by(BorrowEvent.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    if last_id is None:
+        # First run; a concurrent first run fails on the primary key
+        db.session.execute(db.insert(RollupCursor).values(
+            name=ROLLUP_CURSOR, last_event_id=rows[-1].id
+        ))
+    elif not db.session.execute(
+        db.update(RollupCursor).where(
+            RollupCursor.name == ROLLUP_CURSOR,
+            RollupCursor.last_event_id == last_id
+        ).values(last_event_id=rows[-1].id)
+    ).rowcount:
+        return 0
+
+    _apply(rows)
+    return len(rows)
+
+
+def _apply(rows):
+    """Add one batch of events to the rollup tables."""
+    from models import (UserLendingDaily, BuildingLendingDaily,
+                        BookLendingDaily)
+
+    approvals = [row for row in rows if row.event == APPROVED]
+    returns = [row for row in rows if row.event == RETURNED]
+    if not approvals and not returns:
+        return
+
+    lent_at = _approval_times(row.request_id for row in returns)
+    buildings = _buildings(
+        user_id
+        for row in approvals + returns
+        for user_id in (row.lender_id, row.borrower_id)
+    )
+    genres = _genres(row.book_id for row in approvals)
+
+    # key -> [loans, returns, loan_seconds]
+    users = defaultdict(lambda: [0, 0, 0])
+    per_building = defaultdict(lambda: [0, 0, 0])
+    # (day, book_id, building) -> [genre, loans]
+    books = {}
+
+    for row in approvals:
+        day = _day(row.occurred_at)
+        for role, user_id in ((LENDER, row.lender_id),
+                              (BORROWER, row.borrower_id)):
+            users[(user_id, role, day)][0] += 1
+            per_building[(buildings[user_id], role, day)][0] += 1
+        key = (day, row.book_id, buildings[row.borrower_id])
+        books.setdefault(key, [genres.get(row.book_id), 0])[1] += 1
+
+    for row in returns:
+        started = lent_at.get(row.request_id)
+        if started is None:
+            # Approved before the log existed: the loan length is unknown
+            continue
+        day = _day(row.occurred_at)
+        seconds = max(0, row.occurred_at - started)
+        for role, user_id in ((LENDER, row.lender_id),
+                              (BORROWER, row.borrower_id)):
+            for counters in (users[(user_id, role, day)],
+                             per_building[(buildings[user_id], role, day)]):
+                counters[1] += 1
+                counters[2] += seconds
+
+    counters = ('loans', 'returns', 'loan_seconds')
+    _add_counts(UserLendingDaily, ('user_id', 'role', 'day'), counters,
+                users)
+    _add_counts(BuildingLendingDaily, ('building', 'role', 'day'), counters,
+                per_building)
+    _add_counts(
+        BookLendingDaily, ('day', 'book_id', 'building'), ('loans',),
+        {key: [loans] for key, (_genre, loans) in books.items()},
+        extra={key: {'genre': genre}
+               for key, (genre, _loans) in books.items()}
+    )
+
+
+def _add_counts(model, keys, counters, deltas, extra=None):
+    """
+    Add deltas onto rollup rows, creating the rows that do not exist yet.
+
+    One ``INSERT ... ON CONFLICT DO UPDATE`` per batch: the increments are
+    applied by the database, so nothing is read back first.
+
+    Args:
+        model: Rollup model
+        keys: Primary key column names, in the order of the delta keys
+        counters: Counter column names, in the order of the delta values
+        deltas: {primary key tuple: [increment per counter]}
+        extra: Optional {primary key tuple: {column: value}} set on insert
+    """
+    if not deltas:
+        return
+    if current_engine().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = model.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={
+            name: table.c[name] + statement.excluded[name]
+            for name in counters
+        }
+    )
+    rows = []
+    for key, increments in deltas.items():
+        values = dict(zip(keys, key))
+        values.update(zip(counters, increments))
+        values.update((extra or {}).get(key, {}))
+        rows.append(values)
+    db.session.execute(statement, rows)
+
+
+def _approval_times(request_ids):
+    """{request_id: Unix time it was approved} from the event log."""
+    from models import BorrowEvent
+
+    times = {}
+    for chunk in _chunks(set(request_ids)):
+        times.update(db.session.execute(
+            db.select(BorrowEvent.request_id,
+                      db.func.max(BorrowEvent.occurred_at))
+            .where(BorrowEvent.request_id.in_(chunk),
+                   BorrowEvent.event == APPROVED)
+            .group_by(BorrowEvent.request_id)
+        ).all())
+    return times
+
+
+def _buildings(user_ids):
+    """{user_id: building}; deleted users count towards DEFAULT_BUILDING."""
+    from models import User
+
+    user_ids = set(user_ids)
+    buildings = dict.fromkeys(user_ids, DEFAULT_BUILDING)
+    for chunk in _chunks(user_ids):
+        for user_id, apartment_number in db.session.execute(
+            db.select(User.id, User.apartment_number)
+            .where(User.id.in_(chunk))
+        ).all():
+            buildings[user_id] = building_of(apartment_number)
+    return buildings
+
+
+def _genres(book_ids):
+    from models import Book
+
+    genres = {}
+    for chunk in _chunks(set(book_ids)):
+        genres.update(db.session.execute(
+            db.select(Book.id, Book.genre).where(Book.id.in_(chunk))
+        ).all())
+    return genres
+
+
+@outbox_handler('lending_rollup')
+def _roll_up_new_events(payloads):
+    # The payloads only signal that events were logged; the cursor says
+    # which ones are new, so one pass covers the whole group
+    while roll_up_batch():
+        pass
+
+
+# ── Backfill ──
+
+def rebuild_rollups(batch_size=5000, log_history=True):
+    """
+    Recompute every rollup from the event log, committing per batch.
+
+    Args:
+        batch_size: Events folded in per transaction
+        log_history: First log events for requests that predate the log
+
+    Returns:
+        Dictionary with logged (historical events written), events and
+        seconds
+    """
+    from models import (RollupCursor, UserLendingDaily,
+                        BuildingLendingDaily, BookLendingDaily)
+
+    started = time.perf_counter()
+    logged = backfill_events() if log_history else 0
+
+    # Emptying the tables and rewinding the cursor is one transaction, so
+    # a dispatcher rolling up at the same time never double counts
+    for model in (UserLendingDaily, BuildingLendingDaily, BookLendingDaily):
+        db.session.execute(db.delete(model))
+    db.session.execute(
+        db.delete(RollupCursor).where(RollupCursor.name == ROLLUP_CURSOR)
+    )
+    db.session.commit()
+
+    events = 0
+    while True:
+        applied = roll_up_batch(batch_size)
+        db.session.commit()
+        if not applied:
+            break
+        events += applied
+
+    return {
+        'logged': logged,
+        'events': events,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
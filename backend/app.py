@@ -32,23 +32,61 @@ def create_app():
         r"/api/*": {
             "origins": "*",
             "methods": ["GET", "POST", "PUT", "DELETE", "PATCH"],
-            "allow_headers": ["Content-Type", "Authorization"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Tenant"],
         }
     })
 
+    from serializers import init_json
+    init_json(app)
+
     init_db(app)
 
+    from tenancy import init_tenancy, tenancy_enabled, aggregate_stats
+    init_tenancy(app)
+
+    from replicas import init_replicas, read_replica
+    init_replicas(app)
+
+    from commands import register_commands
+    register_commands(app)
+
+    from outbox import init_outbox
+    init_outbox(app)
+
+    from backup import init_backups
+    init_backups(app)
+
+    from reminders import init_reminders
+    init_reminders(app)
+
+    from ratelimit import init_admission_control, init_proxy_fix
+    init_proxy_fix(app)
+    init_admission_control(app)
+
+    from suggestions import init_suggestions
+    init_suggestions(app)
+
     from routes.auth import auth_bp
     from routes.books import books_bp
     from routes.requests import requests_bp
     from routes.notifications import notifications_bp
     from routes.google_books import google_books_bp
+    from routes.batch import batch_bp
+    from routes.dashboard import dashboard_bp
+    from routes.covers import covers_bp
+    from routes.analytics import analytics_bp
+    from routes.admin import admin_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(books_bp, url_prefix='/api/books')
     app.register_blueprint(requests_bp, url_prefix='/api/requests')
     app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
     app.register_blueprint(google_books_bp, url_prefix='/api/google-books')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
+    app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
+    app.register_blueprint(covers_bp, url_prefix='/api/covers')
+    app.register_blueprint(analytics_bp, url_prefix='/api/analytics')
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
 
     @app.route('/api/health')
     def health_check():
@@ -58,7 +96,14 @@ def create_app():
         })
 
     @app.route('/api/stats')
+    @read_replica(max_lag=60)
     def stats():
+        # Across every building, with a per-building breakdown
+        if tenancy_enabled():
+            return jsonify({
+                'status': 'success',
+                'data': aggregate_stats()
+            })
         return jsonify({
             'status': 'success',
             'data': get_db_stats()
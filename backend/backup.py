@@ -0,0 +1,315 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from database import db, current_engine
+from leases import acquire_lease, lease_holder_id
+from tenancy import each_database
+
+BACKUP_LEASE = 'database-backup'
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class BackupError(Exception):
+    """Raised when a backup cannot be taken or fails verification."""
+
+
+class _TooBusy(Exception):
+    """Raised from the progress callback to stop an incremental copy."""
+
+
+def backup_dir():
+    """Where snapshots are kept (BACKUP_DIR, default backend/backups)."""
+    return os.path.abspath(
+        os.environ.get('BACKUP_DIR', os.path.join(BASE_DIR, 'backups'))
+    )
+
+
+def backups_to_keep():
+    """Number of snapshots kept by rotation (BACKUP_KEEP, default 7)."""
+    return int(os.environ.get('BACKUP_KEEP', 7))
+
+
+def database_path():
+    """
+    The live SQLite file being worked on: the primary, or the current
+    building's in multi-building mode. Other databases have their own
+    tooling.
+    """
+    url = current_engine().url
+    if (url.get_backend_name() != 'sqlite' or not url.database
+            or url.database == ':memory:'):
+        raise BackupError('Online backups need a SQLite database file')
+    return os.path.abspath(url.database)
+
+
+def _snapshot_prefix(source):
+    return os.path.splitext(os.path.basename(source))[0] + '-'
+
+
+def list_backups(directory=None):
+    """Snapshot paths in directory, oldest first."""
+    directory = directory or backup_dir()
+    if not os.path.isdir(directory):
+        return []
+    prefix = _snapshot_prefix(database_path())
+    # Names carry a sortable UTC timestamp
+    return [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.startswith(prefix) and name.endswith('.db')
+    ]
+
+
+def copy_database(source, target, pages=256, sleep=0.05, max_restarts=20):
+    """
+    Copy a SQLite database with the online backup API, a few pages at a time.
+
+    In WAL mode (SQLITE_JOURNAL_MODE=wal) the copy reads one pinned
+    snapshot: writers are never blocked and the copy never restarts.
+
+    In rollback-journal mode the source is only locked while a step copies
+    its pages, and sleeping between steps lets writers commit in the gaps.
+    But every such commit makes SQLite restart the copy. After max_restarts
+    of those the rest is copied in one step, so a busy database is still
+    backed up, at the cost of one longer lock.
+
+    Returns:
+        Dictionary with pages, steps, restarts and journal_mode
+    """
+    stats = {'pages': 0, 'steps': 0, 'restarts': 0, 'journal_mode': None}
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal last_remaining
+        stats['pages'] = total
+        stats['steps'] += 1
+        if last_remaining is not None and remaining > last_remaining:
+            stats['restarts'] += 1
+            if stats['restarts'] > max_restarts:
+                raise _TooBusy()
+        last_remaining = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        journal_mode = source_connection.execute(
+            'PRAGMA journal_mode'
+        ).fetchone()[0]
+        stats['journal_mode'] = journal_mode
+        if journal_mode == 'wal':
+            # Holding a read transaction pins the snapshot being copied
+            source_connection.execute('BEGIN')
+            source_connection.execute(
+                'SELECT COUNT(*) FROM sqlite_master'
+            ).fetchone()
+        try:
+            source_connection.backup(target_connection, pages=pages,
+                                     progress=progress)
+        except _TooBusy:
+            source_connection.backup(target_connection)
+            stats['steps'] += 1
+        if journal_mode == 'wal':
+            # Keep the copy a single self-contained file
+            target_connection.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        target_connection.close()
+        source_connection.close()
+    return stats
+
+
+def verify_backup(path):
+    """
+    Rehearse restoring a snapshot and check what comes back.
+
+    The snapshot is restored into a scratch file with the same backup API a
+    real restore would use. The copy must pass ``PRAGMA integrity_check``
+    and contain every table the models define. A file too damaged to read
+    fails the check with SQLite's error as its integrity result.
+
+    Returns:
+        Dictionary with ok, integrity, missing_tables and rows per table
+    """
+    scratch = f'{path}.verify'
+    expected = [table.name for table in db.metadata.sorted_tables]
+    tables = None
+    rows = {}
+    try:
+        copy_database(path, scratch, pages=-1, sleep=0)
+        connection = sqlite3.connect(f'file:{scratch}?mode=ro', uri=True)
+        try:
+            integrity = '; '.join(
+                row[0] for row in
+                connection.execute('PRAGMA integrity_check').fetchall()
+            )
+            tables = {
+                row[0] for row in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'"
+                )
+            }
+            rows = {
+                name: connection.execute(
+                    f'SELECT COUNT(*) FROM "{name}"'
+                ).fetchone()[0]
+                for name in expected if name in tables
+            }
+        finally:
+            connection.close()
+    except sqlite3.DatabaseError as e:
+        # Damage bad enough that SQLite stops reading the file at all
+        integrity = str(e)
+    finally:
+        if os.path.exists(scratch):
+            os.remove(scratch)
+
+    # Unknown when the table list itself could not be read
+    missing = ([name for name in expected if name not in tables]
+               if tables is not None else [])
+    return {
+        'ok': integrity == 'ok' and not missing,
+        'integrity': integrity,
+        'missing_tables': missing,
+        'rows': rows
+    }
+
+
+def rotate_backups(directory=None, keep=None):
+    """
+    Delete all but the newest keep snapshots.
+
+    Returns:
+        List of removed paths
+    """
+    keep = backups_to_keep() if keep is None else keep
+    snapshots = list_backups(directory)
+    removed = snapshots[:-keep] if keep > 0 else snapshots
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup_database(directory=None, pages=256, sleep=0.05, keep=None,
+                    verify=True):
+    """
+    Take a verified, timestamped snapshot of the live database.
+
+    The copy is written to a ``.partial`` file and only renamed into
+    place once it has been verified, so a snapshot in the directory is
+    always complete. Older snapshots are then rotated out.
+
+    Args:
+        directory: Snapshot directory (defaults to backup_dir())
+        pages: Pages copied per step
+        sleep: Seconds to pause between steps
+        keep: Snapshots to keep (defaults to backups_to_keep())
+        verify: Rehearse a restore before accepting the snapshot
+
+    Returns:
+        Dictionary with path, bytes, pages, steps, restarts, seconds,
+        verification and removed
+
+    Raises:
+        BackupError: If the database is not a SQLite file or the snapshot
+            fails verification
+    """
+    source = database_path()
+    directory = directory or backup_dir()
+    os.makedirs(directory, exist_ok=True)
+
+    stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(directory, f'{_snapshot_prefix(source)}{stamp}.db')
+    partial = f'{path}.partial'
+
+    started = time.perf_counter()
+    try:
+        stats = copy_database(source, partial, pages=pages, sleep=sleep)
+        verification = verify_backup(partial) if verify else None
+        if verification and not verification['ok']:
+            raise BackupError(
+                f"Snapshot failed verification: {verification['integrity']}"
+                f"; missing tables: {verification['missing_tables']}"
+            )
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    return {
+        'path': path,
+        'bytes': os.path.getsize(path),
+        **stats,
+        'seconds': round(time.perf_counter() - started, 2),
+        'verification': verification,
+        'removed': rotate_backups(directory, keep)
+    }
+
+
+class BackupScheduler:
+    """
+    Background thread that takes a snapshot every interval.
+
+    Runs in every process, but only the holder of the backup lease copies.
+    A snapshot is due when the newest one in the directory is older than
+    the interval, so restarts and worker changes never cause extra copies.
+    In multi-building mode every building's file is backed up the same
+    way, under its own lease.
+    """
+
+    CHECK_SECONDS = 60
+    # Long enough for the slowest backup; the holder renews it every check
+    LEASE_SECONDS = 3600
+
+    def __init__(self, app, interval_seconds):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._run, name='database-backup', daemon=True
+            ).start()
+
+    def due(self):
+        snapshots = list_backups()
+        return (not snapshots or time.time() - os.path.getmtime(snapshots[-1])
+                >= self.interval_seconds)
+
+    def _run(self):
+        holder = lease_holder_id()
+        while True:
+            for tenant in each_database(self.app):
+                try:
+                    if (acquire_lease(BACKUP_LEASE, holder, self.LEASE_SECONDS)
+                            and self.due()):
+                        result = backup_database()
+                        print(f"💾 Backup written to {result['path']} in "
+                              f"{result['seconds']}s")
+                except Exception as e:
+                    where = f' ({tenant})' if tenant else ''
+                    print(f"❌ Backup error{where}: {str(e)}")
+            time.sleep(min(self.CHECK_SECONDS, self.interval_seconds))
+
+
+def init_backups(app):
+    """
+    Schedule backups every BACKUP_INTERVAL_HOURS, if set.
+
+    Args:
+        app: Flask application instance
+    """
+    hours = float(os.environ.get('BACKUP_INTERVAL_HOURS', 0) or 0)
+    if hours <= 0:
+        return
+    scheduler = BackupScheduler(app, hours * 3600)
+    app.extensions['backup_scheduler'] = scheduler
+    app.before_request(scheduler.ensure_started)
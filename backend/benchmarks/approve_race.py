@@ -0,0 +1,164 @@
+"""
+Concurrency stress test for borrow request approvals.
+
+Creates a scratch database, lists --books books owned by one lender and
+files --contenders pending requests per book from different residents.
+Every approval is then fired at once from a thread pool, and the script
+checks that each book ended up lent to exactly one borrower.
+
+Usage (from the backend directory):
+    python benchmarks/approve_race.py --books 50 --contenders 8 --threads 16
+
+Exits with status 1 if any book has more than one winning approval.
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def create_app_with_scratch_db(path):
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    os.environ.setdefault('OUTBOX_DISPATCHER', 'off')
+    sys.path.insert(0, BACKEND_DIR)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import create_app
+        return create_app()
+
+
+def populate(app, books, contenders):
+    """Insert one lender, the contenders, the books and pending requests."""
+    from database import db
+    from models import User, Book, BorrowRequest
+    from middleware import generate_token
+    from werkzeug.security import generate_password_hash
+
+    with app.app_context():
+        password_hash = generate_password_hash('password123')
+        lender = User(apartment_number='L-1', name='Lender',
+                      password_hash=password_hash)
+        db.session.add(lender)
+        db.session.flush()
+
+        db.session.execute(db.insert(User), [
+            {'apartment_number': f'C-{i}', 'name': f'Contender {i}',
+             'password_hash': password_hash}
+            for i in range(contenders)
+        ])
+        contender_ids = db.session.execute(
+            db.select(User.id).where(User.apartment_number.like('C-%'))
+        ).scalars().all()
+
+        db.session.execute(db.insert(Book), [
+            {'title': f'Race Book {i}', 'author': 'Benchmark',
+             'owner_id': lender.id, 'status': 'available'}
+            for i in range(books)
+        ])
+        book_ids = db.session.execute(
+            db.select(Book.id).where(Book.owner_id == lender.id)
+        ).scalars().all()
+
+        db.session.execute(db.insert(BorrowRequest), [
+            {'book_id': book_id, 'borrower_id': borrower_id,
+             'lender_id': lender.id, 'status': 'pending'}
+            for book_id in book_ids
+            for borrower_id in contender_ids
+        ])
+        request_ids = db.session.execute(
+            db.select(BorrowRequest.id)
+        ).scalars().all()
+        db.session.commit()
+
+        token = generate_token(lender.id)
+
+    return token, request_ids
+
+
+def verify(app):
+    """Return (books_with_one_winner, books_with_several_winners)."""
+    from database import db
+    from models import Book, BorrowRequest
+
+    with app.app_context():
+        winners = Counter(db.session.execute(
+            db.select(BorrowRequest.book_id)
+            .where(BorrowRequest.status == 'approved')
+        ).scalars().all())
+
+        # The book must be lent to the borrower of its winning request
+        mismatched = db.session.execute(
+            db.select(db.func.count()).select_from(Book).join(
+                BorrowRequest, db.and_(
+                    BorrowRequest.book_id == Book.id,
+                    BorrowRequest.status == 'approved'
+                )
+            ).where(Book.borrower_id != BorrowRequest.borrower_id)
+        ).scalar()
+
+    single = sum(1 for count in winners.values() if count == 1)
+    multiple = sum(1 for count in winners.values() if count > 1)
+    return single, multiple, mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=50)
+    parser.add_argument('--contenders', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    scratch.close()
+
+    try:
+        app = create_app_with_scratch_db(scratch.name)
+        token, request_ids = populate(app, args.books, args.contenders)
+        headers = {'Authorization': f'Bearer {token}'}
+
+        # Interleave contenders for the same book as much as possible
+        random.Random(args.seed).shuffle(request_ids)
+
+        def approve(request_id):
+            client = app.test_client()
+            return client.put(
+                f'/api/requests/{request_id}/approve', headers=headers
+            ).status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            statuses = Counter(pool.map(approve, request_ids))
+        elapsed = time.perf_counter() - started
+
+        single, multiple, mismatched = verify(app)
+    finally:
+        os.remove(scratch.name)
+
+    attempts = len(request_ids)
+    print(f'Approval attempts : {attempts} '
+          f'({args.books} books x {args.contenders} contenders, '
+          f'{args.threads} threads)')
+    print(f'Responses         : {dict(sorted(statuses.items()))}')
+    print(f'Elapsed           : {elapsed:.2f}s '
+          f'({attempts / elapsed:.0f} attempts/s)')
+    print(f'Books lent once   : {single}/{args.books}')
+    print(f'Double approvals  : {multiple}')
+    print(f'Borrower mismatch : {mismatched}')
+
+    if multiple or mismatched:
+        print('❌ More than one approval won for the same book')
+        sys.exit(1)
+    print('✅ At most one approval won per book')
+
+
+if __name__ == '__main__':
+    main()
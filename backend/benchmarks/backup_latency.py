@@ -0,0 +1,240 @@
+"""
+Request latency while an online backup runs.
+
+Copies --database to a scratch file and serves it with gunicorn
+(gunicorn.conf.py, gthread profile). Client threads keep sending catalogue
+reads and book updates (--write-share of them). Latency is recorded in
+three phases: --duration seconds without a backup, then a backup in
+--pages page steps with --sleep seconds between them, then the same
+backup in a single step, which holds the read lock for the whole copy.
+
+Writers are what a backup can hold up. In the default rollback-journal
+mode SQLite cannot commit while a backup step holds its read lock, and
+each commit restarts an incremental copy. Run again with
+--journal-mode wal to compare.
+
+Usage (from the backend directory):
+    python benchmarks/backup_latency.py --database /tmp/scale.db \\
+        --clients 8 --duration 10 --pages 256 --sleep 0.05 \\
+        --journal-mode wal
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from backup import copy_database  # noqa: E402
+
+READ_PATHS = ['/api/books?per_page=20', '/api/books/genres',
+              '/api/books/my-books', '/api/notifications/count']
+GENRES = ['Fiction', 'Mystery']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(port, env):
+    env = dict(env, GUNICORN_PROFILE='gthread', PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:application',
+         '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'{base}/api/health', timeout=1).read()
+            return process, base
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError('gunicorn exited early')
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def call(base, path, token=None, method='GET', body=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    request = urllib.request.Request(
+        base + path, method=method, headers=headers,
+        data=json.dumps(body).encode() if body is not None else None
+    )
+    return json.loads(urllib.request.urlopen(request, timeout=60).read())
+
+
+def writable_book(base, token):
+    books = call(base, '/api/books/my-books', token)['data']
+    for book in books:
+        if book['status'] == 'available':
+            return book['id']
+    raise RuntimeError('The benchmark user has no available book to update')
+
+
+class Load:
+    """Client threads that record (kind, seconds, ok) per request."""
+
+    def __init__(self, base, token, book_id, clients, write_share, seed):
+        self.base = base
+        self.token = token
+        self.book_id = book_id
+        self.clients = clients
+        self.write_share = write_share
+        self.seed = seed
+        self.results = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._client, args=(index,))
+            for index in range(self.clients)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        return self.results
+
+    def _client(self, index):
+        rng = random.Random(self.seed + index)
+        local = []
+        while not self._stop.is_set():
+            if rng.random() < self.write_share:
+                kind = 'write'
+                path, method = f'/api/books/{self.book_id}', 'PUT'
+                body = {'genre': rng.choice(GENRES)}
+            else:
+                kind, path, method, body = 'read', rng.choice(READ_PATHS), \
+                    'GET', None
+            started = time.perf_counter()
+            try:
+                call(self.base, path, self.token, method, body)
+                ok = True
+            except (urllib.error.URLError, ConnectionError):
+                ok = False
+            local.append((kind, time.perf_counter() - started, ok))
+        with self._lock:
+            self.results.extend(local)
+
+
+def percentile(values, share):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def report(label, results, seconds):
+    for kind in ('read', 'write'):
+        times = [s for k, s, ok in results if k == kind and ok]
+        errors = sum(1 for k, _, ok in results if k == kind and not ok)
+        print(f'{label:<14}{kind:<7}{len(times) / seconds:>8.1f}'
+              f'{percentile(times, 0.5) * 1000:>8.1f}ms'
+              f'{percentile(times, 0.95) * 1000:>8.1f}ms'
+              f'{percentile(times, 0.99) * 1000:>8.1f}ms'
+              f'{max(times, default=float("nan")) * 1000:>8.0f}ms'
+              f'{errors:>7}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--database', required=True,
+                        help='SQLite file to copy and serve.')
+    parser.add_argument('--apartment', default='101',
+                        help='Resident to log in as (must own a book).')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds of the baseline phase.')
+    parser.add_argument('--write-share', type=float, default=0.2)
+    parser.add_argument('--pages', type=int, default=256)
+    parser.add_argument('--sleep', type=float, default=0.05)
+    parser.add_argument('--journal-mode', choices=['delete', 'wal'],
+                        default='delete')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='backup-latency-')
+    database = os.path.join(scratch, 'bench.db')
+    shutil.copyfile(args.database, database)
+    connection = sqlite3.connect(database)
+    connection.execute(f'PRAGMA journal_mode = {args.journal_mode}')
+    connection.close()
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{database}',
+        RATELIMIT_LOGIN='off',
+        OUTBOX_DISPATCHER='off',
+        BACKUP_INTERVAL_HOURS='0',
+        COVER_CACHE_DIR=os.path.join(scratch, 'covers')
+    )
+
+    process, base = start_gunicorn(free_port(), env)
+    try:
+        token = call(base, '/api/auth/login', body={
+            'apartment_number': args.apartment, 'password': 'password123'
+        }, method='POST')['token']
+        book_id = writable_book(base, token)
+
+        print(f'{args.clients} clients, {args.write_share:.0%} writes, '
+              f'{os.path.getsize(database) / 1e6:.0f} MB database, '
+              f'journal mode {args.journal_mode}')
+        print(f"{'phase':<14}{'kind':<7}{'req/s':>8}{'p50':>10}{'p95':>10}"
+              f"{'p99':>10}{'max':>10}{'errors':>7}")
+
+        phases = [
+            ('baseline', None),
+            (f'{args.pages}p/{args.sleep:g}s', (args.pages, args.sleep)),
+            ('one step', (-1, 0)),
+        ]
+        for label, backup in phases:
+            load = Load(base, token, book_id, args.clients,
+                        args.write_share, args.seed)
+            started = time.perf_counter()
+            load.start()
+            if backup is None:
+                time.sleep(args.duration)
+            else:
+                stats = copy_database(
+                    database, os.path.join(scratch, 'snapshot.db'),
+                    pages=backup[0], sleep=backup[1]
+                )
+                os.remove(os.path.join(scratch, 'snapshot.db'))
+            results = load.stop()
+            seconds = time.perf_counter() - started
+            report(label, results, seconds)
+            if backup is not None:
+                print(f"{'':<14}backup {seconds:.2f}s, {stats['steps']} "
+                      f"steps, {stats['restarts']} restarts")
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
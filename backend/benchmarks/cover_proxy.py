@@ -0,0 +1,139 @@
+"""
+Cover proxy check against a local stub image server.
+
+Starts an HTTP server on 127.0.0.1 that serves a generated PNG, points
+every book in a scratch database at it and requests each cover through
+/api/covers twice. The first pass fills the disk cache; the second must
+be served without touching the stub, and a conditional request must get
+a 304.
+
+Usage (from the backend directory):
+    python benchmarks/cover_proxy.py --books 200 --size thumb
+
+Exits with status 1 if the cache misses on the second pass.
+"""
+import argparse
+import contextlib
+import http.server
+import io
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_png(width, height, rgb=(200, 60, 40)):
+    """Build an uncompressed-pixel PNG without any imaging library."""
+    row = b'\x00' + bytes(rgb) * width
+    raw = row * height
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data)))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(raw)) + chunk(b'IEND', b''))
+
+
+def start_stub_server(image):
+    hits = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+            self.send_header('Content-Length', str(len(image)))
+            self.end_headers()
+            self.wfile.write(image)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, hits
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--size', default='thumb')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='covers-')
+    server, hits = start_stub_server(make_png(400, 600))
+    port = server.server_address[1]
+
+    os.environ['SQLALCHEMY_DATABASE_URI'] = \
+        f'sqlite:///{os.path.join(workdir, "covers.db")}'
+    os.environ['COVER_CACHE_DIR'] = os.path.join(workdir, 'cache')
+    os.environ['COVER_ALLOWED_PRIVATE_HOSTS'] = '127.0.0.1'
+    os.environ.setdefault('OUTBOX_DISPATCHER', 'off')
+    sys.path.insert(0, BACKEND_DIR)
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            from app import create_app
+            app = create_app()
+
+        from database import db
+        from models import Book, User
+
+        with app.app_context():
+            owner_id = db.session.execute(db.select(User.id)).scalars().first()
+            # A few distinct source URLs shared by many books
+            db.session.execute(db.insert(Book), [
+                {'title': f'Cover Book {i}', 'author': 'Benchmark',
+                 'owner_id': owner_id, 'status': 'available',
+                 'cover_image': f'http://127.0.0.1:{port}/cover{i % 10}.png'}
+                for i in range(args.books)
+            ])
+            db.session.commit()
+            book_ids = db.session.execute(
+                db.select(Book.id).where(Book.author == 'Benchmark')
+            ).scalars().all()
+
+        client = app.test_client()
+
+        def run_pass():
+            started = time.perf_counter()
+            etags = [
+                client.get(f'/api/covers/{book_id}?size={args.size}')
+                .headers.get('ETag')
+                for book_id in book_ids
+            ]
+            return time.perf_counter() - started, etags
+
+        cold, etags = run_pass()
+        cold_hits = len(hits)
+        warm, _ = run_pass()
+        warm_hits = len(hits) - cold_hits
+        revalidated = client.get(
+            f'/api/covers/{book_ids[0]}?size={args.size}',
+            headers={'If-None-Match': etags[0]}
+        ).status_code
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f'Covers requested  : {len(book_ids)} per pass (size={args.size})')
+    print(f'Cold pass         : {cold:.2f}s, {cold_hits} upstream fetches')
+    print(f'Warm pass         : {warm:.2f}s, {warm_hits} upstream fetches')
+    print(f'Conditional GET   : {revalidated}')
+
+    if warm_hits or revalidated != 304:
+        print('❌ Cover cache did not absorb repeat requests')
+        sys.exit(1)
+    print('✅ Repeat requests served from the disk cache')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Mixed-workload throughput of the gunicorn worker profiles.
+
+Starts gunicorn with gunicorn.conf.py once per profile, against a scratch
+database and a local stub standing in for Google Books that answers after
+--upstream-delay seconds. Client threads then send a mix of slow
+/api/google-books/search calls (--slow-share of them) and fast catalogue
+reads for --duration seconds.
+
+With sync workers a slow call blocks a whole process, so fast requests
+queue behind it; with gthread workers only one thread waits.
+
+Usage (from the backend directory):
+    python benchmarks/worker_profiles.py --profiles sync,gthread \\
+        --clients 16 --duration 10
+"""
+import argparse
+import http.server
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FAST_PATHS = ['/api/books?per_page=20', '/api/books/genres',
+              '/api/books/my-books', '/api/notifications/count']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_upstream(delay):
+    """A fake volumes API that takes delay seconds to answer."""
+    body = json.dumps({'totalItems': 0, 'items': []}).encode()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_gunicorn(profile, port, env):
+    env = dict(env, GUNICORN_PROFILE=profile, PORT=str(port))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:application',
+         '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}'],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(f'{base}/api/health', timeout=1).read()
+            return process, base
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError(f'gunicorn ({profile}) exited early')
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'gunicorn ({profile}) did not start')
+
+
+def login(base):
+    request = urllib.request.Request(
+        f'{base}/api/auth/login',
+        data=json.dumps({'apartment_number': '101',
+                         'password': 'password123'}).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    return json.loads(urllib.request.urlopen(request).read())['token']
+
+
+def run_load(base, token, clients, duration, slow_share, seed):
+    results = []  # (kind, seconds, ok)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        headers = {'Authorization': f'Bearer {token}'}
+        local = []
+        while time.monotonic() < stop_at:
+            if rng.random() < slow_share:
+                kind = 'slow'
+                path = f'/api/google-books/search?q=dune{rng.randint(0, 999)}'
+            else:
+                kind = 'fast'
+                path = rng.choice(FAST_PATHS)
+            started = time.perf_counter()
+            try:
+                urllib.request.urlopen(
+                    urllib.request.Request(base + path, headers=headers),
+                    timeout=60
+                ).read()
+                ok = True
+            except (urllib.error.URLError, ConnectionError):
+                ok = False
+            local.append((kind, time.perf_counter() - started, ok))
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def percentile(values, share):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--profiles', default='sync,gthread')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--slow-share', type=float, default=0.1,
+                        help='Share of requests that call Google Books.')
+    parser.add_argument('--upstream-delay', type=float, default=1.0,
+                        help='Seconds the stub upstream takes to answer.')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='worker-profiles-')
+    upstream = start_stub_upstream(args.upstream_delay)
+    env = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{scratch}/bench.db',
+        GOOGLE_BOOKS_API_URL=(
+            f'http://127.0.0.1:{upstream.server_address[1]}/volumes'
+        ),
+        RATELIMIT_GOOGLE_BOOKS='off',
+        RATELIMIT_LOGIN='off',
+        OUTBOX_DISPATCHER='off',
+        COVER_CACHE_DIR=os.path.join(scratch, 'covers')
+    )
+
+    print(f'{args.clients} clients, {args.duration:g}s, '
+          f'{args.slow_share:.0%} slow calls of {args.upstream_delay:g}s, '
+          f'{os.cpu_count()} cores')
+    print(f"{'profile':<10}{'req/s':>8}{'fast p50':>10}{'fast p95':>10}"
+          f"{'slow p50':>10}{'errors':>8}")
+    try:
+        for profile in args.profiles.split(','):
+            process, base = start_gunicorn(profile, free_port(), env)
+            try:
+                token = login(base)
+                results = run_load(base, token, args.clients, args.duration,
+                                   args.slow_share, args.seed)
+            finally:
+                process.send_signal(signal.SIGTERM)
+                process.wait(timeout=30)
+
+            fast = [s for kind, s, ok in results if kind == 'fast' and ok]
+            slow = [s for kind, s, ok in results if kind == 'slow' and ok]
+            errors = sum(1 for _, _, ok in results if not ok)
+            print(f'{profile:<10}{len(results) / args.duration:>8.1f}'
+                  f'{percentile(fast, 0.5) * 1000:>8.0f}ms'
+                  f'{percentile(fast, 0.95) * 1000:>8.0f}ms'
+                  f'{percentile(slow, 0.5) * 1000:>8.0f}ms'
+                  f'{errors:>8}')
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
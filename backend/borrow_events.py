@@ -0,0 +1,282 @@
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from outbox import enqueue
+
+# Event codes stored in BorrowEvent.event. Never renumber these; existing
+# rows refer to them.
+REQUESTED = 1
+APPROVED = 2
+REJECTED = 3
+CANCELLED = 4
+RETURNED = 5
+WAITLISTED = 6
+PROMOTED = 7
+
+EVENT_NAMES = {
+    REQUESTED: 'requested',
+    APPROVED: 'approved',
+    REJECTED: 'rejected',
+    CANCELLED: 'cancelled',
+    RETURNED: 'returned',
+    WAITLISTED: 'waitlisted',
+    PROMOTED: 'promoted',
+}
+
+# Events that change the daily lending rollups (see analytics)
+ROLLUP_EVENTS = (APPROVED, RETURNED)
+
+_PENDING_KEY = 'borrow_events'
+
+
+def record_event(event_code, borrow_request, actor_id=None, **overrides):
+    """
+    Buffer one lifecycle event for the current transaction.
+
+    Events are held in the session and appended with a single INSERT just
+    before the transaction commits, so a request that logs several events
+    (an approval that queues the competing requests) writes them in one
+    batch, and a rollback discards them together with the state change.
+
+    Args:
+        event_code: One of the codes above
+        borrow_request: The BorrowRequest the event is about
+        actor_id: User who caused it, None for the system
+        **overrides: Column values to use instead of the request's own,
+            e.g. request_id and borrower_id for rows updated in bulk
+    """
+    row = {
+        'event': event_code,
+        'occurred_at': int(time.time()),
+        'request_id': borrow_request.id,
+        'book_id': borrow_request.book_id,
+        'borrower_id': borrow_request.borrower_id,
+        'lender_id': borrow_request.lender_id,
+        'actor_id': actor_id,
+    }
+    row.update(overrides)
+    db.session.info.setdefault(_PENDING_KEY, []).append(row)
+    if event_code in ROLLUP_EVENTS:
+        # Wakes the rollups once this commits; they read the log itself
+        enqueue('lending_rollup', [{'request_id': row['request_id'],
+                                    'event': event_code}])
+
+
+@event.listens_for(Session, 'before_commit')
+def _append_pending(session):
+    from models import BorrowEvent
+
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.execute(db.insert(BorrowEvent), pending)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# ── Replay ──
+
+class BorrowAggregates:
+    """
+    Aggregates rebuilt purely from the event log.
+
+    Feed events in log order with apply(); to_dict() summarizes them.
+    Only requests still open (requested but not answered, lent but not
+    returned) are held in memory, so replaying a long log stays cheap.
+    """
+
+    def __init__(self):
+        self.events = 0
+        self.last_id = 0
+        self.totals = Counter()
+        self.daily = defaultdict(Counter)
+        self.loans_by_book = Counter()
+        self.loans_by_borrower = Counter()
+        self.loans_by_lender = Counter()
+        self._asked_at = {}
+        self._lent_at = {}
+        self.response_seconds = []
+        self.loan_seconds = []
+
+    def apply(self, row):
+        """row is (id, event, occurred_at, request_id, book_id,
+        borrower_id, lender_id, actor_id)."""
+        (event_id, code, at, request_id, book_id,
+         borrower_id, lender_id, _actor_id) = row
+        self.events += 1
+        self.last_id = event_id
+        name = EVENT_NAMES.get(code, str(code))
+        self.totals[name] += 1
+        day = datetime.fromtimestamp(at, timezone.utc).date().isoformat()
+        self.daily[day][name] += 1
+
+        if code in (REQUESTED, PROMOTED):
+            # A promoted request reaches the lender only now
+            self._asked_at[request_id] = at
+        elif code in (APPROVED, REJECTED, CANCELLED):
+            asked_at = self._asked_at.pop(request_id, None)
+            if asked_at is not None and code != CANCELLED:
+                self.response_seconds.append(at - asked_at)
+            if code == APPROVED:
+                self._lent_at[request_id] = at
+                self.loans_by_book[book_id] += 1
+                self.loans_by_borrower[borrower_id] += 1
+                self.loans_by_lender[lender_id] += 1
+        elif code == RETURNED:
+            lent_at = self._lent_at.pop(request_id, None)
+            if lent_at is not None:
+                self.loan_seconds.append(at - lent_at)
+
+    def to_dict(self, top=10):
+        answered = self.totals['approved'] + self.totals['rejected']
+        return {
+            'events': self.events,
+            'last_event_id': self.last_id,
+            'totals': dict(self.totals),
+            'approval_rate': (
+                round(self.totals['approved'] / answered, 4)
+                if answered else None
+            ),
+            'avg_response_hours': _average_hours(self.response_seconds),
+            'avg_loan_days': (
+                round(_average_hours(self.loan_seconds) / 24, 2)
+                if self.loan_seconds else None
+            ),
+            'open_requests': len(self._asked_at),
+            'open_loans': len(self._lent_at),
+            'top_books': self.loans_by_book.most_common(top),
+            'top_borrowers': self.loans_by_borrower.most_common(top),
+            'top_lenders': self.loans_by_lender.most_common(top),
+            'daily': {day: dict(counts)
+                      for day, counts in sorted(self.daily.items())},
+        }
+
+
+def _average_hours(seconds):
+    if not seconds:
+        return None
+    return round(sum(seconds) / len(seconds) / 3600, 2)
+
+
+def iter_events(since_id=0, batch_size=10000):
+    """
+    Yield event rows in log order, reading only borrow_events.
+
+    Walks the primary key in batches, so memory stays flat and the live
+    borrowing tables are never touched.
+    """
+    from models import BorrowEvent
+
+    columns = (BorrowEvent.id, BorrowEvent.event, BorrowEvent.occurred_at,
+               BorrowEvent.request_id, BorrowEvent.book_id,
+               BorrowEvent.borrower_id, BorrowEvent.lender_id,
+               BorrowEvent.actor_id)
+    last_id = since_id
+    while True:
+        rows = db.session.execute(
+            db.select(*columns)
+            .where(BorrowEvent.id > last_id)
+            .order_by(BorrowEvent.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def replay(since_id=0, batch_size=10000):
+    """
+    Rebuild the borrowing aggregates from the event log.
+
+    Returns:
+        A BorrowAggregates with every event after since_id applied
+    """
+    aggregates = BorrowAggregates()
+    for row in iter_events(since_id, batch_size):
+        aggregates.apply(row)
+    return aggregates
+
+
+# ── Backfill ──
+
+def backfill_events(batch_size=5000):
+    """
+    Synthesize events for borrow requests made before the log existed.
+
+    Only requests without any logged event are considered; their stored
+    timestamps stand in for the transitions (requested_at, responded_at,
+    returned_at). Run once after upgrading.
+
+    Returns:
+        Number of events written
+    """
+    from models import BorrowRequest, BorrowEvent
+
+    answered = {'approved': APPROVED, 'returned': APPROVED,
+                'rejected': REJECTED, 'cancelled': CANCELLED}
+    logged = set(db.session.execute(
+        db.select(BorrowEvent.request_id).distinct()
+    ).scalars())
+
+    written = 0
+    last_id = 0
+    while True:
+        requests = db.session.execute(
+            db.select(BorrowRequest)
+            .where(BorrowRequest.id > last_id)
+            .order_by(BorrowRequest.id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not requests:
+            return written
+        last_id = requests[-1].id
+
+        rows = []
+        for borrow_request in requests:
+            if borrow_request.id not in logged:
+                rows.extend(_history_events(borrow_request, answered))
+
+        if rows:
+            rows.sort(key=lambda row: row[1])
+            db.session.connection().exec_driver_sql(
+                'INSERT INTO borrow_events (event, occurred_at, request_id, '
+                'book_id, borrower_id, lender_id, actor_id) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            db.session.commit()
+            written += len(rows)
+
+
+def _history_events(borrow_request, answered):
+    """Event tuples implied by one request's stored state."""
+    r = borrow_request
+    steps = []
+    if r.status == 'waitlisted':
+        steps.append((WAITLISTED, r.requested_at, r.borrower_id))
+    else:
+        steps.append((REQUESTED, r.requested_at, r.borrower_id))
+        code = answered.get(r.status)
+        if code is not None:
+            actor_id = r.borrower_id if code == CANCELLED else r.lender_id
+            steps.append((code, r.responded_at, actor_id))
+        if r.status == 'returned':
+            steps.append((RETURNED, r.returned_at, r.borrower_id))
+
+    return [
+        (code, _unix(when), r.id, r.book_id, r.borrower_id, r.lender_id,
+         actor_id)
+        for code, when, actor_id in steps
+        if when is not None
+    ]
+
+
+def _unix(value):
+    # Stored datetimes are naive UTC
+    return int(value.replace(tzinfo=timezone.utc).timestamp())
@@ -0,0 +1,478 @@
+import functools
+import click
+
+
+def register_commands(app):
+    """
+    Attach the maintenance commands to the Flask CLI.
+
+    Run them from the backend directory, e.g.
+    ``flask --app app:application seed-scale --users 10000``.
+
+    Args:
+        app: Flask application instance
+    """
+    app.cli.add_command(seed_scale_command)
+    app.cli.add_command(outbox_dispatch_command)
+    app.cli.add_command(prune_notifications_command)
+    app.cli.add_command(rebuild_recommendations_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(find_duplicates_command)
+    app.cli.add_command(replica_status_command)
+    app.cli.add_command(replay_borrow_events_command)
+    app.cli.add_command(backfill_analytics_command)
+    app.cli.add_command(export_data_command)
+    app.cli.add_command(backup_database_command)
+    app.cli.add_command(verify_backup_command)
+    app.cli.add_command(send_due_reminders_command)
+    app.cli.add_command(create_tenant_command)
+    app.cli.add_command(list_tenants_command)
+
+
+def tenant_option(command):
+    """Add --tenant, running the command on one building's database."""
+    @click.option('--tenant', default=None,
+                  help='Building to work on (multi-building mode).')
+    @functools.wraps(command)
+    def wrapper(*args, tenant=None, **kwargs):
+        if tenant:
+            from tenancy import UnknownTenant, use_tenant
+            try:
+                use_tenant(tenant)
+            except UnknownTenant:
+                raise click.ClickException(f'Unknown building: {tenant}')
+        return command(*args, **kwargs)
+
+    return wrapper
+
+
+@click.command('seed-scale')
+@tenant_option
+@click.option('--users', default=1000, show_default=True,
+              help='Number of users to generate.')
+@click.option('--books', default=5000, show_default=True,
+              help='Number of books to generate.')
+@click.option('--requests', 'requests_count', default=20000,
+              show_default=True, help='Number of borrow requests to generate.')
+@click.option('--notifications', default=50000, show_default=True,
+              help='Number of notifications to generate.')
+@click.option('--buildings', default=10, show_default=True,
+              help='Number of buildings to spread users across.')
+@click.option('--seed', default=42, show_default=True,
+              help='Random seed; the same seed reproduces the same data.')
+@click.option('--batch-size', default=10000, show_default=True,
+              help='Rows per bulk insert.')
+def seed_scale_command(users, books, requests_count, notifications,
+                       buildings, seed, batch_size):
+    """Generate a large, reproducible dataset with bulk inserts."""
+    from scale_data import generate_scale_data
+
+    click.echo('🌱 Generating scale data...')
+    result = generate_scale_data(
+        users=users,
+        books=books,
+        requests=requests_count,
+        notifications=notifications,
+        buildings=buildings,
+        seed=seed,
+        batch_size=batch_size
+    )
+    click.echo(
+        f"✅ Inserted {result['users']} users, {result['books']} books, "
+        f"{result['requests']} requests ({result['waitlisted']} on "
+        f"waitlists) and {result['notifications']} notifications in "
+        f"{result['seconds']}s."
+    )
+
+    # Bulk inserts bypass the ORM listeners that maintain the search index
+    from search_index import rebuild_search_index
+    indexed = rebuild_search_index()
+    click.echo(
+        f"✅ Indexed {indexed['books']} books for search in "
+        f"{indexed['seconds']}s."
+    )
+
+    # ...and the borrow event log the lending rollups are built from
+    from analytics import rebuild_rollups
+    rolled_up = rebuild_rollups()
+    click.echo(
+        f"✅ Logged {rolled_up['logged']} borrow events and rolled them up "
+        f"in {rolled_up['seconds']}s."
+    )
+
+
+@click.command('outbox-dispatch')
+@click.option('--once', is_flag=True,
+              help='Drain the outbox once and exit instead of polling.')
+@click.option('--interval', default=1.0, show_default=True,
+              help='Seconds to sleep between polls.')
+@click.option('--batch-size', default=100, show_default=True,
+              help='Events delivered per transaction.')
+def outbox_dispatch_command(once, interval, batch_size):
+    """Deliver queued outbox events from a standalone process."""
+    import time
+    from flask import current_app
+    from leases import lease_holder_id
+    from outbox import dispatch_with_lease
+    from tenancy import each_database
+
+    app = current_app._get_current_object()
+    holder = lease_holder_id()
+    click.echo(f'📬 Outbox dispatcher started ({holder})')
+    while True:
+        for tenant in each_database(app):
+            delivered = dispatch_with_lease(holder, batch_size)
+            if delivered:
+                where = f' for {tenant}' if tenant else ''
+                click.echo(f'✅ Delivered {delivered} events{where}.')
+        if once:
+            break
+        time.sleep(interval)
+
+
+@click.command('prune-notifications')
+@tenant_option
+@click.option('--max-age-days', type=int, default=None,
+              help='Remove notifications older than this many days.')
+@click.option('--keep-per-user', type=int, default=None,
+              help="Keep only each user's newest N notifications.")
+@click.option('--only-read', is_flag=True,
+              help='Never remove unread notifications.')
+@click.option('--archive', is_flag=True,
+              help='Copy removed rows to notifications_archive first.')
+@click.option('--batch-size', default=500, show_default=True,
+              help='Rows removed per transaction.')
+@click.option('--pause', default=0.05, show_default=True,
+              help='Seconds to sleep between batches.')
+def prune_notifications_command(max_age_days, keep_per_user, only_read,
+                                archive, batch_size, pause):
+    """Apply the notification retention policy in small batches."""
+    from retention import prune_notifications, retention_policy_from_env
+
+    policy = retention_policy_from_env()
+    if max_age_days is None:
+        max_age_days = policy['max_age_days']
+    if keep_per_user is None:
+        keep_per_user = policy['keep_per_user']
+
+    if max_age_days is None and keep_per_user is None:
+        raise click.UsageError(
+            'Set --max-age-days and/or --keep-per-user (or the '
+            'NOTIFICATION_RETENTION_DAYS / NOTIFICATION_KEEP_PER_USER '
+            'environment variables).'
+        )
+
+    click.echo('🧹 Pruning notifications...')
+    result = prune_notifications(
+        max_age_days=max_age_days,
+        keep_per_user=keep_per_user,
+        only_read=only_read,
+        archive=archive,
+        batch_size=batch_size,
+        pause=pause
+    )
+    click.echo(
+        f"✅ Removed {result['removed']} notifications "
+        f"({result['archived']} archived) in {result['batches']} batches "
+        f"over {result['seconds']}s."
+    )
+
+
+@click.command('rebuild-recommendations')
+@tenant_option
+@click.option('--top-k', type=int, default=None,
+              help='Similar books kept per book '
+                   '(default: RECOMMENDATION_NEIGHBORS or 20).')
+def rebuild_recommendations_command(top_k):
+    """Recompute the co-borrowing matrix and similar-book lists."""
+    from recommendations import rebuild_recommendations
+
+    click.echo('📚 Rebuilding recommendations...')
+    result = rebuild_recommendations(top_k=top_k)
+    click.echo(
+        f"✅ {result['pairs']} borrower/book pairs -> {result['cells']} "
+        f"matrix cells for {result['books']} books in {result['seconds']}s."
+    )
+
+
+@click.command('rebuild-search-index')
+@tenant_option
+def rebuild_search_index_command():
+    """Recreate the trigram index used by fuzzy book search."""
+    from search_index import rebuild_search_index
+
+    click.echo('🔎 Rebuilding book search index...')
+    result = rebuild_search_index()
+    click.echo(
+        f"✅ Indexed {result['books']} books ({result['trigrams']} "
+        f"trigrams) in {result['seconds']}s."
+    )
+
+
+@click.command('find-duplicates')
+@tenant_option
+@click.option('--batch-size', default=1000, show_default=True,
+              help='Books fingerprinted / duplicate keys read per batch.')
+@click.option('--output', type=click.File('w'), default='-',
+              show_default=True,
+              help='Where to write the report (JSON lines).')
+def find_duplicates_command(batch_size, output):
+    """Report books listed more than once (same fingerprint or ISBN)."""
+    import json
+    from duplicates import backfill_fingerprints, find_duplicates
+
+    filled = backfill_fingerprints(batch_size=batch_size)
+    if filled:
+        click.echo(f'🔧 Fingerprinted {filled} books.', err=True)
+
+    groups = books = same_owner = 0
+    for group in find_duplicates(batch_size=batch_size):
+        owners = {book['owner_id'] for book in group['books']}
+        group['same_owner'] = len(owners) < len(group['books'])
+        output.write(json.dumps(group) + '\n')
+
+        groups += 1
+        books += len(group['books'])
+        same_owner += group['same_owner']
+
+    click.echo(
+        f'✅ Found {groups} duplicate groups covering {books} books '
+        f'({same_owner} with repeats by the same owner).', err=True
+    )
+
+
+@click.command('replica-status')
+@click.option('--refresh', is_flag=True,
+              help='Refresh local snapshot replicas before checking.')
+def replica_status_command(refresh):
+    """Show each read replica's lag and whether reads would use it."""
+    from flask import current_app
+    from replicas import max_replica_lag
+
+    replicas = current_app.extensions.get('replicas')
+    if replicas is None:
+        click.echo('No replicas configured (set DATABASE_REPLICAS).')
+        return
+
+    if refresh:
+        replicas.refresh_snapshots()
+
+    if any(replica.snapshot_path for replica in replicas.replicas):
+        click.echo(f'Snapshots refreshed every '
+                   f'{replicas.refresh_interval():.1f}s')
+    tolerance = max_replica_lag()
+    for replica in replicas.replicas:
+        lag = replica.lag()
+        if lag is None:
+            state = 'unavailable'
+        elif lag <= tolerance:
+            state = f'in use (lag {lag:.1f}s)'
+        else:
+            state = f'too stale (lag {lag:.1f}s > {tolerance:g}s)'
+        click.echo(f'{replica.name}: {state}')
+
+
+@click.command('replay-borrow-events')
+@tenant_option
+@click.option('--since-id', default=0, show_default=True,
+              help='Only replay events after this id.')
+@click.option('--backfill', is_flag=True,
+              help='First log events for requests that predate the log.')
+@click.option('--top', default=10, show_default=True,
+              help='Entries in each top-N list.')
+@click.option('--output', type=click.File('w'), default='-',
+              show_default=True, help='Where to write the JSON summary.')
+def replay_borrow_events_command(since_id, backfill, top, output):
+    """Rebuild borrowing aggregates from the append-only event log."""
+    import json
+    import time
+    from borrow_events import backfill_events, replay
+
+    if backfill:
+        written = backfill_events()
+        click.echo(f'🔧 Logged {written} historical events.', err=True)
+
+    started = time.perf_counter()
+    aggregates = replay(since_id=since_id)
+    output.write(json.dumps(aggregates.to_dict(top=top), indent=2) + '\n')
+    click.echo(
+        f'✅ Replayed {aggregates.events} events in '
+        f'{time.perf_counter() - started:.2f}s.', err=True
+    )
+
+
+@click.command('backfill-analytics')
+@tenant_option
+@click.option('--batch-size', default=5000, show_default=True,
+              help='Events folded into the rollups per transaction.')
+@click.option('--skip-history', is_flag=True,
+              help='Do not log events for requests that predate the log.')
+def backfill_analytics_command(batch_size, skip_history):
+    """Rebuild the daily lending rollups from the borrowing history."""
+    from analytics import rebuild_rollups
+
+    click.echo('📊 Rebuilding lending rollups...')
+    result = rebuild_rollups(batch_size=batch_size,
+                             log_history=not skip_history)
+    click.echo(
+        f"✅ Logged {result['logged']} historical events, rolled up "
+        f"{result['events']} events in {result['seconds']}s."
+    )
+
+
+@click.command('export-data')
+@tenant_option
+@click.argument('name', type=click.Choice(
+    ['books', 'borrow_requests', 'notifications']
+))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'parquet']),
+              default='csv', show_default=True,
+              help='Parquet needs pyarrow installed.')
+@click.option('--chunk-rows', default=5000, show_default=True,
+              help='Rows read per transaction (a Parquet row group each).')
+@click.option('--output', type=click.File('wb'), default='-',
+              show_default=True, help='File to write the export to.')
+def export_data_command(name, fmt, chunk_rows, output):
+    """Stream a whole table to CSV or Parquet with flat memory use."""
+    import time
+    from exports import PARQUET_ENABLED, stream_export
+
+    if fmt == 'parquet' and not PARQUET_ENABLED:
+        raise click.UsageError('Parquet export needs pyarrow installed.')
+
+    started = time.perf_counter()
+    written = 0
+    for chunk in stream_export(name, fmt, chunk_rows):
+        output.write(chunk)
+        written += len(chunk)
+    click.echo(
+        f'✅ Exported {name} ({written} bytes) in '
+        f'{time.perf_counter() - started:.2f}s.', err=True
+    )
+
+
+@click.command('backup-database')
+@tenant_option
+@click.option('--dir', 'directory', default=None,
+              help='Snapshot directory (default: BACKUP_DIR or backups/).')
+@click.option('--pages', default=256, show_default=True,
+              help='Pages copied per step; -1 copies in one step.')
+@click.option('--sleep', default=0.05, show_default=True,
+              help='Seconds to pause between steps so writers get in.')
+@click.option('--keep', type=int, default=None,
+              help='Snapshots to keep (default: BACKUP_KEEP or 7).')
+@click.option('--no-verify', is_flag=True,
+              help='Skip the restore rehearsal.')
+def backup_database_command(directory, pages, sleep, keep, no_verify):
+    """Snapshot the live database without stopping the app."""
+    from backup import BackupError, backup_database
+
+    click.echo('💾 Backing up database...')
+    try:
+        result = backup_database(directory=directory, pages=pages,
+                                 sleep=sleep, keep=keep,
+                                 verify=not no_verify)
+    except BackupError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(
+        f"✅ {result['path']} ({result['bytes']} bytes, {result['pages']} "
+        f"pages in {result['steps']} steps, {result['restarts']} restarts) "
+        f"in {result['seconds']}s."
+    )
+    if result['verification']:
+        click.echo('🔍 Restore verified: ' + ', '.join(
+            f'{table}={count}'
+            for table, count in result['verification']['rows'].items()
+        ))
+    for path in result['removed']:
+        click.echo(f'🗑️  Rotated out {path}')
+
+
+@click.command('verify-backup')
+@tenant_option
+@click.argument('path', required=False)
+def verify_backup_command(path):
+    """Rehearse restoring a snapshot (default: the newest one)."""
+    from backup import list_backups, verify_backup
+
+    if path is None:
+        snapshots = list_backups()
+        if not snapshots:
+            raise click.ClickException('No snapshots found.')
+        path = snapshots[-1]
+
+    result = verify_backup(path)
+    click.echo(f"{path}: integrity {result['integrity']}")
+    if result['missing_tables']:
+        click.echo(f"Missing tables: {', '.join(result['missing_tables'])}")
+    for table, count in result['rows'].items():
+        click.echo(f'  {table}: {count}')
+    if not result['ok']:
+        raise click.ClickException('Snapshot failed verification.')
+    click.echo('✅ Snapshot restores cleanly.')
+
+
+@click.command('send-due-reminders')
+@tenant_option
+@click.option('--batch-size', default=200, show_default=True,
+              help='Loans handled per transaction.')
+@click.option('--backfill', is_flag=True,
+              help='First give active loans approved before due dates '
+                   'existed one (approval + LOAN_DAYS).')
+def send_due_reminders_command(batch_size, backfill):
+    """Remind borrowers of loans that are due soon or overdue."""
+    from datetime import timedelta
+    from database import db
+    from models import BorrowRequest
+    from reminders import default_loan_days, send_due_reminders
+
+    if backfill:
+        loans = BorrowRequest.query.filter(
+            BorrowRequest.status == 'approved',
+            BorrowRequest.due_at.is_(None)
+        ).all()
+        for loan in loans:
+            loan.due_at = (loan.responded_at or loan.requested_at) + \
+                timedelta(days=default_loan_days())
+        db.session.commit()
+        click.echo(f'📅 Gave {len(loans)} active loans a due date.')
+
+    sent = send_due_reminders(batch_size=batch_size)
+    click.echo(f"✅ Reminded {sent['due_soon']} due soon and "
+               f"{sent['overdue']} overdue loans.")
+
+
+@click.command('create-tenant')
+@click.argument('code')
+def create_tenant_command(code):
+    """Create (or upgrade) the database of a building."""
+    from tenancy import TENANT_PATTERN, tenant_engines
+
+    engines = tenant_engines()
+    if engines is None:
+        raise click.ClickException('Set TENANT_DB_DIR to use buildings.')
+    if not TENANT_PATTERN.match(code):
+        raise click.ClickException(
+            'Building codes are up to 32 letters, digits, "-" or "_".'
+        )
+    existed = engines.exists(code)
+    engines.create(code)
+    verb = 'Upgraded' if existed else 'Created'
+    click.echo(f'✅ {verb} building {code} at {engines.path(code)}')
+
+
+@click.command('list-tenants')
+def list_tenants_command():
+    """List the buildings and their database sizes."""
+    import os
+    from tenancy import tenant_engines
+
+    engines = tenant_engines()
+    if engines is None:
+        raise click.ClickException('Set TENANT_DB_DIR to use buildings.')
+    codes = engines.tenants()
+    for code in codes:
+        size = os.path.getsize(engines.path(code))
+        click.echo(f'{code:<32} {size / 1e6:>10.1f} MB')
+    click.echo(f'{len(codes)} buildings in {engines.directory}')
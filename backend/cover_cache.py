@@ -0,0 +1,351 @@
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import ssl
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Optional; without Pillow originals are served as-is
+    Image = None
+
+THUMBNAILS_ENABLED = Image is not None
+
+MAX_COVER_BYTES = 5 * 1024 * 1024
+FETCH_TIMEOUT = 10
+MAX_REDIRECTS = 3
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Failed fetches remembered per process, so a dead URL isn't retried by
+# every request for it
+MAX_REMEMBERED_FAILURES = 1024
+
+# Named thumbnail sizes (bounding box in pixels)
+THUMBNAIL_SIZES = {
+    'thumb': (160, 240),
+    'medium': (320, 480),
+}
+
+
+class CoverError(Exception):
+    """Raised when a cover cannot be fetched from its source URL."""
+
+
+def _write_atomically(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _get(url, address):
+    """
+    One GET request, connecting to address (if given) instead of resolving
+    the URL's host. Redirects are returned, not followed.
+
+    Returns:
+        Tuple (status, location, content_type, body)
+    """
+    parsed = urllib.parse.urlparse(url)
+    if parsed.scheme == 'https':
+        connection = http.client.HTTPSConnection(
+            parsed.hostname, parsed.port, timeout=FETCH_TIMEOUT,
+            context=ssl.create_default_context()
+        )
+    else:
+        connection = http.client.HTTPConnection(
+            parsed.hostname, parsed.port, timeout=FETCH_TIMEOUT
+        )
+    if address is not None:
+        # The TLS handshake still uses the host name (SNI and certificate)
+        connection._create_connection = (
+            lambda target, *args, **kwargs: socket.create_connection(
+                (address, target[1]), *args, **kwargs
+            )
+        )
+
+    path = parsed.path or '/'
+    if parsed.query:
+        path = f'{path}?{parsed.query}'
+    try:
+        connection.request('GET', path, headers={'User-Agent': 'Mozilla/5.0'})
+        response = connection.getresponse()
+        location = response.getheader('Location')
+        content_type = response.getheader('Content-Type', '')
+        body = b''
+        if response.status == 200 and content_type.startswith('image/'):
+            body = response.read(MAX_COVER_BYTES + 1)
+        return response.status, location, content_type, body
+    finally:
+        connection.close()
+
+
+def _make_thumbnail(source_path, target_path, box):
+    """Resize one image; runs in a worker process."""
+    with Image.open(source_path) as image:
+        image = image.convert('RGB')
+        image.thumbnail(box)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        temp_path = f'{target_path}.{os.getpid()}.tmp'
+        image.save(temp_path, 'JPEG', quality=82, optimize=True)
+        os.replace(temp_path, target_path)
+    return target_path
+
+
+class CoverCache:
+    """
+    Content-addressed disk cache for book covers.
+
+    Originals are stored once under objects/<sha256 of the bytes>, and a
+    small index file maps each source URL to its content hash, so books
+    sharing a cover share the file. Thumbnails are derived per content hash
+    in a background process pool, keeping image decoding off the request
+    threads.
+
+    Args:
+        root: Cache directory
+        workers: Processes used for thumbnail generation
+        allowed_private_hosts: Hosts that may resolve to private or
+            loopback addresses (e.g. a local stub image server in tests)
+        failure_ttl: Seconds a failed fetch is answered from memory
+            before the URL is tried again
+    """
+
+    def __init__(self, root, workers=2, allowed_private_hosts=(),
+                 failure_ttl=60):
+        self.root = root
+        self.workers = workers
+        self.allowed_private_hosts = set(allowed_private_hosts)
+        self.failure_ttl = failure_ttl
+        self._pool = None
+        self._pool_pid = None
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        # url -> (monotonic expiry, error message)
+        self._failures = {}
+
+    # ── Paths ──
+
+    def _index_path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.root, 'index', key[:2], key)
+
+    def object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def thumbnail_path(self, digest, size):
+        return os.path.join(
+            self.root, 'thumbs', size, digest[:2], f'{digest}.jpg'
+        )
+
+    # ── Originals ──
+
+    def get_original(self, url):
+        """
+        Return the content hash of the cover at url, fetching it once.
+
+        Concurrent requests for the same URL wait for a single download. A
+        failed download is remembered for failure_ttl seconds, during which
+        requests for the URL fail at once instead of fetching it again.
+
+        Raises:
+            CoverError: If the URL is not allowed or the download fails
+        """
+        index_path = self._index_path(url)
+        digest = self._read_index(index_path)
+        if digest:
+            return digest
+        self._raise_recent_failure(url)
+
+        with self._lock:
+            url_lock = self._fetch_locks.setdefault(url, threading.Lock())
+
+        try:
+            with url_lock:
+                digest = self._read_index(index_path)
+                if digest:
+                    return digest
+                # The download we waited for may just have failed
+                self._raise_recent_failure(url)
+
+                try:
+                    data = self._fetch(url)
+                except CoverError as e:
+                    self._remember_failure(url, str(e))
+                    raise
+                digest = hashlib.sha256(data).hexdigest()
+                object_path = self.object_path(digest)
+                if not os.path.exists(object_path):
+                    _write_atomically(object_path, data)
+                _write_atomically(index_path, digest.encode('ascii'))
+        finally:
+            with self._lock:
+                self._fetch_locks.pop(url, None)
+        return digest
+
+    def _raise_recent_failure(self, url):
+        with self._lock:
+            failure = self._failures.get(url)
+            if failure and failure[0] <= time.monotonic():
+                del self._failures[url]
+                failure = None
+        if failure:
+            raise CoverError(failure[1])
+
+    def _remember_failure(self, url, message):
+        if self.failure_ttl <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._failures) >= MAX_REMEMBERED_FAILURES:
+                self._failures = {
+                    key: failure for key, failure in self._failures.items()
+                    if failure[0] > now
+                }
+                # Still full: forget the oldest
+                while len(self._failures) >= MAX_REMEMBERED_FAILURES:
+                    del self._failures[next(iter(self._failures))]
+            self._failures[url] = (now + self.failure_ttl, message)
+
+    def _read_index(self, index_path):
+        try:
+            with open(index_path, 'rb') as f:
+                digest = f.read().decode('ascii').strip()
+        except FileNotFoundError:
+            return None
+        return digest if os.path.exists(self.object_path(digest)) else None
+
+    def _check_host(self, url):
+        """
+        Validate a cover URL and resolve its host once.
+
+        Returns:
+            The address to connect to, or None for an allowed private host
+            (connected to by name)
+        """
+        parsed = urllib.parse.urlparse(url)
+        if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+            raise CoverError('Cover URL must be http(s)')
+
+        host = parsed.hostname
+        if host in self.allowed_private_hosts:
+            return None
+
+        # Refuse to proxy requests into the server's own network
+        try:
+            addresses = socket.getaddrinfo(host, None,
+                                           type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise CoverError(f'Cannot resolve {host}: {e}')
+        for address in addresses:
+            ip = ipaddress.ip_address(address[4][0])
+            ip = getattr(ip, 'ipv4_mapped', None) or ip
+            if not ip.is_global or ip.is_multicast:
+                raise CoverError(f'Refusing to fetch cover from {host}')
+        return addresses[0][4][0]
+
+    def _fetch(self, url):
+        """
+        Download a cover, following at most MAX_REDIRECTS redirects.
+
+        Every hop is checked with _check_host, and the connection goes to
+        the address that was checked rather than resolving the name again,
+        so neither a redirect nor DNS rebinding can reach a private
+        address. HTTPS certificates are still verified against the name.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            address = self._check_host(url)
+            try:
+                status, location, content_type, data = _get(url, address)
+            except CoverError:
+                raise
+            except Exception as e:
+                raise CoverError(f'Failed to fetch cover: {e}')
+
+            if status in REDIRECT_STATUSES and location:
+                url = urllib.parse.urljoin(url, location)
+                continue
+            if status != 200:
+                raise CoverError(f'Failed to fetch cover: HTTP {status}')
+            if not content_type.startswith('image/'):
+                raise CoverError(f'Not an image: {content_type}')
+            if len(data) > MAX_COVER_BYTES:
+                raise CoverError('Cover image is too large')
+            return data
+
+        raise CoverError('Too many redirects')
+
+    # ── Thumbnails ──
+
+    def _executor(self):
+        # Pools don't survive a fork; create one per process on first use
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            self._pool_pid = os.getpid()
+            self._pending = {}
+        return self._pool
+
+    def get_thumbnail(self, digest, size, wait=2.0):
+        """
+        Return the thumbnail path for a cached original, or None.
+
+        Missing thumbnails are scheduled on the process pool; the caller
+        waits up to `wait` seconds and gets None if it is not ready yet.
+        """
+        if not THUMBNAILS_ENABLED or size not in THUMBNAIL_SIZES:
+            return None
+
+        target = self.thumbnail_path(digest, size)
+        if os.path.exists(target):
+            return target
+
+        with self._lock:
+            future = self._pending.get(target)
+            if future is None:
+                future = self._executor().submit(
+                    _make_thumbnail,
+                    self.object_path(digest),
+                    target,
+                    THUMBNAIL_SIZES[size]
+                )
+                self._pending[target] = future
+                future.add_done_callback(
+                    lambda _: self._pending.pop(target, None)
+                )
+
+        try:
+            return future.result(timeout=wait)
+        except Exception:
+            # Still running (or failed); serve the original for now
+            return None
+
+
+_cache = None
+
+
+def get_cover_cache():
+    """Process-wide CoverCache configured from the environment."""
+    global _cache
+    if _cache is None:
+        backend_dir = os.path.abspath(os.path.dirname(__file__))
+        root = os.environ.get(
+            'COVER_CACHE_DIR', os.path.join(backend_dir, 'cover_cache')
+        )
+        allowed = [
+            host.strip() for host in
+            os.environ.get('COVER_ALLOWED_PRIVATE_HOSTS', '').split(',')
+            if host.strip()
+        ]
+        _cache = CoverCache(
+            root,
+            workers=int(os.environ.get('COVER_THUMBNAIL_WORKERS', 2)),
+            allowed_private_hosts=allowed,
+            failure_ttl=float(os.environ.get('COVER_FAILURE_TTL', 60))
+        )
+    return _cache
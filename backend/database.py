@@ -1,7 +1,56 @@
+from contextlib import contextmanager
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 import os
 
-db = SQLAlchemy()
+
+class RoutingSession(Session):
+    """
+    Session that sends plain SELECTs to the read replica chosen for the
+    current request (see replicas.read_replica). Writes, flushes and raw
+    connection access always use the primary.
+
+    In multi-building mode (see tenancy.py) everything, reads and writes,
+    goes to the building's own database instead.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            tenant = g.get('db_tenant')
+            if tenant is not None:
+                return tenant
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None and getattr(clause, 'is_select', False):
+                return replica
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+@contextmanager
+def primary_reads():
+    """
+    Run the block's queries on the primary even inside @read_replica,
+    e.g. authentication, which must see users deleted a moment ago.
+    """
+    replica = g.pop('db_replica', None)
+    try:
+        yield
+    finally:
+        if replica is not None:
+            g.db_replica = replica
+
+
+def current_engine():
+    """Engine of the database the current request or job works on."""
+    if has_app_context():
+        tenant = g.get('db_tenant')
+        if tenant is not None:
+            return tenant
+    return db.engine
 
 
 def init_db(app):
@@ -15,24 +64,85 @@ def init_db(app):
     # Get the base directory of the application
     basedir = os.path.abspath(os.path.dirname(__file__))
 
-    # Database configuration
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(
-        basedir, 'virtual_library.db'
+    # Database configuration (SQLALCHEMY_DATABASE_URI overrides the default
+    # file, e.g. to point scale-data runs at a scratch database)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'SQLALCHEMY_DATABASE_URI',
+        'sqlite:///' + os.path.join(basedir, 'virtual_library.db')
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SQLALCHEMY_ECHO'] = False  # Set True to log SQL queries
 
+    # Threaded workers (gunicorn.conf.py) hold one connection per busy
+    # thread; size the pool to match so threads never queue for one
+    pool_size = int(os.environ.get('DB_POOL_SIZE', 0))
+    if pool_size:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': pool_size,
+            'max_overflow': pool_size
+        }
+
     # Initialize SQLAlchemy with the app
     db.init_app(app)
 
+    # SQLITE_JOURNAL_MODE=wal lets readers, including online backups, run
+    # without blocking writers. The mode is stored in the database file.
+    journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', '').strip().lower()
+    if journal_mode and app.config['SQLALCHEMY_DATABASE_URI'].startswith(
+            'sqlite'):
+        with app.app_context(), db.engine.connect() as connection:
+            connection.exec_driver_sql(f'PRAGMA journal_mode = {journal_mode}')
+
     # Create all tables
     with app.app_context():
         from models import User, Book, BorrowRequest, Notification
+        # Register the listeners that keep book_trigrams and
+        # books.fingerprint in sync
+        from search_index import ensure_search_index
+        import duplicates  # noqa: F401
         db.create_all()
+        upgrade_schema()
         print("✅ Database initialized successfully.")
 
         # Seed default data if database is empty
         seed_data()
+        ensure_search_index()
+
+
+def upgrade_schema(engine=None):
+    """
+    Bring an existing database file up to date with the models.
+
+    create_all() only creates missing tables, so columns and indexes added
+    to existing tables are applied here. Columns added this way must be
+    nullable; rows that predate them read back as NULL.
+
+    Args:
+        engine: Database to upgrade (defaults to the primary)
+    """
+    engine = engine or db.engine
+    inspector = db.inspect(engine)
+
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+
+        existing_columns = {
+            column['name'] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            column_type = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as connection:
+                connection.exec_driver_sql(
+                    f'ALTER TABLE {table.name} '
+                    f'ADD COLUMN {column.name} {column_type}'
+                )
+            print(f"🔧 Added column {table.name}.{column.name}")
+
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 def seed_data():
@@ -180,22 +290,32 @@ def reset_db(app):
         seed_data()
 
 
-def get_db_stats():
+def get_db_stats(connection=None):
     """
     Get statistics about the current database.
 
+    Args:
+        connection: Count on this connection instead of the session, e.g.
+            for another building's database
+
     Returns:
         Dictionary with table counts
     """
     from models import User, Book, BorrowRequest, Notification
 
+    def count(model, *criteria):
+        query = db.select(db.func.count()).select_from(model).where(*criteria)
+        return (connection or db.session).execute(query).scalar()
+
     return {
-        'total_users': User.query.count(),
-        'total_books': Book.query.count(),
-        'available_books': Book.query.filter_by(status='available').count(),
-        'borrowed_books': Book.query.filter_by(status='borrowed').count(),
-        'total_requests': BorrowRequest.query.count(),
-        'pending_requests': BorrowRequest.query.filter_by(status='pending').count(),
-        'total_notifications': Notification.query.count(),
-        'unread_notifications': Notification.query.filter_by(is_read=False).count()
-    }
\ No newline at end of file
+        'total_users': count(User),
+        'total_books': count(Book),
+        'available_books': count(Book, Book.status == 'available'),
+        'borrowed_books': count(Book, Book.status == 'borrowed'),
+        'total_requests': count(BorrowRequest),
+        'pending_requests': count(BorrowRequest,
+                                  BorrowRequest.status == 'pending'),
+        'total_notifications': count(Notification),
+        'unread_notifications': count(Notification,
+                                      Notification.is_read.is_(False))
+    }
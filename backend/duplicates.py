@@ -0,0 +1,176 @@
+import re
+import time
+from sqlalchemy import event, inspect
+from database import db
+from models import Book
+from search_index import normalize
+
+LEADING_ARTICLES = ('the', 'a', 'an')
+MAX_FINGERPRINT_LENGTH = 400
+
+# Sorts after any character a fingerprint can contain
+_RANGE_END = '\uffff'
+
+
+def fingerprint(title, author):
+    """
+    Normalized identity of a title/author pair.
+
+    Casefolded and stripped of accents and punctuation. Subtitles after a
+    colon and a leading article are dropped from the title, and the
+    author's words are sorted so "Orwell, George" and "George Orwell"
+    agree. The title comes first, so all editions of a title share a
+    prefix and can be found with one index range scan.
+    """
+    words = normalize((title or '').split(':')[0]).split()
+    if len(words) > 1 and words[0] in LEADING_ARTICLES:
+        words = words[1:]
+    author_words = sorted(normalize(author).split())
+    key = f'{" ".join(words)}|{" ".join(author_words)}'
+    return key[:MAX_FINGERPRINT_LENGTH]
+
+
+def title_prefix(key):
+    return key.split('|', 1)[0] + '|'
+
+
+def normalize_isbn(raw):
+    """
+    Return the ISBN-13 form of an ISBN-10 or ISBN-13, or None if invalid.
+    """
+    digits = re.sub(r'[^0-9Xx]', '', raw or '').upper()
+    if len(digits) == 10:
+        body = '978' + digits[:9]
+    elif len(digits) == 13 and digits.isdigit():
+        body = digits[:12]
+    else:
+        return None
+    if not body.isdigit():
+        return None
+
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(body))
+    isbn = body + str((10 - total % 10) % 10)
+    if len(digits) == 13 and isbn != digits:
+        return None
+    return isbn
+
+
+@event.listens_for(Book, 'before_insert')
+@event.listens_for(Book, 'before_update')
+def _set_fingerprint(mapper, connection, book):
+    state = inspect(book)
+    if (book.fingerprint is None
+            or state.attrs.title.history.has_changes()
+            or state.attrs.author.history.has_changes()):
+        book.fingerprint = fingerprint(book.title, book.author)
+
+
+def find_similar_books(title, author, isbn=None, limit=5):
+    """
+    Books that look like the given edition, using only indexed lookups.
+
+    Returns:
+        List of (Book, reason) tuples, where reason is 'isbn', 'exact'
+        (same fingerprint) or 'title' (same title, different author)
+    """
+    key = fingerprint(title, author)
+    prefix = title_prefix(key)
+
+    conditions = [db.and_(
+        Book.fingerprint >= prefix,
+        Book.fingerprint < prefix + _RANGE_END
+    )]
+    if isbn:
+        conditions.append(Book.isbn == isbn)
+
+    books = db.session.execute(
+        db.select(Book).where(db.or_(*conditions)).limit(limit * 4)
+    ).scalars().all()
+
+    ranked = []
+    for book in books:
+        if isbn and book.isbn == isbn:
+            reason = 'isbn'
+        elif book.fingerprint == key:
+            reason = 'exact'
+        else:
+            reason = 'title'
+        ranked.append((book, reason))
+
+    order = {'isbn': 0, 'exact': 1, 'title': 2}
+    ranked.sort(key=lambda match: (order[match[1]], match[0].id))
+    return ranked[:limit]
+
+
+def backfill_fingerprints(batch_size=1000, pause=0.0):
+    """
+    Fill in fingerprints for rows written before the column existed (or by
+    bulk inserts), one short transaction per batch.
+
+    Returns:
+        Number of books updated
+    """
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            db.select(Book.id, Book.title, Book.author)
+            .where(Book.fingerprint.is_(None))
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+
+        db.session.execute(db.update(Book), [
+            {'id': book_id, 'fingerprint': fingerprint(title, author)}
+            for book_id, title, author in rows
+        ])
+        db.session.commit()
+        updated += len(rows)
+        if pause:
+            time.sleep(pause)
+
+
+def find_duplicates(batch_size=1000):
+    """
+    Yield groups of books sharing a fingerprint or an ISBN.
+
+    Walks the fingerprint index in key order, batch_size duplicate keys at
+    a time, so memory stays flat however large the catalogue is. Run
+    backfill_fingerprints() first so older rows are included.
+
+    Yields:
+        Dictionaries with key, match ('fingerprint' or 'isbn') and books,
+        a list of {id, title, author, owner_id} sorted by id
+    """
+    for column, match in ((Book.fingerprint, 'fingerprint'),
+                          (Book.isbn, 'isbn')):
+        last_key = ''
+        while True:
+            keys = db.session.execute(
+                db.select(column)
+                .where(column.is_not(None), column > last_key)
+                .group_by(column)
+                .having(db.func.count() > 1)
+                .order_by(column)
+                .limit(batch_size)
+            ).scalars().all()
+            if not keys:
+                break
+            last_key = keys[-1]
+
+            groups = {}
+            for book_id, title, author, owner_id, key in db.session.execute(
+                db.select(Book.id, Book.title, Book.author, Book.owner_id,
+                          column)
+                .where(column.in_(keys))
+                .order_by(Book.id)
+            ).all():
+                groups.setdefault(key, []).append({
+                    'id': book_id,
+                    'title': title,
+                    'author': author,
+                    'owner_id': owner_id
+                })
+
+            for key in keys:
+                yield {'key': key, 'match': match, 'books': groups[key]}
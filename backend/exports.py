@@ -0,0 +1,199 @@
+import csv
+import io
+from datetime import date, datetime
+from database import db, current_engine
+
+try:
+    import pyarrow
+    import pyarrow.parquet as parquet
+except ImportError:  # Optional; without pyarrow only CSV is offered
+    pyarrow = None
+
+PARQUET_ENABLED = pyarrow is not None
+
+EXPORTS = ('books', 'borrow_requests', 'notifications')
+FORMATS = ('csv', 'parquet')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+# Rows per output chunk; each chunk is read in its own short transaction
+DEFAULT_CHUNK_ROWS = 5000
+# Rows the driver hands over at a time while a chunk is read
+YIELD_PER = 1000
+
+
+def export_table(name):
+    """The Table behind an export name (one of EXPORTS)."""
+    from models import Book, BorrowRequest, Notification
+
+    models = {
+        'books': Book,
+        'borrow_requests': BorrowRequest,
+        'notifications': Notification,
+    }
+    return models[name].__table__
+
+
+def stream_export(name, fmt='csv', chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Export a whole table as a sequence of encoded chunks.
+
+    The table is walked in primary key order, chunk_rows rows at a time.
+    Each chunk is read on its own connection with a streaming cursor
+    (``yield_per``), encoded, and the connection is handed back before the
+    chunk is yielded. No transaction stays open while the caller writes
+    the chunk out (to a slow HTTP client, say), so writers are held up for
+    one chunk's read at most, and memory holds one chunk at a time
+    whatever the table size. The result is consistent per chunk, not a
+    snapshot of the whole table.
+
+    Args:
+        name: One of EXPORTS
+        fmt: 'csv', or 'parquet' when pyarrow is installed
+        chunk_rows: Rows per chunk (a Parquet row group each)
+
+    Yields:
+        bytes
+    """
+    table = export_table(name)
+    if fmt == 'parquet':
+        if not PARQUET_ENABLED:
+            raise ValueError('Parquet export needs pyarrow installed')
+        encoder = _ParquetEncoder(table)
+    else:
+        encoder = _CsvEncoder(table)
+
+    last_id = 0
+    while True:
+        count = 0
+        with current_engine().connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=YIELD_PER
+            ).execute(
+                db.select(table)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(chunk_rows)
+            )
+            for partition in result.partitions():
+                encoder.write(partition)
+                count += len(partition)
+                last_id = partition[-1].id
+
+        chunk = encoder.flush()
+        if chunk:
+            yield chunk
+        if count < chunk_rows:
+            break
+
+    tail = encoder.close()
+    if tail:
+        yield tail
+
+
+class _CsvEncoder:
+    """CSV with a header row; datetimes in ISO 8601, NULL as empty."""
+
+    def __init__(self, table):
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator='\n')
+        self._writer.writerow([column.name for column in table.columns])
+        self._temporal = [
+            index for index, column in enumerate(table.columns)
+            if column.type.python_type in (datetime, date)
+        ]
+
+    def write(self, rows):
+        if not self._temporal:
+            self._writer.writerows(rows)
+            return
+        for row in rows:
+            row = list(row)
+            for index in self._temporal:
+                if row[index] is not None:
+                    row[index] = row[index].isoformat()
+            self._writer.writerow(row)
+
+    def flush(self):
+        data = self._buffer.getvalue().encode('utf-8')
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def close(self):
+        return self.flush()
+
+
+class _Sink(io.RawIOBase):
+    """Write-only file that hands its bytes back on demand."""
+
+    def __init__(self):
+        super().__init__()
+        self._data = bytearray()
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._data += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def take(self):
+        data = bytes(self._data)
+        self._data.clear()
+        return data
+
+
+def _arrow_type(column):
+    types = {
+        bool: pyarrow.bool_(),
+        int: pyarrow.int64(),
+        float: pyarrow.float64(),
+        str: pyarrow.string(),
+        datetime: pyarrow.timestamp('us'),
+        date: pyarrow.date32(),
+    }
+    return types.get(column.type.python_type, pyarrow.string())
+
+
+class _ParquetEncoder:
+    """Parquet with one row group per chunk; the footer comes last."""
+
+    def __init__(self, table):
+        self._names = [column.name for column in table.columns]
+        self._schema = pyarrow.schema([
+            (column.name, _arrow_type(column)) for column in table.columns
+        ])
+        self._sink = _Sink()
+        self._writer = parquet.ParquetWriter(self._sink, self._schema)
+        self._columns = [[] for _ in self._names]
+
+    def write(self, rows):
+        for row in rows:
+            for values, value in zip(self._columns, row):
+                values.append(value)
+
+    def flush(self):
+        if self._columns[0]:
+            self._writer.write_table(pyarrow.Table.from_arrays(
+                [
+                    pyarrow.array(values, type=field.type)
+                    for values, field in zip(self._columns, self._schema)
+                ],
+                schema=self._schema
+            ))
+            self._columns = [[] for _ in self._names]
+        return self._sink.take()
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        return self._sink.take()
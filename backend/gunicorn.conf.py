@@ -0,0 +1,61 @@
+"""
+Gunicorn settings for Lend-a-Read.
+
+Loaded by the Procfile (``gunicorn app:application -c gunicorn.conf.py``
+from the backend directory). GUNICORN_PROFILE picks the worker model:
+
+- gthread (default): a few processes with a pool of threads each, so a
+  request waiting on Google Books or a cover download ties up one thread
+  instead of a whole process
+- sync: one request at a time per process
+
+WEB_CONCURRENCY and GUNICORN_THREADS override the computed sizes.
+"""
+import multiprocessing
+import os
+
+profile = os.environ.get('GUNICORN_PROFILE', 'gthread').lower()
+cores = multiprocessing.cpu_count()
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+if profile == 'sync':
+    worker_class = 'sync'
+    workers = int(os.environ.get('WEB_CONCURRENCY', cores * 2 + 1))
+    threads = 1
+elif profile == 'gthread':
+    worker_class = 'gthread'
+    # One process per core for the CPU work; threads overlap the I/O waits
+    workers = int(os.environ.get('WEB_CONCURRENCY', cores + 1))
+    threads = int(os.environ.get('GUNICORN_THREADS', max(4, cores * 2)))
+else:
+    raise ValueError(f'Unknown GUNICORN_PROFILE: {profile}')
+
+# Upstream calls time out after 10s; leave room for the rest of the request
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app once in the master and fork the workers from it: the
+# code is shared and init_db()'s schema checks run once, not per worker
+preload_app = True
+
+# Read by database.init_db() while the master loads the app
+os.environ.setdefault('DB_POOL_SIZE', str(threads))
+
+
+def post_fork(server, worker):
+    """
+    Drop the connections the master opened while loading the app.
+
+    Pooled connections must never be shared across processes; with
+    close=False the parent's connections are left alone and the worker
+    starts with an empty pool. Sessions need no handling here: Flask-
+    SQLAlchemy scopes them to the app context, so every request (and
+    therefore every thread) gets its own.
+    """
+    from app import application
+    from database import db
+
+    with application.app_context():
+        db.engine.dispose(close=False)
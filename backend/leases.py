@@ -0,0 +1,71 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from database import db
+
+
+def lease_holder_id():
+    """
+    Identify the current thread across hosts, processes and threads.
+
+    Returns:
+        String such as "web-1:4242:139872"
+    """
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+
+def acquire_lease(name, holder, ttl_seconds):
+    """
+    Take or renew a named lease so only one worker runs a singleton job.
+
+    The lease is granted when nobody holds it, when it has expired, or when
+    the caller already holds it. The check and the write are one
+    conditional UPDATE, so two workers can never both win.
+
+    Args:
+        name: Lease name, e.g. "outbox-dispatcher"
+        holder: Identifier of the caller (see lease_holder_id)
+        ttl_seconds: How long the lease stays valid without renewal
+
+    Returns:
+        True if the caller holds the lease after this call
+    """
+    from models import Lease
+
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    renewed = db.session.execute(
+        db.update(Lease).where(
+            Lease.name == name,
+            db.or_(Lease.holder == holder, Lease.expires_at < now)
+        ).values(holder=holder, expires_at=expires_at)
+    ).rowcount
+    if renewed:
+        db.session.commit()
+        return True
+
+    try:
+        db.session.add(Lease(name=name, holder=holder, expires_at=expires_at))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        # Someone else holds a live lease
+        db.session.rollback()
+        return False
+
+
+def release_lease(name, holder):
+    """
+    Give up a lease early so another worker can take over immediately.
+
+    Args:
+        name: Lease name
+        holder: Identifier the lease was acquired with
+    """
+    from models import Lease
+
+    Lease.query.filter_by(name=name, holder=holder).delete()
+    db.session.commit()
@@ -1,8 +1,17 @@
 import jwt
+import os
 from functools import wraps
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g
 from models import User
-from database import db
+from database import db, primary_reads
+from tenancy import current_tenant
+from user_cache import remember_user
+
+
+def auth_cache_key(token):
+    """Key of g.auth_cache: the same token may only reuse a user resolved
+    in the same building."""
+    return (current_tenant(), token)
 
 
 def token_required(f):
@@ -28,6 +37,12 @@ def token_required(f):
                 'message': 'Please log in to access this resource'
             }), 401
 
+        # Reuse the user already resolved for this token and building in
+        # this app context (e.g. the sub-requests of a /api/batch call)
+        cached = g.get('auth_cache')
+        if cached and cached[0] == auth_cache_key(token):
+            return f(cached[1], *args, **kwargs)
+
         try:
             # Decode and verify the token
             payload = jwt.decode(
@@ -44,8 +59,10 @@ def token_required(f):
                     'message': 'Token payload is malformed'
                 }), 401
 
-            # Fetch the user from database
-            current_user = db.session.get(User, user_id)
+            # Fetch the user from the primary; a replica may still have a
+            # user that was just deleted
+            with primary_reads():
+                current_user = db.session.get(User, user_id)
             if not current_user:
                 return jsonify({
                     'error': 'User not found',
@@ -70,6 +87,9 @@ def token_required(f):
                 'message': str(e)
             }), 401
 
+        g.auth_cache = (auth_cache_key(token), current_user)
+        remember_user(current_user)
+
         # Pass current_user to the route function
         return f(current_user, *args, **kwargs)
 
@@ -101,7 +121,10 @@ def optional_token(f):
                 )
                 user_id = payload.get('user_id')
                 if user_id:
-                    current_user = db.session.get(User, user_id)
+                    with primary_reads():
+                        current_user = remember_user(
+                            db.session.get(User, user_id)
+                        )
             except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
                 current_user = None
 
@@ -110,10 +133,58 @@ def optional_token(f):
     return decorated
 
 
+def admin_apartments(tenant=None):
+    """
+    Apartments whose residents administer a building (ADMIN_APARTMENTS).
+
+    Plain entries ("101") apply to the primary database; in multi-building
+    mode each building lists its own as "<building>:<apartment>"
+    ("north:101"), so apartment 101 is not an administrator everywhere.
+
+    Args:
+        tenant: Building code, None for the primary
+    """
+    apartments = set()
+    for entry in os.environ.get('ADMIN_APARTMENTS', '').split(','):
+        building, _, apartment = entry.strip().rpartition(':')
+        if apartment and (building or None) == tenant:
+            apartments.add(apartment)
+    return apartments
+
+
+def is_admin(user):
+    """Whether user administers the current building (see admin_required)."""
+    return (user is not None
+            and user.apartment_number in admin_apartments(current_tenant()))
+
+
+def admin_required(f):
+    """
+    Decorator for building-administrator routes; implies token_required.
+    Administrators are the apartments listed in ADMIN_APARTMENTS
+    (comma-separated, see admin_apartments). With none configured for the
+    building, every admin route is refused.
+    """
+    @token_required
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if not is_admin(current_user):
+            return jsonify({
+                'error': 'Forbidden',
+                'message': 'Building administrator access is required'
+            }), 403
+        return f(current_user, *args, **kwargs)
+
+    return decorated
+
+
 def generate_token(user_id, expires_hours=24):
     """
     Generate a JWT token for a given user ID.
 
+    In multi-building mode the token carries the user's building as its
+    tenant claim, which routes their later requests.
+
     Args:
         user_id: The ID of the user
         expires_hours: Number of hours until token expires (default 24)
@@ -128,6 +199,9 @@ def generate_token(user_id, expires_hours=24):
         'iat': datetime.utcnow(),
         'exp': datetime.utcnow() + timedelta(hours=expires_hours)
     }
+    tenant = current_tenant()
+    if tenant:
+        payload['tenant'] = tenant
 
     token = jwt.encode(
         payload,
@@ -1,5 +1,11 @@
 from database import db
 from datetime import datetime
+from serializers import ModelSerializer
+from user_cache import get_user
+
+# Nested summaries embedded in other models' output
+USER_SUMMARY = ModelSerializer(['id', 'name', 'apartment_number'])
+BOOK_SUMMARY = ModelSerializer(['id', 'title', 'author'])
 
 
 class User(db.Model):
@@ -14,13 +20,13 @@ class User(db.Model):
     books = db.relationship('Book', backref='owner', lazy=True,
                             foreign_keys='Book.owner_id')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'apartment_number': self.apartment_number,
-            'name': self.name,
-            'created_at': self.created_at.isoformat()
-        }
+    serializer = ModelSerializer(
+        ['id', 'apartment_number', 'name', 'created_at'],
+        datetimes=['created_at']
+    )
+
+    def to_dict(self, fields=None):
+        return self.serializer.dump(self, fields)
 
 
 class Book(db.Model):
@@ -37,37 +43,51 @@ class Book(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow,
                            onupdate=datetime.utcnow)
+    isbn = db.Column(db.String(13), nullable=True)
+    # Normalized title|author, see duplicates.fingerprint
+    fingerprint = db.Column(db.String(400), nullable=True)
+    # Size of the title/author trigram set, see search_index.fuzzy_matches
+    trigram_count = db.Column(db.Integer, nullable=True)
 
     current_borrower = db.relationship('User', foreign_keys=[borrower_id])
 
-    def to_dict(self, include_owner=True, include_borrower=False):
-        data = {
-            'id': self.id,
-            'title': self.title,
-            'author': self.author,
-            'cover_image': self.cover_image,
-            'genre': self.genre,
-            'status': self.status,
-            'owner_id': self.owner_id,
-            'borrower_id': self.borrower_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
-        if include_owner and self.owner:
-            data['owner'] = {
-                'id': self.owner.id,
-                'name': self.owner.name,
-                'apartment_number': self.owner.apartment_number
-            }
-        if include_borrower and self.current_borrower:
-            data['borrower'] = {
-                'id': self.current_borrower.id,
-                'name': self.current_borrower.name,
-                'apartment_number': self.current_borrower.apartment_number
-            }
+    __table_args__ = (
+        db.Index('ix_books_owner_status', 'owner_id', 'status'),
+        db.Index('ix_books_borrower_status', 'borrower_id', 'status'),
+        db.Index('ix_books_status_created', 'status', 'created_at'),
+        db.Index('ix_books_fingerprint', 'fingerprint'),
+        db.Index('ix_books_isbn', 'isbn'),
+    )
+
+    serializer = ModelSerializer(
+        ['id', 'title', 'author', 'cover_image', 'genre', 'status',
+         'owner_id', 'borrower_id', 'isbn', 'created_at', 'updated_at'],
+        datetimes=['created_at', 'updated_at'],
+        extras={'owner': ['owner_id'], 'borrower': ['borrower_id']}
+    )
+
+    def to_dict(self, include_owner=True, include_borrower=False,
+                fields=None):
+        """
+        Args:
+            include_owner: Embed the owner's summary
+            include_borrower: Embed the current borrower's summary
+            fields: Optional projection from Book.serializer.parse_fields
+        """
+        serializer = self.serializer
+        data = serializer.dump(self, fields)
+        # Users come from the request's user cache (see user_cache)
+        if include_owner and serializer.wants(fields, 'owner'):
+            owner = get_user(self.owner_id)
+            if owner:
+                data['owner'] = USER_SUMMARY.dump(owner)
+        if include_borrower and serializer.wants(fields, 'borrower'):
+            borrower = get_user(self.borrower_id)
+            if borrower:
+                data['borrower'] = USER_SUMMARY.dump(borrower)
         return data
 
-        
+
 class BorrowRequest(db.Model):
     __tablename__ = 'borrow_requests'
 
@@ -80,38 +100,46 @@ class BorrowRequest(db.Model):
     requested_at = db.Column(db.DateTime, default=datetime.utcnow)
     responded_at = db.Column(db.DateTime, nullable=True)
     returned_at = db.Column(db.DateTime, nullable=True)
+    # Set on approval; reminders.py tracks which reminder went out last
+    due_at = db.Column(db.DateTime, nullable=True)
+    reminder_stage = db.Column(db.SmallInteger, nullable=True)
 
     book = db.relationship('Book', backref='borrow_requests')
     borrower = db.relationship('User', foreign_keys=[borrower_id])
     lender = db.relationship('User', foreign_keys=[lender_id])
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'book_id': self.book_id,
-            'borrower_id': self.borrower_id,
-            'lender_id': self.lender_id,
-            'status': self.status,
-            'message': self.message,
-            'requested_at': self.requested_at.isoformat(),
-            'responded_at': self.responded_at.isoformat() if self.responded_at else None,
-            'returned_at': self.returned_at.isoformat() if self.returned_at else None,
-            'book': {
-                'id': self.book.id,
-                'title': self.book.title,
-                'author': self.book.author
-            } if self.book else None,
-            'borrower': {
-                'id': self.borrower.id,
-                'name': self.borrower.name,
-                'apartment_number': self.borrower.apartment_number
-            } if self.borrower else None,
-            'lender': {
-                'id': self.lender.id,
-                'name': self.lender.name,
-                'apartment_number': self.lender.apartment_number
-            } if self.lender else None
+    __table_args__ = (
+        db.Index('ix_borrow_requests_lender_status', 'lender_id', 'status'),
+        db.Index('ix_borrow_requests_borrower_status',
+                 'borrower_id', 'status'),
+        db.Index('ix_borrow_requests_book_status', 'book_id', 'status'),
+        # Due-date reminders scan only the loans inside their time window
+        db.Index('ix_borrow_requests_status_due', 'status', 'due_at'),
+    )
+
+    serializer = ModelSerializer(
+        ['id', 'book_id', 'borrower_id', 'lender_id', 'status', 'message',
+         'requested_at', 'responded_at', 'returned_at', 'due_at'],
+        datetimes=['requested_at', 'responded_at', 'returned_at', 'due_at'],
+        extras={
+            'book': ['book_id'],
+            'borrower': ['borrower_id'],
+            'lender': ['lender_id']
         }
+    )
+
+    def to_dict(self, fields=None):
+        serializer = self.serializer
+        data = serializer.dump(self, fields)
+        if serializer.wants(fields, 'book'):
+            data['book'] = BOOK_SUMMARY.dump(self.book) if self.book else None
+        if serializer.wants(fields, 'borrower'):
+            borrower = get_user(self.borrower_id)
+            data['borrower'] = USER_SUMMARY.dump(borrower) if borrower else None
+        if serializer.wants(fields, 'lender'):
+            lender = get_user(self.lender_id)
+            data['lender'] = USER_SUMMARY.dump(lender) if lender else None
+        return data
 
 
 class Notification(db.Model):
@@ -119,19 +147,289 @@ class Notification(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    message = db.Column(db.Text, nullable=False)
+    # Free text for legacy rows; templated rows leave it empty and are
+    # rendered from template + references at read time
+    message = db.Column(db.Text, nullable=False, default='')
     is_read = db.Column(db.Boolean, default=False)
     notification_type = db.Column(db.String(50), default='info')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    template = db.Column(db.SmallInteger, nullable=True)
+    book_id = db.Column(db.Integer, nullable=True)
+    actor_id = db.Column(db.Integer, nullable=True)
+    request_id = db.Column(db.Integer, nullable=True)
 
     user = db.relationship('User', backref='notifications')
 
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'message': self.message,
-            'is_read': self.is_read,
-            'notification_type': self.notification_type,
-            'created_at': self.created_at.isoformat()
-        }
\ No newline at end of file
+    __table_args__ = (
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at'),
+        db.Index('ix_notifications_created', 'created_at'),
+    )
+
+    serializer = ModelSerializer(
+        ['id', 'user_id', 'is_read', 'book_id', 'request_id', 'created_at'],
+        datetimes=['created_at'],
+        extras={
+            'message': ['message', 'template', 'book_id', 'actor_id'],
+            'notification_type': ['notification_type', 'template']
+        }
+    )
+
+    def to_dict(self, books=None, users=None, fields=None):
+        """
+        Args:
+            books: Optional {id: Book} map preloaded for a batch of rows
+            users: Optional {id: User} map preloaded for a batch of rows
+            fields: Optional projection from
+                Notification.serializer.parse_fields
+        """
+        from notification_templates import (
+            render_message, notification_type_for
+        )
+
+        serializer = self.serializer
+        data = serializer.dump(self, fields)
+
+        if self.template is None:
+            if serializer.wants(fields, 'message'):
+                data['message'] = self.message
+            if serializer.wants(fields, 'notification_type'):
+                data['notification_type'] = self.notification_type
+            return data
+
+        if serializer.wants(fields, 'message'):
+            if books is None or users is None:
+                books = {self.book_id: db.session.get(Book, self.book_id)
+                         if self.book_id else None}
+                users = {self.actor_id: get_user(self.actor_id)}
+            data['message'] = render_message(
+                self.template,
+                book=books.get(self.book_id),
+                actor=users.get(self.actor_id)
+            )
+        if serializer.wants(fields, 'notification_type'):
+            data['notification_type'] = notification_type_for(self.template)
+        return data
+
+
+class NotificationArchive(db.Model):
+    __tablename__ = 'notifications_archive'
+
+    # Own key: notifications ids are reused by SQLite once the newest rows
+    # are pruned, so they cannot key the archive
+    id = db.Column(db.Integer, primary_key=True)
+    original_id = db.Column(db.Integer, nullable=True, index=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    message = db.Column(db.Text, nullable=False, default='')
+    is_read = db.Column(db.Boolean, default=False)
+    notification_type = db.Column(db.String(50), default='info')
+    created_at = db.Column(db.DateTime)
+    template = db.Column(db.SmallInteger, nullable=True)
+    book_id = db.Column(db.Integer, nullable=True)
+    actor_id = db.Column(db.Integer, nullable=True)
+    request_id = db.Column(db.Integer, nullable=True)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default='pending')
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    available_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_outbox_events_status_id', 'status', 'id'),
+    )
+
+
+class Lease(db.Model):
+    __tablename__ = 'leases'
+
+    name = db.Column(db.String(100), primary_key=True)
+    holder = db.Column(db.String(200), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class BookCooccurrence(db.Model):
+    """
+    Sparse book x book co-borrowing matrix.
+
+    count is the number of residents who borrowed both books; the diagonal
+    (book_id == other_book_id) holds the number of distinct borrowers.
+    """
+    __tablename__ = 'book_cooccurrences'
+
+    book_id = db.Column(db.Integer, primary_key=True)
+    other_book_id = db.Column(db.Integer, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Diagonal only: books ordered by number of distinct borrowers
+        db.Index('ix_book_cooccurrences_popular', 'count',
+                 sqlite_where=db.text('book_id = other_book_id')),
+    )
+
+
+class CoBorrowPair(db.Model):
+    """
+    Which book pairs have been counted for which resident.
+
+    One row per resident and unordered pair (book_id <= other_book_id;
+    equal ids mark the diagonal), so each pair adds to book_cooccurrences
+    once, whatever order borrow events arrive in or how often they are
+    delivered.
+    """
+    __tablename__ = 'co_borrow_pairs'
+
+    borrower_id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    other_book_id = db.Column(db.Integer, primary_key=True)
+
+    __table_args__ = (
+        {'sqlite_with_rowid': False},
+    )
+
+
+class BookNeighbor(db.Model):
+    """Precomputed top-K most similar books for each book."""
+    __tablename__ = 'book_neighbors'
+
+    book_id = db.Column(db.Integer, primary_key=True)
+    neighbor_id = db.Column(db.Integer, primary_key=True)
+    score = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_book_neighbors_book_score', 'book_id', 'score'),
+    )
+
+
+class BookTrigram(db.Model):
+    """Inverted trigram index over book titles and authors."""
+    __tablename__ = 'book_trigrams'
+
+    trigram = db.Column(db.String(3), primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_book_trigrams_book', 'book_id'),
+        # Postings are clustered by trigram; no separate rowid b-tree
+        {'sqlite_with_rowid': False},
+    )
+
+
+class WaitlistEntry(db.Model):
+    """
+    One resident waiting for a book, in queue order.
+
+    Positions only ever grow per book, so joining is an append and the
+    head of the queue is the smallest position; gaps left by residents who
+    leave are harmless.
+    """
+    __tablename__ = 'waitlist_entries'
+
+    id = db.Column(db.Integer, primary_key=True)
+    book_id = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    request_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_waitlist_entries_book_position', 'book_id', 'position',
+                 unique=True),
+        db.Index('ix_waitlist_entries_request', 'request_id', unique=True),
+    )
+
+
+class BorrowEvent(db.Model):
+    """
+    Append-only log of borrow lifecycle transitions (see borrow_events).
+
+    Rows are never updated or deleted, and every column is a small integer:
+    event codes instead of names and Unix seconds instead of datetime
+    text, so the log stays compact and scans column by column.
+    """
+    __tablename__ = 'borrow_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.SmallInteger, nullable=False)
+    occurred_at = db.Column(db.Integer, nullable=False)
+    request_id = db.Column(db.Integer, nullable=False)
+    book_id = db.Column(db.Integer, nullable=False)
+    borrower_id = db.Column(db.Integer, nullable=False)
+    lender_id = db.Column(db.Integer, nullable=False)
+    # None when the system acted, e.g. promoting the head of a waitlist
+    actor_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        # Finds a loan's approval when its return is rolled up
+        db.Index('ix_borrow_events_request_event', 'request_id', 'event'),
+    )
+
+
+class RollupCursor(db.Model):
+    """Last event log entry folded into a set of rollup tables."""
+    __tablename__ = 'rollup_cursors'
+
+    name = db.Column(db.String(100), primary_key=True)
+    last_event_id = db.Column(db.Integer, nullable=False, default=0)
+
+
+class UserLendingDaily(db.Model):
+    """
+    Per-resident lending per UTC day (see analytics).
+
+    One row per user, role ('lender' or 'borrower') and day: loans started
+    that day, loans returned that day and the total length of those loans,
+    so average loan durations add up across any range of days.
+    """
+    __tablename__ = 'lending_daily_users'
+
+    user_id = db.Column(db.Integer, primary_key=True)
+    role = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    loans = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    loan_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    # Clustered by primary key: a resident's days are adjacent on disk, so
+    # a date range is one seek
+    __table_args__ = {'sqlite_with_rowid': False}
+
+
+class BuildingLendingDaily(db.Model):
+    """Per-building lending per UTC day, same counters as UserLendingDaily."""
+    __tablename__ = 'lending_daily_buildings'
+
+    building = db.Column(db.String(20), primary_key=True)
+    role = db.Column(db.String(10), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    loans = db.Column(db.Integer, nullable=False, default=0)
+    returns = db.Column(db.Integer, nullable=False, default=0)
+    loan_seconds = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = {'sqlite_with_rowid': False}
+
+
+class BookLendingDaily(db.Model):
+    """
+    Loans per book per UTC day, split by the borrower's building.
+
+    The book's genre is copied in when the loan starts, so genre trends
+    are read from this table alone.
+    """
+    __tablename__ = 'lending_daily_books'
+
+    day = db.Column(db.Date, primary_key=True)
+    book_id = db.Column(db.Integer, primary_key=True)
+    building = db.Column(db.String(20), primary_key=True)
+    genre = db.Column(db.String(50), nullable=True)
+    loans = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = {'sqlite_with_rowid': False}
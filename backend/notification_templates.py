@@ -0,0 +1,158 @@
+# Template codes stored in Notification.template. Never renumber these;
+# existing rows refer to them.
+BORROW_REQUEST = 1
+REQUEST_APPROVED = 2
+REQUEST_REJECTED = 3
+REQUEST_LENT_ELSEWHERE = 4
+REQUEST_CANCELLED = 5
+BOOK_RETURNED = 6
+MARKED_RETURNED = 7
+WAITLIST_PROMOTED = 8
+MOVED_TO_WAITLIST = 9
+LOAN_DUE_SOON = 10
+LOAN_OVERDUE = 11
+LOAN_OVERDUE_LENDER = 12
+
+# code -> (notification_type, message template)
+TEMPLATES = {
+    BORROW_REQUEST: (
+        'borrow_request',
+        '{actor_name} (Apt {actor_apartment}) wants to borrow "{book_title}".'
+    ),
+    REQUEST_APPROVED: (
+        'request_approved',
+        'Your request to borrow "{book_title}" has been approved! '
+        'Pick it up from Apt {actor_apartment}.'
+    ),
+    REQUEST_REJECTED: (
+        'request_rejected',
+        'Your request to borrow "{book_title}" has been declined '
+        'by Apt {actor_apartment}.'
+    ),
+    REQUEST_LENT_ELSEWHERE: (
+        'request_rejected',
+        'Your request to borrow "{book_title}" was declined because the '
+        'book was lent to someone else.'
+    ),
+    REQUEST_CANCELLED: (
+        'request_cancelled',
+        '{actor_name} (Apt {actor_apartment}) cancelled their request to '
+        'borrow "{book_title}".'
+    ),
+    BOOK_RETURNED: (
+        'book_returned',
+        '{actor_name} (Apt {actor_apartment}) has returned "{book_title}".'
+    ),
+    MARKED_RETURNED: (
+        'return',
+        '"{book_title}" has been marked as returned by Apt {actor_apartment}.'
+    ),
+    WAITLIST_PROMOTED: (
+        'borrow_request',
+        'You are next in line for "{book_title}". Your request has been '
+        'sent to Apt {actor_apartment}.'
+    ),
+    MOVED_TO_WAITLIST: (
+        'request_waitlisted',
+        '"{book_title}" was lent to someone else. You are on the waitlist '
+        'and will be notified when it is your turn.'
+    ),
+    LOAN_DUE_SOON: (
+        'loan_due',
+        '"{book_title}" is due back soon. Please return it to '
+        'Apt {actor_apartment}.'
+    ),
+    LOAN_OVERDUE: (
+        'loan_overdue',
+        '"{book_title}" is overdue. Please return it to '
+        'Apt {actor_apartment} as soon as you can.'
+    ),
+    LOAN_OVERDUE_LENDER: (
+        'loan_overdue',
+        '"{book_title}" is overdue from {actor_name} '
+        '(Apt {actor_apartment}). We have sent them a reminder.'
+    ),
+}
+
+# Shown when a referenced book or user has since been deleted
+MISSING_BOOK_TITLE = 'a book'
+MISSING_ACTOR_NAME = 'A neighbour'
+MISSING_ACTOR_APARTMENT = '?'
+
+
+def render_message(template, book=None, actor=None):
+    """
+    Render the text of a templated notification.
+
+    Args:
+        template: Template code
+        book: Referenced Book, or None if missing
+        actor: Referenced User, or None if missing
+
+    Returns:
+        The rendered English sentence
+    """
+    _, text = TEMPLATES[template]
+    return text.format(
+        book_title=book.title if book else MISSING_BOOK_TITLE,
+        actor_name=actor.name if actor else MISSING_ACTOR_NAME,
+        actor_apartment=(
+            actor.apartment_number if actor else MISSING_ACTOR_APARTMENT
+        )
+    )
+
+
+def notification_type_for(template):
+    return TEMPLATES[template][0]
+
+
+def load_references(notifications):
+    """
+    Batch-load the books and users referenced by templated notifications.
+
+    Issues at most one query per referenced table, regardless of how many
+    notifications are being rendered.
+
+    Args:
+        notifications: Iterable of Notification objects
+
+    Returns:
+        Tuple of (books_by_id, users_by_id) dictionaries
+    """
+    from models import Book
+    from user_cache import prime_users
+
+    book_ids = {n.book_id for n in notifications if n.book_id}
+    actor_ids = {n.actor_id for n in notifications if n.actor_id}
+
+    books = {}
+    if book_ids:
+        books = {
+            book.id: book
+            for book in Book.query.filter(Book.id.in_(book_ids))
+        }
+
+    users = prime_users(actor_ids)
+
+    return books, users
+
+
+def serialize_notifications(notifications, fields=None):
+    """
+    Convert notifications to dicts, rendering templated messages in bulk.
+
+    Args:
+        notifications: List of Notification objects
+        fields: Optional projection from Notification.serializer
+
+    Returns:
+        List of dictionaries as produced by Notification.to_dict
+    """
+    if fields is not None and 'message' not in fields:
+        books, users = {}, {}
+    else:
+        books, users = load_references(notifications)
+    return [
+        n.to_dict(books=books, users=users, fields=fields)
+        for n in notifications
+    ]
@@ -0,0 +1,320 @@
+import json
+import os
+import threading
+import traceback
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import db
+from leases import acquire_lease, lease_holder_id
+from tenancy import each_database
+
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 300
+DISPATCHER_LEASE = 'outbox-dispatcher'
+DISPATCHER_LEASE_SECONDS = 30
+
+# event_type -> handler(list_of_payloads); registered with @outbox_handler
+_handlers = {}
+
+# Set after a commit that wrote outbox events so the dispatcher wakes early
+_wakeup = threading.Event()
+
+
+def outbox_handler(event_type):
+    """
+    Register the function that delivers events of a given type.
+
+    Handlers receive a list of payload dicts (consecutive events of the same
+    type, in order) and run inside the dispatcher's transaction, so any rows
+    they write are committed together with the events being marked done.
+    """
+    def register(handler):
+        _handlers[event_type] = handler
+        return handler
+    return register
+
+
+def enqueue(event_type, payloads):
+    """
+    Write events to the outbox as part of the caller's transaction.
+
+    Nothing is delivered until the caller commits; a rollback discards the
+    events together with the state change that produced them.
+
+    Args:
+        event_type: Key of a registered handler
+        payloads: List of JSON-serializable dicts
+    """
+    from models import OutboxEvent
+
+    if not payloads:
+        return
+
+    db.session.execute(db.insert(OutboxEvent), [
+        {
+            'event_type': event_type,
+            'payload': json.dumps(payload),
+            'status': 'pending'
+        }
+        for payload in payloads
+    ])
+    db.session.info['outbox_pending'] = True
+
+
+def notify(user_id, template, book_id=None, actor_id=None, request_id=None):
+    """
+    Queue a single in-app notification for a user.
+
+    Args:
+        user_id: Recipient
+        template: Template code from notification_templates
+        book_id: Book the notification is about
+        actor_id: User who triggered it
+        request_id: Borrow request it relates to
+    """
+    enqueue('notification', [{
+        'user_id': user_id,
+        'template': template,
+        'book_id': book_id,
+        'actor_id': actor_id,
+        'request_id': request_id
+    }])
+
+
+def notify_many(notifications):
+    """Queue several in-app notifications (dicts with notify's arguments)."""
+    enqueue('notification', notifications)
+
+
+@outbox_handler('notification')
+def _deliver_notifications(payloads):
+    from models import Notification
+
+    rows = []
+    for payload in payloads:
+        template = payload.get('template')
+        rows.append({
+            'user_id': payload['user_id'],
+            'template': template,
+            'book_id': payload.get('book_id'),
+            'actor_id': payload.get('actor_id'),
+            'request_id': payload.get('request_id'),
+            # Only untemplated (legacy) events carry their own text
+            'message': payload.get('message', ''),
+            'notification_type': (
+                payload.get('notification_type', 'info')
+                if template is None else None
+            )
+        })
+    db.session.execute(db.insert(Notification), rows)
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_dispatcher(session):
+    if session.info.pop('outbox_pending', False):
+        _wakeup.set()
+
+
+def dispatch_batch(batch_size=100):
+    """
+    Deliver the oldest pending outbox events.
+
+    Events are handled strictly in id order. Consecutive events of the same
+    type are passed to their handler together. If a handler fails, its
+    events are rescheduled with exponential backoff and the batch stops
+    there, so later events are never delivered ahead of earlier ones.
+
+    Args:
+        batch_size: Maximum number of events to look at
+
+    Returns:
+        Number of events delivered (0 when the outbox is drained or blocked)
+    """
+    from models import OutboxEvent
+
+    now = datetime.utcnow()
+    # Plain rows, not ORM objects: commits between groups would otherwise
+    # expire and reload every remaining event
+    events = db.session.execute(
+        db.select(
+            OutboxEvent.id,
+            OutboxEvent.event_type,
+            OutboxEvent.payload,
+            OutboxEvent.available_at
+        ).where(
+            OutboxEvent.status == 'pending'
+        ).order_by(OutboxEvent.id).limit(batch_size)
+    ).all()
+
+    delivered = 0
+    group = []
+    for outbox_event in events:
+        # Respect ordering: stop at the first event still backing off
+        if outbox_event.available_at and outbox_event.available_at > now:
+            break
+        if group and group[0].event_type != outbox_event.event_type:
+            if not _deliver_group(group):
+                return delivered
+            delivered += len(group)
+            group = []
+        group.append(outbox_event)
+
+    if group and _deliver_group(group):
+        delivered += len(group)
+
+    return delivered
+
+
+def _deliver_group(events):
+    """Run one handler over a group of events and record the outcome."""
+    event_type = events[0].event_type
+    handler = _handlers.get(event_type)
+    ids = [e.id for e in events]
+
+    try:
+        if handler is None:
+            raise LookupError(
+                f'No outbox handler for event type "{event_type}"'
+            )
+        handler([json.loads(e.payload) for e in events])
+        _mark(ids, status='done', processed_at=datetime.utcnow())
+        db.session.commit()
+        return True
+
+    except Exception:
+        db.session.rollback()
+        _record_failure(ids, traceback.format_exc(limit=3))
+        return False
+
+
+def _mark(ids, **values):
+    from models import OutboxEvent
+
+    db.session.execute(
+        db.update(OutboxEvent).where(OutboxEvent.id.in_(ids)).values(**values)
+    )
+
+
+def _record_failure(ids, error):
+    from models import OutboxEvent
+
+    now = datetime.utcnow()
+    for outbox_event in OutboxEvent.query.filter(OutboxEvent.id.in_(ids)):
+        outbox_event.attempts = (outbox_event.attempts or 0) + 1
+        outbox_event.last_error = error
+        if outbox_event.attempts >= MAX_ATTEMPTS:
+            # Park it so it no longer blocks the events queued behind it
+            outbox_event.status = 'failed'
+        else:
+            delay = min(2 ** outbox_event.attempts, MAX_BACKOFF_SECONDS)
+            outbox_event.available_at = now + timedelta(seconds=delay)
+    db.session.commit()
+    print(f"❌ Outbox delivery failed for events {ids}: {error}")
+
+
+def dispatch_pending(batch_size=100):
+    """
+    Drain the outbox until it is empty or blocked by a failing event.
+
+    Returns:
+        Total number of events delivered
+    """
+    total = 0
+    while True:
+        delivered = dispatch_batch(batch_size)
+        if not delivered:
+            return total
+        total += delivered
+
+
+def dispatch_with_lease(holder, batch_size=100,
+                        lease_seconds=DISPATCHER_LEASE_SECONDS):
+    """
+    Drain the outbox for as long as the caller holds the dispatcher lease.
+
+    The lease is renewed before every batch, so a long drain never runs
+    past its TTL. If renewal fails, e.g. because this worker stalled and
+    another one took over, dispatching stops before the next batch. A
+    single batch must finish well within lease_seconds.
+
+    Args:
+        holder: Identifier of the caller (see lease_holder_id)
+        batch_size: Events delivered per transaction
+        lease_seconds: TTL the lease is taken or renewed with
+
+    Returns:
+        Total number of events delivered
+    """
+    total = 0
+    while acquire_lease(DISPATCHER_LEASE, holder, lease_seconds):
+        delivered = dispatch_batch(batch_size)
+        if not delivered:
+            break
+        total += delivered
+    return total
+
+
+class OutboxDispatcher:
+    """
+    Background thread that drains the outbox for one process.
+
+    Every process may run a dispatcher, but only the holder of the
+    dispatcher lease delivers events, which keeps delivery ordered across
+    gunicorn workers. The thread is started lazily from the first request
+    so it is created after any fork.
+    """
+
+    def __init__(self, app, interval=2.0, batch_size=100,
+                 lease_seconds=DISPATCHER_LEASE_SECONDS):
+        self.app = app
+        self.interval = interval
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            thread = threading.Thread(
+                target=self._run, name='outbox-dispatcher', daemon=True
+            )
+            thread.start()
+
+    def _run(self):
+        holder = lease_holder_id()
+        while True:
+            # Each building's outbox and lease live in its own database
+            for tenant in each_database(self.app):
+                try:
+                    dispatch_with_lease(holder, self.batch_size,
+                                        self.lease_seconds)
+                except Exception as e:
+                    where = f' ({tenant})' if tenant else ''
+                    print(f"❌ Outbox dispatcher error{where}: {str(e)}")
+            _wakeup.wait(self.interval)
+            _wakeup.clear()
+
+
+def init_outbox(app):
+    """
+    Start the in-process dispatcher unless OUTBOX_DISPATCHER=off.
+
+    Turn it off when running ``flask outbox-dispatch`` as a separate
+    process instead.
+
+    Args:
+        app: Flask application instance
+    """
+    mode = os.environ.get('OUTBOX_DISPATCHER', 'thread').lower()
+    if mode == 'off':
+        return
+
+    dispatcher = OutboxDispatcher(app)
+    app.extensions['outbox_dispatcher'] = dispatcher
+    app.before_request(dispatcher.ensure_started)
@@ -0,0 +1,285 @@
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import request, jsonify, g
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+# Set in the WSGI environ of requests run inside another request (the
+# /api/batch sub-requests); they are covered by their parent's slot
+SUBREQUEST_ENVIRON_KEY = 'lend_a_read.subrequest'
+
+
+def parse_limit(spec):
+    """
+    Parse a limit such as "10/minute" or "5/second".
+
+    Args:
+        spec: "<count>/<period>", or "off" to disable
+
+    Returns:
+        Tuple (capacity, refill_per_second), or None when disabled
+    """
+    spec = spec.strip().lower()
+    if spec in ('', 'off', 'none', '0'):
+        return None
+
+    count, _, period = spec.partition('/')
+    if period not in PERIODS:
+        raise ValueError(f'Invalid rate limit "{spec}"')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period]
+
+
+def _refill(tokens, updated_at, now, capacity, rate):
+    return min(capacity, tokens + (now - updated_at) * rate)
+
+
+class MemoryBackend:
+    """
+    Token buckets held in this process's memory.
+
+    Fastest option, but every gunicorn worker counts separately. The number
+    of tracked keys is capped; the least recently used buckets are dropped.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now=None):
+        """
+        Try to take one token from the bucket for key.
+
+        Returns:
+            0 if allowed, otherwise the seconds until a token is available
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated_at, now, capacity, rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBackend:
+    """
+    Token buckets in a small SQLite file shared by all local workers.
+
+    Each take() is one short BEGIN IMMEDIATE transaction, so concurrent
+    workers on the same host see a single consistent bucket per key.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)'
+            )
+
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path, timeout=5, isolation_level=None
+            )
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate, now=None):
+        # Wall clock, since the monotonic clock is not shared across processes
+        now = time.time() if now is None else now
+        connection = self._connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated_at FROM buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (capacity, now)
+            tokens = _refill(tokens, updated_at, now, capacity, rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            connection.execute(
+                'INSERT INTO buckets (key, tokens, updated_at) '
+                'VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET '
+                'tokens = excluded.tokens, updated_at = excluded.updated_at',
+                (key, tokens, now)
+            )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return wait
+
+
+def _create_backend():
+    kind = os.environ.get('RATELIMIT_BACKEND', 'memory').lower()
+    if kind == 'sqlite':
+        path = os.environ.get(
+            'RATELIMIT_SQLITE_PATH',
+            os.path.join(tempfile.gettempdir(), 'lend_a_read_ratelimit.db')
+        )
+        return SQLiteBackend(path)
+    return MemoryBackend()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend()
+    return _backend
+
+
+def client_ip():
+    # X-Forwarded-For is only trusted as far as init_proxy_fix allows; the
+    # hops a client adds itself never reach remote_addr
+    return request.remote_addr or 'unknown'
+
+
+def init_proxy_fix(app):
+    """
+    Trust X-Forwarded-For from TRUSTED_PROXY_HOPS proxies (default 0).
+
+    Set it to the number of proxies in front of gunicorn, e.g. 1 behind
+    the Heroku router. remote_addr then becomes the address the outermost
+    trusted proxy saw; anything the client put in the header before that
+    is ignored, so it cannot pick its own rate-limit bucket.
+
+    Args:
+        app: Flask application instance
+    """
+    hops = int(os.environ.get('TRUSTED_PROXY_HOPS', 0))
+    if hops > 0:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
+
+
+def rate_limit(name, default, key='ip'):
+    """
+    Decorator applying a per-client token bucket to a route.
+
+    The limit can be overridden per route with RATELIMIT_<NAME>, e.g.
+    RATELIMIT_LOGIN=20/minute, or disabled with RATELIMIT_<NAME>=off.
+    With key='user' the decorator must sit below @token_required.
+
+    Args:
+        name: Route name used in the environment variable and bucket key
+        default: Default limit, e.g. "10/minute"
+        key: 'ip' to limit per client address, 'user' per signed-in user
+    """
+    limit = parse_limit(
+        os.environ.get(f'RATELIMIT_{name.upper()}', default)
+    )
+
+    def decorator(f):
+        if limit is None:
+            return f
+        capacity, rate = limit
+
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if key == 'user' and g.get('auth_cache'):
+                # User ids repeat across buildings
+                (tenant, _), user = g.auth_cache
+                client = (f'user:{tenant}:{user.id}' if tenant
+                          else f'user:{user.id}')
+            else:
+                client = f'ip:{client_ip()}'
+
+            wait = get_backend().take(f'{name}:{client}', capacity, rate)
+            if wait:
+                response = jsonify({
+                    'error': 'Too many requests',
+                    'message': 'Please slow down and try again shortly'
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(math.ceil(wait))
+                return response
+
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+
+class AdmissionControl:
+    """
+    Caps how many API requests a process handles at once.
+
+    Requests beyond the cap are turned away immediately with 503 instead of
+    queueing behind slow ones (e.g. outbound Google Books calls).
+    /api/batch sub-requests are marked with SUBREQUEST_ENVIRON_KEY and
+    run under their parent's slot, whether they run inline or on the
+    batch's thread pool with an app context of their own.
+    """
+
+    def __init__(self, app, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        app.before_request(self._admit)
+        app.teardown_request(self._release)
+
+    def _admit(self):
+        if (not request.path.startswith('/api/')
+                or request.environ.get(SUBREQUEST_ENVIRON_KEY)):
+            return None
+
+        if not self._slots.acquire(blocking=False):
+            response = jsonify({
+                'error': 'Server busy',
+                'message': 'Too many requests in progress, please retry'
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+
+        g.admission_slot = True
+        return None
+
+    def _release(self, exc=None):
+        # Inline sub-requests share g with their parent; leave its slot be
+        if request.environ.get(SUBREQUEST_ENVIRON_KEY):
+            return
+        if g.pop('admission_slot', False):
+            self._slots.release()
+
+
+def init_admission_control(app):
+    """
+    Enable the per-process concurrency cap (MAX_CONCURRENT_REQUESTS,
+    default 32; 0 disables it).
+
+    Args:
+        app: Flask application instance
+    """
+    max_concurrent = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 32))
+    if max_concurrent > 0:
+        app.extensions['admission_control'] = AdmissionControl(
+            app, max_concurrent
+        )
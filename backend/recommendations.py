@@ -0,0 +1,377 @@
+import heapq
+import math
+import os
+import time
+from collections import Counter, defaultdict
+from database import db
+from outbox import outbox_handler, enqueue
+
+# Requests in these states mean the resident actually borrowed the book
+BORROWED_STATUSES = ('approved', 'returned')
+
+
+def neighbors_per_book():
+    """Number of similar books kept per book (RECOMMENDATION_NEIGHBORS)."""
+    return int(os.environ.get('RECOMMENDATION_NEIGHBORS', 20))
+
+
+def _similarity(together, borrowers_a, borrowers_b):
+    # Cosine similarity of the two books' borrower vectors
+    return together / math.sqrt(borrowers_a * borrowers_b)
+
+
+def _top_neighbors(book_id, row, diagonal, top_k):
+    """Rank one matrix row; row maps other_book_id -> co-borrow count."""
+    own = diagonal.get(book_id)
+    if not own:
+        return []
+    scored = (
+        (_similarity(count, own, diagonal[other]), other)
+        for other, count in row.items()
+        if other != book_id and diagonal.get(other)
+    )
+    return heapq.nlargest(top_k, scored)
+
+
+def _write_neighbors(rankings):
+    """Replace the stored neighbors of every book in rankings."""
+    from models import BookNeighbor
+
+    if not rankings:
+        return
+    db.session.execute(
+        db.delete(BookNeighbor).where(BookNeighbor.book_id.in_(list(rankings)))
+    )
+    rows = [
+        {'book_id': book_id, 'neighbor_id': other, 'score': score}
+        for book_id, ranked in rankings.items()
+        for score, other in ranked
+    ]
+    if rows:
+        db.session.execute(db.insert(BookNeighbor), rows)
+
+
+def queue_borrow(borrow_request):
+    """
+    Record an approved borrow for the recommender via the outbox.
+
+    Called in the same transaction as the approval, so the matrix update
+    happens once, after the borrow is committed, and never slows down the
+    approving request.
+    """
+    enqueue('co_borrow', [{
+        'request_id': borrow_request.id,
+        'book_id': borrow_request.book_id,
+        'borrower_id': borrow_request.borrower_id
+    }])
+
+
+def _pair(a, b):
+    return (a, b) if a <= b else (b, a)
+
+
+def record_borrow(request_id, book_id, borrower_id):
+    """
+    Add one (borrower, book) pair to the co-borrowing matrix.
+
+    Increments the book's diagonal cell and its cells with every other
+    book the resident has borrowed. Which pairs were already counted for
+    the resident is kept in co_borrow_pairs, so each pair is counted
+    exactly once: approvals and event delivery may happen in any order,
+    and a redelivered event changes nothing. Borrowing the same book again
+    is ignored, as the matrix counts residents, not loans.
+
+    Returns:
+        Set of book ids whose similarity scores may have changed
+    """
+    from models import BorrowRequest, BookCooccurrence, CoBorrowPair
+
+    history = set(db.session.execute(
+        db.select(BorrowRequest.book_id).where(
+            BorrowRequest.borrower_id == borrower_id,
+            BorrowRequest.status.in_(BORROWED_STATUSES),
+            BorrowRequest.id != request_id
+        )
+    ).scalars().all())
+
+    counted = set(db.session.execute(
+        db.select(CoBorrowPair.book_id, CoBorrowPair.other_book_id).where(
+            CoBorrowPair.borrower_id == borrower_id,
+            db.or_(CoBorrowPair.book_id == book_id,
+                   CoBorrowPair.other_book_id == book_id)
+        )
+    ).all())
+    pairs = {_pair(book_id, other) for other in history | {book_id}}
+    pairs -= counted
+    if not pairs:
+        return set()
+    db.session.execute(db.insert(CoBorrowPair), [
+        {'borrower_id': borrower_id, 'book_id': a, 'other_book_id': b}
+        for a, b in pairs
+    ])
+
+    cells = set()
+    for a, b in pairs:
+        cells.add((a, b))
+        cells.add((b, a))
+
+    # The book's row; by symmetry also every book whose score depends on
+    # its borrower count
+    row = dict(db.session.execute(
+        db.select(BookCooccurrence.other_book_id, BookCooccurrence.count)
+        .where(BookCooccurrence.book_id == book_id)
+    ).all())
+    existing = {(book_id, other): count for other, count in row.items()}
+    existing.update(
+        ((other, book_id), count) for other, count in row.items()
+    )
+
+    updates = [
+        {'book_id': a, 'other_book_id': b, 'count': existing[(a, b)] + 1}
+        for a, b in cells if (a, b) in existing
+    ]
+    inserts = [
+        {'book_id': a, 'other_book_id': b, 'count': 1}
+        for a, b in cells if (a, b) not in existing
+    ]
+    if updates:
+        db.session.execute(db.update(BookCooccurrence), updates)
+    if inserts:
+        db.session.execute(db.insert(BookCooccurrence), inserts)
+
+    return {b for _, b in cells} | set(row) | {book_id}
+
+
+def refresh_neighbors(book_ids, top_k=None):
+    """
+    Recompute the stored top-K neighbors for the given books.
+
+    Reads only the affected matrix rows plus the diagonal cells they refer
+    to, so the cost grows with the books touched, not the catalogue.
+    """
+    from models import BookCooccurrence
+
+    book_ids = list(book_ids)
+    if not book_ids:
+        return
+    top_k = top_k or neighbors_per_book()
+
+    rows = defaultdict(dict)
+    for a, b, count in db.session.execute(
+        db.select(
+            BookCooccurrence.book_id,
+            BookCooccurrence.other_book_id,
+            BookCooccurrence.count
+        ).where(BookCooccurrence.book_id.in_(book_ids))
+    ).all():
+        rows[a][b] = count
+
+    referenced = set(book_ids)
+    for row in rows.values():
+        referenced.update(row)
+    diagonal = dict(db.session.execute(
+        db.select(BookCooccurrence.book_id, BookCooccurrence.count).where(
+            BookCooccurrence.book_id == BookCooccurrence.other_book_id,
+            BookCooccurrence.book_id.in_(list(referenced))
+        )
+    ).all())
+
+    _write_neighbors({
+        book_id: _top_neighbors(book_id, rows.get(book_id, {}), diagonal,
+                                top_k)
+        for book_id in book_ids
+    })
+
+
+@outbox_handler('co_borrow')
+def _apply_borrows(payloads):
+    changed = set()
+    for payload in payloads:
+        changed |= record_borrow(
+            payload['request_id'], payload['book_id'], payload['borrower_id']
+        )
+    refresh_neighbors(changed)
+
+
+def rebuild_recommendations(top_k=None, batch_size=5000):
+    """
+    Recompute the whole co-borrowing matrix and every book's neighbors.
+
+    Each resident's borrowed books form a sparse basket; every pair in a
+    basket adds one to the matching matrix cell. The matrix is kept as a
+    dict of sparse rows, so memory grows with the number of non-zero cells.
+
+    Args:
+        top_k: Neighbors to keep per book (defaults to the env setting)
+        batch_size: Rows per bulk insert
+
+    Returns:
+        Dictionary with pairs, cells, books and seconds
+    """
+    from models import (BorrowRequest, BookCooccurrence, BookNeighbor,
+                        CoBorrowPair)
+
+    started = time.perf_counter()
+    top_k = top_k or neighbors_per_book()
+
+    baskets = defaultdict(set)
+    pairs = db.session.execute(
+        db.select(BorrowRequest.borrower_id, BorrowRequest.book_id)
+        .where(BorrowRequest.status.in_(BORROWED_STATUSES))
+        .distinct()
+    ).all()
+    for borrower_id, book_id in pairs:
+        baskets[borrower_id].add(book_id)
+
+    matrix = defaultdict(Counter)
+    for books in baskets.values():
+        for book_id in books:
+            row = matrix[book_id]
+            for other in books:
+                row[other] += 1
+
+    diagonal = {book_id: row[book_id] for book_id, row in matrix.items()}
+
+    db.session.execute(db.delete(BookNeighbor))
+    db.session.execute(db.delete(BookCooccurrence))
+    db.session.execute(db.delete(CoBorrowPair))
+
+    # Millions of cells: plain DB-API executemany skips per-value binding
+    cells = [
+        (book_id, other, count)
+        for book_id, row in matrix.items()
+        for other, count in row.items()
+    ]
+    connection = db.session.connection()
+    for start in range(0, len(cells), batch_size):
+        connection.exec_driver_sql(
+            'INSERT INTO book_cooccurrences (book_id, other_book_id, count) '
+            'VALUES (?, ?, ?)',
+            cells[start:start + batch_size]
+        )
+
+    counted = [
+        (borrower_id, a, b)
+        for borrower_id, books in baskets.items()
+        for a in books
+        for b in books
+        if a <= b
+    ]
+    for start in range(0, len(counted), batch_size):
+        connection.exec_driver_sql(
+            'INSERT INTO co_borrow_pairs (borrower_id, book_id, '
+            'other_book_id) VALUES (?, ?, ?)',
+            counted[start:start + batch_size]
+        )
+
+    neighbors = [
+        (book_id, other, score)
+        for book_id, row in matrix.items()
+        for score, other in _top_neighbors(book_id, row, diagonal, top_k)
+    ]
+    for start in range(0, len(neighbors), batch_size):
+        connection.exec_driver_sql(
+            'INSERT INTO book_neighbors (book_id, neighbor_id, score) '
+            'VALUES (?, ?, ?)',
+            neighbors[start:start + batch_size]
+        )
+
+    db.session.commit()
+
+    return {
+        'pairs': len(pairs),
+        'cells': len(cells),
+        'books': len(matrix),
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def similar_books(book_id, limit):
+    """
+    Most similar books to book_id, read from the precomputed neighbors.
+
+    Returns:
+        List of (Book, score) tuples, best first
+    """
+    from models import Book, BookNeighbor
+
+    return db.session.execute(
+        db.select(Book, BookNeighbor.score)
+        .join(BookNeighbor, BookNeighbor.neighbor_id == Book.id)
+        .where(BookNeighbor.book_id == book_id)
+        .order_by(BookNeighbor.score.desc())
+        .limit(limit)
+    ).all()
+
+
+def recommended_books(user_id, limit):
+    """
+    Available books to suggest to a resident.
+
+    Sums the precomputed neighbor scores of everything the resident has
+    borrowed; only those neighbor lists are read, never the whole matrix.
+    Residents without history get the most borrowed books.
+
+    Returns:
+        List of (Book, score) tuples, best first
+    """
+    from models import Book, BorrowRequest, BookNeighbor, BookCooccurrence
+
+    borrowed = set(db.session.execute(
+        db.select(BorrowRequest.book_id).where(
+            BorrowRequest.borrower_id == user_id,
+            BorrowRequest.status.in_(BORROWED_STATUSES)
+        )
+    ).scalars().all())
+
+    scores = Counter()
+    if borrowed:
+        for neighbor_id, score in db.session.execute(
+            db.select(BookNeighbor.neighbor_id, BookNeighbor.score)
+            .where(BookNeighbor.book_id.in_(list(borrowed)))
+        ).all():
+            if neighbor_id not in borrowed:
+                scores[neighbor_id] += score
+
+    if scores:
+        books = db.session.execute(
+            db.select(Book).where(
+                Book.id.in_(list(scores)),
+                Book.status == 'available',
+                Book.owner_id != user_id
+            )
+        ).scalars().all()
+        books.sort(key=lambda book: (-scores[book.id], book.id))
+        if books:
+            return [(book, scores[book.id]) for book in books[:limit]]
+
+    # Most borrowed first, paging through the partial popularity index
+    results = []
+    # Popular books are often lent out, so look well past limit per page
+    page_size = max(limit * 20, 200)
+    offset = 0
+    while len(results) < limit:
+        popular = db.session.execute(
+            db.select(BookCooccurrence.book_id, BookCooccurrence.count)
+            .where(BookCooccurrence.book_id == BookCooccurrence.other_book_id)
+            .order_by(BookCooccurrence.count.desc())
+            .offset(offset)
+            .limit(page_size)
+        ).all()
+        if not popular:
+            break
+        offset += page_size
+
+        counts = dict(popular)
+        books = db.session.execute(
+            db.select(Book).where(
+                Book.id.in_(list(counts)),
+                Book.status == 'available',
+                Book.owner_id != user_id
+            )
+        ).scalars().all()
+        books = [book for book in books if book.id not in borrowed]
+        books.sort(key=lambda book: (-counts[book.id], book.id))
+        results.extend((book, counts[book.id]) for book in books)
+
+    return results[:limit]
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from database import db
+from leases import acquire_lease, lease_holder_id
+from outbox import notify_many
+from tenancy import each_database
+import notification_templates as templates
+
+REMINDER_LEASE = 'loan-reminders'
+
+# BorrowRequest.reminder_stage: the last reminder sent for a loan
+DUE_SOON = 1
+OVERDUE = 2
+
+MAX_LOAN_DAYS = 90
+
+
+def default_loan_days():
+    """Loan period when the lender does not pick one (LOAN_DAYS, default 14)."""
+    return int(os.environ.get('LOAN_DAYS', 14))
+
+
+def due_soon_window():
+    """How long before the due date the first reminder goes out."""
+    return timedelta(hours=float(os.environ.get('LOAN_DUE_SOON_HOURS', 48)))
+
+
+def _claim(ids, stage):
+    """
+    Move loans to a reminder stage, returning the ones this call moved.
+
+    The stage check in the UPDATE makes a reminder go out at most once per
+    loan and stage, even if two schedulers overlap or a batch is retried.
+    """
+    from models import BorrowRequest
+
+    claimable = db.and_(
+        BorrowRequest.id.in_(ids),
+        BorrowRequest.status == 'approved',
+        db.func.coalesce(BorrowRequest.reminder_stage, 0) < stage
+    )
+    claim = db.update(BorrowRequest).where(claimable).values(
+        reminder_stage=stage
+    ).execution_options(synchronize_session=False)
+    columns = (BorrowRequest.id, BorrowRequest.book_id,
+               BorrowRequest.borrower_id, BorrowRequest.lender_id)
+
+    if db.session.get_bind().dialect.update_returning:
+        return db.session.execute(claim.returning(*columns)).all()
+    # Older SQLite builds have no RETURNING; read the ids first instead
+    claimed = db.session.execute(db.select(*columns).where(claimable)).all()
+    db.session.execute(claim)
+    return claimed
+
+
+def _notifications(loans, stage):
+    notifications = []
+    for loan in loans:
+        notifications.append({
+            'user_id': loan.borrower_id,
+            'template': (templates.LOAN_OVERDUE if stage == OVERDUE
+                         else templates.LOAN_DUE_SOON),
+            'book_id': loan.book_id,
+            'actor_id': loan.lender_id,
+            'request_id': loan.id
+        })
+        if stage == OVERDUE:
+            notifications.append({
+                'user_id': loan.lender_id,
+                'template': templates.LOAN_OVERDUE_LENDER,
+                'book_id': loan.book_id,
+                'actor_id': loan.borrower_id,
+                'request_id': loan.id
+            })
+    return notifications
+
+
+def _remind(stage, due_after, due_before, batch_size):
+    """
+    Send one stage of reminders for loans due in [due_after, due_before).
+
+    Walks the (status, due_at) index in due date order, batch_size loans
+    per transaction, so the work depends on the loans in the window and
+    not on the size of the loan history. Every loan a batch reads leaves
+    the scan: it is either claimed or no longer claimable.
+    """
+    from models import BorrowRequest
+
+    query = db.select(BorrowRequest.id).where(
+        BorrowRequest.status == 'approved',
+        BorrowRequest.due_at < due_before,
+        db.func.coalesce(BorrowRequest.reminder_stage, 0) < stage
+    )
+    if due_after is not None:
+        query = query.where(BorrowRequest.due_at >= due_after)
+    query = query.order_by(BorrowRequest.due_at).limit(batch_size)
+
+    sent = 0
+    while True:
+        ids = db.session.execute(query).scalars().all()
+        if not ids:
+            return sent
+
+        claimed = _claim(ids, stage)
+        notify_many(_notifications(claimed, stage))
+        db.session.commit()
+        sent += len(claimed)
+        if len(ids) < batch_size:
+            return sent
+
+
+def send_due_reminders(now=None, batch_size=200):
+    """
+    Remind borrowers of loans that are due soon or overdue.
+
+    A loan gets a "due soon" reminder once it is within
+    due_soon_window() of its due date, and an "overdue" one (also sent to
+    the lender) once the date has passed. Each goes out once per loan; a
+    loan that is first seen already overdue only gets the overdue one.
+
+    Args:
+        now: Reference time (defaults to the current UTC time)
+        batch_size: Loans handled per transaction
+
+    Returns:
+        Dictionary with the number of due_soon and overdue loans reminded
+    """
+    now = now or datetime.utcnow()
+    overdue = _remind(OVERDUE, None, now, batch_size)
+    due_soon = _remind(DUE_SOON, now, now + due_soon_window(), batch_size)
+    return {'due_soon': due_soon, 'overdue': overdue}
+
+
+class ReminderScheduler:
+    """
+    Background thread that sends due-date reminders every interval.
+
+    Runs in every process, but only the holder of the reminder lease
+    scans, so gunicorn workers do not repeat each other's work. In
+    multi-building mode each building is scanned under its own lease.
+    """
+
+    def __init__(self, app, interval_seconds, batch_size=200):
+        self.app = app
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(
+                target=self._run, name='loan-reminders', daemon=True
+            ).start()
+
+    def _run(self):
+        holder = lease_holder_id()
+        # Held across the sleep so the same worker keeps the job
+        lease_seconds = self.interval_seconds * 2 + 60
+        while True:
+            for tenant in each_database(self.app):
+                try:
+                    if acquire_lease(REMINDER_LEASE, holder, lease_seconds):
+                        sent = send_due_reminders(batch_size=self.batch_size)
+                        if sent['due_soon'] or sent['overdue']:
+                            where = f' ({tenant})' if tenant else ''
+                            print(f"⏰ Reminded {sent['due_soon']} due soon, "
+                                  f"{sent['overdue']} overdue loans{where}")
+                except Exception as e:
+                    where = f' ({tenant})' if tenant else ''
+                    print(f"❌ Reminder error{where}: {str(e)}")
+            time.sleep(self.interval_seconds)
+
+
+def init_reminders(app):
+    """
+    Send due-date reminders every LOAN_REMINDER_INTERVAL_MINUTES
+    (default 15; 0 turns the scheduler off, e.g. to use
+    ``flask send-due-reminders`` from cron instead).
+
+    Args:
+        app: Flask application instance
+    """
+    minutes = float(os.environ.get('LOAN_REMINDER_INTERVAL_MINUTES', 15) or 0)
+    if minutes <= 0:
+        return
+    scheduler = ReminderScheduler(app, minutes * 60)
+    app.extensions['reminder_scheduler'] = scheduler
+    app.before_request(scheduler.ensure_started)
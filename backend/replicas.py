@@ -0,0 +1,365 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from flask import current_app, g
+from sqlalchemy import create_engine, make_url
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.pool import NullPool
+from database import db
+from leases import acquire_lease, lease_holder_id
+
+SNAPSHOT_LEASE = 'replica-snapshot'
+
+# Snapshots are refreshed no more often than every this many copy
+# durations, so copying takes at most a tenth of the primary's time
+SNAPSHOT_COPY_RATIO = 10
+
+
+def max_replica_lag():
+    """Default staleness tolerance in seconds (REPLICA_MAX_LAG)."""
+    return float(os.environ.get('REPLICA_MAX_LAG', 5))
+
+
+class Replica:
+    """
+    One read-only copy of the database and what is known about its health.
+
+    Args:
+        name: Label used in logs and ``flask replica-status``
+        url: SQLAlchemy URL of the replica
+        snapshot_path: For local snapshot copies, the file that is
+            periodically refreshed from the primary
+    """
+
+    # Seconds a replica that failed is left alone before it is tried again
+    RETRY_AFTER = 30
+    # Seconds a lag measurement is reused
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self, name, url, snapshot_path=None):
+        self.name = name
+        self.url = url
+        self.snapshot_path = snapshot_path
+        self._engine = None
+        self._pid = None
+        self._lag = None
+        self._checked_at = 0.0
+        self._down_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def engine(self):
+        # Pooled connections must not cross a fork, so each process builds
+        # its own engine on first use
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    if self.snapshot_path:
+                        # Each refresh replaces the file; a pooled
+                        # connection would keep reading the old one
+                        self._engine = create_engine(self.url,
+                                                     poolclass=NullPool)
+                    else:
+                        self._engine = create_engine(self.url,
+                                                     pool_pre_ping=True)
+                    self._pid = os.getpid()
+        return self._engine
+
+    def mark_down(self, error):
+        self._down_until = time.monotonic() + self.RETRY_AFTER
+        print(f"⚠️  Replica {self.name} unavailable, using primary: {error}")
+
+    def lag(self):
+        """
+        Seconds this replica is behind the primary, or None if unusable.
+
+        Measured at most once per CHECK_INTERVAL.
+        """
+        now = time.monotonic()
+        if now < self._down_until:
+            return None
+        if now - self._checked_at < self.CHECK_INTERVAL:
+            return self._lag
+
+        try:
+            self._lag = self._measure_lag()
+        except Exception as e:
+            self._lag = None
+            self.mark_down(e)
+        self._checked_at = now
+        return self._lag
+
+    def _measure_lag(self):
+        if self.snapshot_path:
+            # refresh_snapshot() stamps the file with the time it was taken
+            if not os.path.exists(self.snapshot_path):
+                return None
+            return max(0.0, time.time() - os.path.getmtime(self.snapshot_path))
+
+        dialect = self.engine.dialect.name
+        with self.engine.connect() as connection:
+            if dialect == 'postgresql':
+                return float(connection.exec_driver_sql(
+                    'SELECT COALESCE(EXTRACT(EPOCH FROM now() - '
+                    'pg_last_xact_replay_timestamp()), 0)'
+                ).scalar())
+            # A read-only connection to the primary's own file never lags
+            connection.exec_driver_sql('SELECT 1')
+            return 0.0
+
+
+class ReplicaSet:
+    """
+    The replicas configured for this application, picked round-robin.
+
+    Configured with DATABASE_REPLICAS, a comma-separated list of:
+
+    - ``readonly``: a read-only connection to the primary SQLite file
+    - ``snapshot:<path>``: a copy of the primary SQLite file, refreshed
+      every REPLICA_SNAPSHOT_INTERVAL seconds (default 3, to stay inside
+      the default REPLICA_MAX_LAG of 5), or less often for a database
+      too large to copy that fast (see SNAPSHOT_COPY_RATIO). Needs the
+      primary in WAL mode (SQLITE_JOURNAL_MODE=wal) so copies never
+      block writers.
+    - any other SQLAlchemy URL, e.g. a Postgres streaming replica
+    """
+
+    def __init__(self, primary_url, specs, snapshot_interval=3.0):
+        self.primary_url = primary_url
+        self.snapshot_interval = snapshot_interval
+        # Duration of the slowest copy in the last refresh
+        self.copy_seconds = 0.0
+        self.replicas = [
+            self._build(index, spec) for index, spec in enumerate(specs)
+        ]
+        self._cycle = itertools.count()
+        self._refresher_pid = None
+        self._lock = threading.Lock()
+
+    def _build(self, index, spec):
+        primary_file = _sqlite_path(self.primary_url)
+        if spec == 'readonly':
+            if not primary_file:
+                raise ValueError('readonly replicas need a SQLite primary')
+            return Replica(
+                'readonly',
+                f'sqlite:///file:{primary_file}?mode=ro&uri=true'
+            )
+        if spec.startswith('snapshot:'):
+            if not primary_file:
+                raise ValueError('snapshot replicas need a SQLite primary')
+            path = os.path.abspath(spec.split(':', 1)[1])
+            return Replica(
+                f'snapshot:{os.path.basename(path)}',
+                f'sqlite:///file:{path}?mode=ro&uri=true',
+                snapshot_path=path
+            )
+        return Replica(f'replica-{index + 1}', spec)
+
+    def choose(self, max_lag):
+        """
+        Next replica that is up and no more than max_lag seconds behind.
+
+        Returns:
+            A Replica, or None when the primary has to serve the read
+        """
+        count = len(self.replicas)
+        start = next(self._cycle)
+        for offset in range(count):
+            replica = self.replicas[(start + offset) % count]
+            lag = replica.lag()
+            if lag is not None and lag <= max_lag:
+                return replica
+        return None
+
+    # ── Local snapshots ──
+
+    def ensure_refresher(self):
+        """Start the snapshot thread once per process (after any fork)."""
+        if (self._refresher_pid == os.getpid()
+                or not any(r.snapshot_path for r in self.replicas)):
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+            app = current_app._get_current_object()
+            threading.Thread(
+                target=self._refresh_forever, args=(app,),
+                name='replica-snapshot', daemon=True
+            ).start()
+
+    def refresh_interval(self):
+        """
+        Seconds between snapshot refreshes: REPLICA_SNAPSHOT_INTERVAL, or
+        SNAPSHOT_COPY_RATIO times the last copy's duration if that is
+        longer, so larger databases are copied less often.
+        """
+        return max(self.snapshot_interval,
+                   self.copy_seconds * SNAPSHOT_COPY_RATIO)
+
+    def _refresh_forever(self, app):
+        holder = lease_holder_id()
+        while True:
+            interval = self.refresh_interval()
+            try:
+                with app.app_context():
+                    # One process per host copies; the others just read
+                    if acquire_lease(SNAPSHOT_LEASE, holder,
+                                     ttl_seconds=interval * 3):
+                        self.refresh_snapshots()
+            except Exception as e:
+                print(f"❌ Replica snapshot error: {str(e)}")
+            time.sleep(self.refresh_interval())
+
+    def refresh_snapshots(self):
+        """Copy the primary into every snapshot replica now."""
+        slowest = 0.0
+        for replica in self.replicas:
+            if replica.snapshot_path:
+                slowest = max(slowest, refresh_snapshot(
+                    self.primary_url, replica.snapshot_path
+                ))
+        self.copy_seconds = slowest
+
+
+def _sqlite_path(url):
+    """File behind a SQLite URL, or None for other databases and :memory:."""
+    url = make_url(url)
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        return None
+    return os.path.abspath(url.database)
+
+
+def refresh_snapshot(primary_url, path):
+    """
+    Copy the primary SQLite file into path with the online backup API.
+
+    The copy is taken a few pages at a time (see backup.copy_database),
+    so in WAL mode it reads one pinned snapshot of the primary without
+    blocking writers. It is written to a separate file that then replaces
+    path in one rename: readers of the snapshot never see a half-written
+    copy. The file's mtime is set to the moment the copy started, which
+    is how stale the snapshot is.
+
+    Returns:
+        Seconds the copy took
+    """
+    from backup import copy_database
+
+    started_wall = time.time()
+    started = time.perf_counter()
+    partial = f'{path}.partial'
+    try:
+        copy_database(_sqlite_path(primary_url), partial)
+        os.utime(partial, (started_wall, started_wall))
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return time.perf_counter() - started
+
+
+def _journal_mode(url):
+    connection = sqlite3.connect(_sqlite_path(url))
+    try:
+        return connection.execute('PRAGMA journal_mode').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def init_replicas(app):
+    """
+    Set up read replicas from DATABASE_REPLICAS, if any.
+
+    Args:
+        app: Flask application instance
+    """
+    specs = [
+        spec.strip()
+        for spec in os.environ.get('DATABASE_REPLICAS', '').split(',')
+        if spec.strip()
+    ]
+    if not specs:
+        return
+
+    replicas = ReplicaSet(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        specs,
+        snapshot_interval=float(
+            os.environ.get('REPLICA_SNAPSHOT_INTERVAL', 3)
+        )
+    )
+    if (any(r.snapshot_path for r in replicas.replicas)
+            and replicas.snapshot_interval >= max_replica_lag()):
+        # A snapshot is as old as the interval just before it is refreshed
+        print(f"⚠️  REPLICA_SNAPSHOT_INTERVAL ({replicas.snapshot_interval:g}s)"
+              f" is not below REPLICA_MAX_LAG ({max_replica_lag():g}s); "
+              f"most reads will fall back to the primary")
+    if (any(r.snapshot_path for r in replicas.replicas)
+            and _journal_mode(replicas.primary_url) != 'wal'):
+        # Outside WAL mode every copy step locks writers out
+        print("⚠️  Snapshot replicas need SQLITE_JOURNAL_MODE=wal on the "
+              "primary; copies will hold up writers")
+    app.extensions['replicas'] = replicas
+    app.before_request(replicas.ensure_refresher)
+
+    # Give snapshot replicas a first copy before any request needs one
+    for replica in replicas.replicas:
+        if replica.snapshot_path and not os.path.exists(replica.snapshot_path):
+            replicas.copy_seconds = max(replicas.copy_seconds, refresh_snapshot(
+                replicas.primary_url, replica.snapshot_path
+            ))
+    print(f"✅ Read replicas: {', '.join(r.name for r in replicas.replicas)}")
+
+
+def read_replica(view=None, max_lag=None):
+    """
+    Decorator for read-only views whose queries may go to a replica.
+
+    SELECTs issued by the view run on a replica at most max_lag seconds
+    (default REPLICA_MAX_LAG) behind the primary; anything else still goes
+    to the primary. If no replica is fresh enough, or the replica fails
+    while the view runs, the view is served from the primary instead.
+    Place it below the route decorator and above token_required; the
+    user lookup for authentication still reads the primary (see
+    database.primary_reads), so a deleted user is never let in by a
+    stale replica.
+
+    Usable bare (``@read_replica``) or with arguments
+    (``@read_replica(max_lag=60)``).
+    """
+    if view is None:
+        return lambda f: read_replica(f, max_lag=max_lag)
+
+    @wraps(view)
+    def decorated(*args, **kwargs):
+        replicas = current_app.extensions.get('replicas')
+        # Buildings in multi-building mode have no replicas
+        if (replicas is None or g.get('db_replica') is not None
+                or g.get('db_tenant') is not None):
+            return view(*args, **kwargs)
+
+        tolerance = max_replica_lag() if max_lag is None else max_lag
+        replica = replicas.choose(tolerance)
+        if replica is None:
+            return view(*args, **kwargs)
+
+        g.db_replica = replica.engine
+        try:
+            return view(*args, **kwargs)
+        except SQLAlchemyError as e:
+            # Read-only views are safe to run again on the primary. Any
+            # SQLAlchemy error counts: a missing or damaged snapshot file
+            # does not always surface as a DBAPIError
+            db.session.rollback()
+            replica.mark_down(e)
+            g.db_replica = None
+            return view(*args, **kwargs)
+        finally:
+            g.db_replica = None
+
+    return decorated
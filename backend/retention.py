@@ -0,0 +1,175 @@
+import os
+import time
+from datetime import datetime, timedelta
+from database import db
+
+
+def retention_policy_from_env():
+    """
+    Read the default notification retention policy from the environment.
+
+    NOTIFICATION_RETENTION_DAYS removes notifications older than that many
+    days; NOTIFICATION_KEEP_PER_USER keeps only each user's newest N.
+    Either may be left unset.
+
+    Returns:
+        Dictionary with max_age_days and keep_per_user (None when unset)
+    """
+    def read_int(name):
+        value = os.environ.get(name, '').strip()
+        return int(value) if value else None
+
+    return {
+        'max_age_days': read_int('NOTIFICATION_RETENTION_DAYS'),
+        'keep_per_user': read_int('NOTIFICATION_KEEP_PER_USER')
+    }
+
+
+def _expired_ids(max_age_days, only_read, batch_size):
+    """Yield batches of ids of notifications older than the cutoff."""
+    from models import Notification
+
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    query = db.select(Notification.id).where(Notification.created_at < cutoff)
+    if only_read:
+        query = query.where(Notification.is_read.is_(True))
+    query = query.order_by(Notification.created_at).limit(batch_size)
+
+    while True:
+        ids = db.session.execute(query).scalars().all()
+        if not ids:
+            return
+        yield ids
+
+
+# Users looked at per query when finding who is over the per-user limit
+USER_PAGE_SIZE = 500
+
+
+def _users_over_limit(keep_per_user):
+    """Yield users with more than keep_per_user notifications, by id."""
+    from models import Notification
+
+    last_user_id = 0
+    while True:
+        # One page of users per query, walking the (user_id, created_at)
+        # index, instead of grouping the whole table at once
+        page = db.session.execute(
+            db.select(Notification.user_id)
+            .where(Notification.user_id > last_user_id)
+            .group_by(Notification.user_id)
+            .having(db.func.count(Notification.id) > keep_per_user)
+            .order_by(Notification.user_id)
+            .limit(USER_PAGE_SIZE)
+        ).scalars().all()
+        if not page:
+            return
+        yield from page
+        last_user_id = page[-1]
+
+
+def _overflow_ids(keep_per_user, only_read, batch_size):
+    """Yield batches of ids beyond each user's newest keep_per_user rows."""
+    from models import Notification
+
+    batch = []
+    for user_id in _users_over_limit(keep_per_user):
+        query = db.select(Notification.id).where(
+            Notification.user_id == user_id
+        ).order_by(
+            Notification.created_at.desc(), Notification.id.desc()
+        ).offset(keep_per_user)
+        if only_read:
+            query = query.where(Notification.is_read.is_(True))
+
+        batch.extend(db.session.execute(query).scalars().all())
+        while len(batch) >= batch_size:
+            yield batch[:batch_size]
+            batch = batch[batch_size:]
+
+    if batch:
+        yield batch
+
+
+def _backfill_original_ids():
+    """Archive rows from before original_id existed used id for it."""
+    from models import NotificationArchive
+
+    db.session.execute(
+        db.update(NotificationArchive)
+        .where(NotificationArchive.original_id.is_(None))
+        .values(original_id=NotificationArchive.id)
+    )
+    db.session.commit()
+
+
+def _remove_batch(ids, archive):
+    from models import Notification, NotificationArchive
+
+    if archive:
+        columns = ['user_id', 'message', 'is_read', 'notification_type',
+                   'created_at', 'template', 'book_id', 'actor_id',
+                   'request_id']
+        db.session.execute(
+            db.insert(NotificationArchive).from_select(
+                ['original_id', *columns],
+                db.select(
+                    Notification.id,
+                    *[getattr(Notification, c) for c in columns]
+                ).where(Notification.id.in_(ids))
+            )
+        )
+
+    deleted = db.session.execute(
+        db.delete(Notification).where(Notification.id.in_(ids))
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def prune_notifications(max_age_days=None, keep_per_user=None,
+                        only_read=False, archive=False, batch_size=500,
+                        pause=0.05):
+    """
+    Apply the notification retention policy in small batches.
+
+    Each batch is its own short transaction followed by a pause, so the
+    database lock is released regularly and live requests can interleave.
+
+    Args:
+        max_age_days: Remove notifications older than this many days
+        keep_per_user: Remove all but each user's newest N notifications
+        only_read: Never remove unread notifications
+        archive: Copy rows to notifications_archive before deleting them
+        batch_size: Rows removed per transaction
+        pause: Seconds to sleep between batches
+
+    Returns:
+        Dictionary with rows removed, rows archived, batches and seconds
+    """
+    started = time.perf_counter()
+    removed = 0
+    batches = 0
+
+    if archive:
+        _backfill_original_ids()
+
+    sources = []
+    if max_age_days is not None:
+        sources.append(_expired_ids(max_age_days, only_read, batch_size))
+    if keep_per_user is not None:
+        sources.append(_overflow_ids(keep_per_user, only_read, batch_size))
+
+    for source in sources:
+        for ids in source:
+            removed += _remove_batch(ids, archive)
+            batches += 1
+            if pause:
+                time.sleep(pause)
+
+    return {
+        'removed': removed,
+        'archived': removed if archive else 0,
+        'batches': batches,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
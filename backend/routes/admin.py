@@ -0,0 +1,42 @@
+from datetime import datetime
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from middleware import admin_required
+from exports import (EXPORTS, FORMATS, MIMETYPES, PARQUET_ENABLED,
+                     DEFAULT_CHUNK_ROWS, stream_export)
+
+admin_bp = Blueprint('admin', __name__)
+
+MAX_CHUNK_ROWS = 50000
+
+
+# ──────────────────────────────────────────────
+# Streamed table export (CSV or Parquet)
+# ──────────────────────────────────────────────
+@admin_bp.route('/export/<name>', methods=['GET'])
+@admin_required
+def export(current_user, name):
+    if name not in EXPORTS:
+        return jsonify({
+            'error': f'Unknown export. Use one of: {", ".join(EXPORTS)}'
+        }), 404
+
+    fmt = request.args.get('format', 'csv').strip()
+    if fmt not in FORMATS:
+        return jsonify({'error': 'format must be csv or parquet'}), 400
+    if fmt == 'parquet' and not PARQUET_ENABLED:
+        return jsonify({
+            'error': 'Parquet export is not available on this server'
+        }), 501
+
+    chunk_rows = request.args.get('chunk_rows', DEFAULT_CHUNK_ROWS, type=int)
+    chunk_rows = max(1, min(chunk_rows, MAX_CHUNK_ROWS))
+
+    filename = f'{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}'
+    return Response(
+        stream_with_context(stream_export(name, fmt, chunk_rows)),
+        mimetype=MIMETYPES[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store'
+        }
+    )
@@ -0,0 +1,268 @@
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from database import db
+from models import (Book, BOOK_SUMMARY, UserLendingDaily,
+                    BuildingLendingDaily, BookLendingDaily)
+from middleware import token_required, is_admin
+from replicas import read_replica
+from analytics import LENDER, BORROWER
+
+analytics_bp = Blueprint('analytics', __name__)
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 730
+MAX_TOP_BOOKS = 50
+INTERVALS = ('day', 'week', 'month')
+
+# Rollups are refreshed after commit by the outbox, so a minute of replica
+# lag is not noticeable here
+ANALYTICS_MAX_LAG = 60
+
+
+def _window():
+    """The (first_day, last_day) UTC range chosen with ?days=."""
+    days = request.args.get('days', DEFAULT_DAYS, type=int)
+    days = max(1, min(days, MAX_DAYS))
+    last_day = datetime.utcnow().date()
+    return last_day - timedelta(days=days - 1), last_day
+
+
+def _average_days(seconds, count):
+    return round(seconds / count / 86400, 2) if count else None
+
+
+def _lending_summary(model, key_column, key):
+    """
+    Lent / borrowed totals, average loan lengths and a daily series for
+    one user or building, summed from its rollup rows.
+    """
+    first_day, last_day = _window()
+    rows = db.session.execute(
+        db.select(model.role, model.day, model.loans, model.returns,
+                  model.loan_seconds)
+        .where(key_column == key,
+               model.day >= first_day,
+               model.day <= last_day)
+        .order_by(model.day)
+    ).all()
+
+    names = {LENDER: 'lent', BORROWER: 'borrowed'}
+    loans = Counter()
+    returns = Counter()
+    seconds = Counter()
+    daily = defaultdict(lambda: {'lent': 0, 'borrowed': 0})
+    for role, day, day_loans, day_returns, day_seconds in rows:
+        name = names[role]
+        loans[name] += day_loans
+        returns[name] += day_returns
+        seconds[name] += day_seconds
+        if day_loans:
+            daily[day][name] += day_loans
+
+    return {
+        'from': first_day.isoformat(),
+        'to': last_day.isoformat(),
+        'lent': loans['lent'],
+        'borrowed': loans['borrowed'],
+        'avg_loan_days': {
+            name: _average_days(seconds[name], returns[name])
+            for name in names.values()
+        },
+        'daily': [
+            {'day': day.isoformat(), **counts}
+            for day, counts in sorted(daily.items())
+        ]
+    }
+
+
+def _period(day, interval):
+    if interval == 'week':
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if interval == 'month':
+        return day.strftime('%Y-%m')
+    return day.isoformat()
+
+
+# ──────────────────────────────────────────────
+# One resident's lending and borrowing
+# ──────────────────────────────────────────────
+@analytics_bp.route('/users/<int:user_id>', methods=['GET'])
+@read_replica(max_lag=ANALYTICS_MAX_LAG)
+@token_required
+def get_user_stats(current_user, user_id):
+    # Residents see their own history; administrators see anyone's
+    if user_id != current_user.id and not is_admin(current_user):
+        return jsonify({
+            'error': 'Forbidden',
+            'message': "You can only view your own lending history"
+        }), 403
+
+    summary = _lending_summary(
+        UserLendingDaily, UserLendingDaily.user_id, user_id
+    )
+    return jsonify({
+        'status': 'success',
+        'data': {'user_id': user_id, **summary}
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Every building, busiest first
+# ──────────────────────────────────────────────
+@analytics_bp.route('/buildings', methods=['GET'])
+@read_replica(max_lag=ANALYTICS_MAX_LAG)
+@token_required
+def get_buildings(current_user):
+    first_day, last_day = _window()
+    rows = db.session.execute(
+        db.select(
+            BuildingLendingDaily.building,
+            BuildingLendingDaily.role,
+            db.func.sum(BuildingLendingDaily.loans),
+            db.func.sum(BuildingLendingDaily.returns),
+            db.func.sum(BuildingLendingDaily.loan_seconds)
+        )
+        .where(BuildingLendingDaily.day >= first_day,
+               BuildingLendingDaily.day <= last_day)
+        .group_by(BuildingLendingDaily.building, BuildingLendingDaily.role)
+    ).all()
+
+    buildings = defaultdict(lambda: {'lent': 0, 'borrowed': 0,
+                                     'avg_loan_days': None})
+    for building, role, loans, returns, seconds in rows:
+        entry = buildings[building]
+        if role == LENDER:
+            entry['lent'] = loans
+        else:
+            entry['borrowed'] = loans
+            # Every loan has a borrower, so one role is enough
+            entry['avg_loan_days'] = _average_days(seconds, returns)
+
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'buildings': sorted(
+                ({'building': building, **entry}
+                 for building, entry in buildings.items()),
+                key=lambda entry: (-(entry['lent'] + entry['borrowed']),
+                                   entry['building'])
+            )
+        }
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# One building's lending and borrowing
+# ──────────────────────────────────────────────
+@analytics_bp.route('/buildings/<building>', methods=['GET'])
+@read_replica(max_lag=ANALYTICS_MAX_LAG)
+@token_required
+def get_building_stats(current_user, building):
+    summary = _lending_summary(
+        BuildingLendingDaily, BuildingLendingDaily.building, building
+    )
+    return jsonify({
+        'status': 'success',
+        'data': {'building': building, **summary}
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Most borrowed titles (optionally ?building=)
+# ──────────────────────────────────────────────
+@analytics_bp.route('/top-books', methods=['GET'])
+@read_replica(max_lag=ANALYTICS_MAX_LAG)
+@token_required
+def get_top_books(current_user):
+    first_day, last_day = _window()
+    building = request.args.get('building', '').strip()
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, MAX_TOP_BOOKS))
+
+    loans = db.func.sum(BookLendingDaily.loans).label('loans')
+    query = (
+        db.select(BookLendingDaily.book_id, loans)
+        .where(BookLendingDaily.day >= first_day,
+               BookLendingDaily.day <= last_day)
+        .group_by(BookLendingDaily.book_id)
+        .order_by(loans.desc(), BookLendingDaily.book_id)
+        .limit(limit)
+    )
+    if building:
+        query = query.where(BookLendingDaily.building == building)
+    ranking = db.session.execute(query).all()
+
+    # Only the labels of the ranked books come from the catalogue
+    books = {
+        book.id: book
+        for book in db.session.execute(
+            db.select(Book).where(Book.id.in_([r.book_id for r in ranking]))
+        ).scalars()
+    } if ranking else {}
+
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'building': building or None,
+            'books': [
+                {
+                    'book_id': book_id,
+                    'book': (BOOK_SUMMARY.dump(books[book_id])
+                             if book_id in books else None),
+                    'loans': count
+                }
+                for book_id, count in ranking
+            ]
+        }
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Loans per genre over time (optionally ?building=)
+# ──────────────────────────────────────────────
+@analytics_bp.route('/genres', methods=['GET'])
+@read_replica(max_lag=ANALYTICS_MAX_LAG)
+@token_required
+def get_genre_trends(current_user):
+    first_day, last_day = _window()
+    building = request.args.get('building', '').strip()
+    interval = request.args.get('interval', 'week').strip()
+    if interval not in INTERVALS:
+        return jsonify({'error': 'interval must be day, week or month'}), 400
+
+    query = (
+        db.select(BookLendingDaily.day, BookLendingDaily.genre,
+                  db.func.sum(BookLendingDaily.loans))
+        .where(BookLendingDaily.day >= first_day,
+               BookLendingDaily.day <= last_day)
+        .group_by(BookLendingDaily.day, BookLendingDaily.genre)
+    )
+    if building:
+        query = query.where(BookLendingDaily.building == building)
+
+    totals = Counter()
+    periods = defaultdict(Counter)
+    for day, genre, loans in db.session.execute(query).all():
+        genre = genre or 'General'
+        totals[genre] += loans
+        periods[_period(day, interval)][genre] += loans
+
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'from': first_day.isoformat(),
+            'to': last_day.isoformat(),
+            'building': building or None,
+            'interval': interval,
+            'totals': dict(totals.most_common()),
+            'series': [
+                {'period': period, 'genres': dict(counts.most_common())}
+                for period, counts in sorted(periods.items())
+            ]
+        }
+    }), 200
@@ -3,10 +3,32 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from database import db
 from models import User
 from middleware import token_required, generate_token
+from ratelimit import rate_limit
+from tenancy import UnknownTenant, use_tenant
 
 auth_bp = Blueprint('auth', __name__)
 
 
+def _select_building(data):
+    """
+    Switch to the building named in the request body, if any.
+
+    Returns:
+        An error response, or None to carry on
+    """
+    tenant = str(data.get('tenant') or '').strip()
+    if not tenant:
+        return None
+    try:
+        use_tenant(tenant)
+    except UnknownTenant:
+        return jsonify({
+            'error': 'Unknown building',
+            'message': f'No building is registered as "{tenant}"'
+        }), 404
+    return None
+
+
 # ──────────────────────────────────────────────
 # Register a new user
 # ──────────────────────────────────────────────
@@ -18,6 +40,10 @@ def register():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    error = _select_building(data)
+    if error:
+        return error
+
     apartment_number = data.get('apartment_number', '').strip()
     name = data.get('name', '').strip()
     password = data.get('password', '').strip()
@@ -68,12 +94,17 @@ def register():
 # Login
 # ──────────────────────────────────────────────
 @auth_bp.route('/login', methods=['POST'])
+@rate_limit('login', '10/minute', key='ip')
 def login():
     data = request.get_json()
 
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    error = _select_building(data)
+    if error:
+        return error
+
     apartment_number = data.get('apartment_number', '').strip()
     password = data.get('password', '').strip()
 
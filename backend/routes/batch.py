@@ -0,0 +1,133 @@
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, request, jsonify, current_app, g
+from database import db
+from middleware import token_required
+from ratelimit import SUBREQUEST_ENVIRON_KEY
+from tenancy import use_tenant
+import os
+
+batch_bp = Blueprint('batch', __name__)
+
+MAX_SUBREQUESTS = int(os.environ.get('BATCH_MAX_SUBREQUESTS', 20))
+MAX_PARALLEL = int(os.environ.get('BATCH_MAX_PARALLEL', 4))
+
+
+def _validate(spec):
+    """Return an error message for an unacceptable sub-request, or None."""
+    if not isinstance(spec, dict):
+        return 'Each sub-request must be an object'
+
+    method = str(spec.get('method', 'GET')).upper()
+    path = spec.get('path', '')
+
+    if method != 'GET':
+        return 'Only GET sub-requests are supported'
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return 'path must start with /api/'
+    if path.split('?')[0].rstrip('/') == '/api/batch':
+        return 'Batch requests cannot be nested'
+    return None
+
+
+def _subrequest_environ():
+    """Environ shared by a batch's sub-requests: the caller's address and
+    the marker that keeps them inside the batch's admission slot."""
+    return {
+        'REMOTE_ADDR': request.remote_addr,
+        SUBREQUEST_ENVIRON_KEY: True
+    }
+
+
+def _dispatch(spec, auth_header, environ):
+    """
+    Run one sub-request through the normal routing and view functions.
+
+    The nested request context shares the caller's app context, so the
+    sub-request sees the same g (and cached user) and the same DB session.
+    """
+    error = _validate(spec)
+    if error:
+        return {'status': 400, 'body': {'error': error}}
+
+    with current_app.test_request_context(
+        spec['path'],
+        method='GET',
+        headers={'Authorization': auth_header},
+        query_string=spec.get('params'),
+        environ_base=environ
+    ):
+        response = current_app.full_dispatch_request()
+
+    return {
+        'status': response.status_code,
+        'body': response.get_json(silent=True)
+    }
+
+
+def _dispatch_in_thread(app, spec, auth_cache, auth_header, environ):
+    # Worker threads need their own app context and session; route it to
+    # the caller's building and attach the already-authenticated user to
+    # it without querying again
+    key, user = auth_cache
+    tenant, _ = key
+    with app.app_context():
+        if tenant:
+            use_tenant(tenant)
+        g.auth_cache = (key, db.session.merge(user, load=False))
+        return _dispatch(spec, auth_header, environ)
+
+
+# ──────────────────────────────────────────────
+# Execute several read requests in one round trip
+# ──────────────────────────────────────────────
+@batch_bp.route('', methods=['POST'])
+@token_required
+def run_batch(current_user):
+    data = request.get_json(silent=True)
+
+    if not data:
+        return jsonify({'error': 'No data provided'}), 400
+
+    specs = data.get('requests')
+    if not isinstance(specs, list) or not specs:
+        return jsonify({
+            'error': 'requests must be a non-empty list',
+            'example': {'requests': [{'path': '/api/books/my-books'}]}
+        }), 400
+
+    if len(specs) > MAX_SUBREQUESTS:
+        return jsonify({
+            'error': f'At most {MAX_SUBREQUESTS} sub-requests per batch'
+        }), 400
+
+    max_parallel = data.get('max_parallel', 1)
+    if not isinstance(max_parallel, int) or max_parallel < 1:
+        return jsonify({'error': 'max_parallel must be a positive integer'}), 400
+    max_parallel = min(max_parallel, MAX_PARALLEL, len(specs))
+
+    auth_header = request.headers.get('Authorization', '')
+    environ = _subrequest_environ()
+
+    if max_parallel == 1:
+        # Default: sequential, one auth resolution and one DB session
+        results = [_dispatch(spec, auth_header, environ) for spec in specs]
+    else:
+        app = current_app._get_current_object()
+        auth_cache = g.auth_cache
+        with ThreadPoolExecutor(max_workers=max_parallel) as pool:
+            results = list(pool.map(
+                lambda spec: _dispatch_in_thread(
+                    app, spec, auth_cache, auth_header, environ
+                ),
+                specs
+            ))
+
+    for spec, result in zip(specs, results):
+        if isinstance(spec, dict) and 'id' in spec:
+            result['id'] = spec['id']
+
+    return jsonify({
+        'status': 'success',
+        'data': results,
+        'total': len(results)
+    }), 200
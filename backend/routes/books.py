@@ -1,15 +1,27 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models import Book, User
+from models import Book, USER_SUMMARY
 from middleware import token_required
+from replicas import read_replica
+from user_cache import prime_users, prime_users_for
+from recommendations import similar_books, recommended_books
+from search_index import fuzzy_matches
+from suggestions import get_prefix_index, KINDS as SUGGESTION_KINDS
+from duplicates import find_similar_books, normalize_isbn
+import waitlist
 
 books_bp = Blueprint('books', __name__)
 
+MAX_RECOMMENDATIONS = 50
+MAX_SUGGESTIONS = 20
+DUPLICATE_FIELDS = Book.serializer.parse_fields('id,title,author,owner_id')
+
 
 # ──────────────────────────────────────────────
 # Get all available books (with search & filter)
 # ──────────────────────────────────────────────
 @books_bp.route('', methods=['GET'])
+@read_replica
 @token_required
 def get_all_books(current_user):
     # Query parameters
@@ -18,41 +30,71 @@ def get_all_books(current_user):
     status = request.args.get('status', 'available').strip()
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
+    # exact: substring only; fuzzy: rank by trigram similarity;
+    # auto: substring, falling back to fuzzy when nothing matches
+    match = request.args.get('match', 'auto').strip()
+    if match not in ('auto', 'exact', 'fuzzy'):
+        return jsonify({'error': 'match must be auto, exact or fuzzy'}), 400
+
+    # Optional sparse fieldset, e.g. ?fields=id,title,status
+    try:
+        fields = Book.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
     # Build query
-    query = Book.query
+    query = Book.query.options(*Book.serializer.query_options(Book, fields))
 
     # Filter by status
     if status and status != 'all':
         query = query.filter(Book.status == status)
 
+    # Filter by genre
+    if genre:
+        query = query.filter(Book.genre.ilike(f'%{genre}%'))
+
     # Search by title or author
-    if search:
+    matched_by = None
+    paginated = None
+    if search and match != 'fuzzy':
         search_term = f'%{search}%'
-        query = query.filter(
+        paginated = query.filter(
             db.or_(
                 Book.title.ilike(search_term),
                 Book.author.ilike(search_term)
             )
+        ).order_by(Book.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        matched_by = 'exact'
+
+    # Typo-tolerant fallback, best matches first
+    if search and match != 'exact' and not (paginated and paginated.total):
+        matches = fuzzy_matches(search)
+        if matches is not None:
+            paginated = query.join(
+                matches, matches.c.book_id == Book.id
+            ).order_by(
+                matches.c.similarity.desc(), Book.created_at.desc()
+            ).paginate(page=page, per_page=per_page, error_out=False)
+            matched_by = 'fuzzy'
+
+    if paginated is None:
+        # Order by newest first
+        paginated = query.order_by(Book.created_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
         )
 
-    # Filter by genre
-    if genre:
-        query = query.filter(Book.genre.ilike(f'%{genre}%'))
-
-    # Order by newest first
-    query = query.order_by(Book.created_at.desc())
-
-    # Paginate
-    paginated = query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
-
-    books = [book.to_dict(include_owner=True) for book in paginated.items]
+    prime_users_for(paginated.items, 'owner_id')
+    books = [
+        book.to_dict(include_owner=True, fields=fields)
+        for book in paginated.items
+    ]
 
     return jsonify({
         'status': 'success',
         'data': books,
+        'match': matched_by,
         'pagination': {
             'page': paginated.page,
             'per_page': paginated.per_page,
@@ -77,6 +119,7 @@ def get_book(current_user, book_id):
 
     # Include borrower info only if current user is the owner
     include_borrower = (book.owner_id == current_user.id)
+    prime_users_for([book], 'owner_id', 'borrower_id')
 
     return jsonify({
         'status': 'success',
@@ -110,23 +153,48 @@ def add_book(current_user):
             'required': ['title', 'author']
         }), 400
 
+    isbn = None
+    if data.get('isbn'):
+        isbn = normalize_isbn(data['isbn'])
+        if not isbn:
+            return jsonify({'error': 'Invalid ISBN'}), 400
+
+    # Indexed lookups for the same edition (ISBN, fingerprint or title)
+    similar = find_similar_books(title, author, isbn)
+    own_copy = next((
+        book for book, reason in similar
+        if book.owner_id == current_user.id and reason in ('isbn', 'exact')
+    ), None)
+    if own_copy and not data.get('allow_duplicate'):
+        return jsonify({
+            'error': 'You have already listed this book',
+            'duplicate': own_copy.to_dict(include_owner=False)
+        }), 409
+
     # Create new book
     new_book = Book(
         title=title,
         author=author,
         cover_image=cover_image,
         genre=genre,
+        isbn=isbn,
         status='available',
         owner_id=current_user.id
     )
 
     db.session.add(new_book)
     db.session.commit()
+    get_prefix_index().book_added(title, author, genre)
 
     return jsonify({
         'status': 'success',
         'message': 'Book added successfully',
-        'data': new_book.to_dict(include_owner=True)
+        'data': new_book.to_dict(include_owner=True),
+        'possible_duplicates': [
+            {**book.to_dict(include_owner=False, fields=DUPLICATE_FIELDS),
+             'match': reason}
+            for book, reason in similar
+        ]
     }), 201
 
 
@@ -158,6 +226,8 @@ def update_book(current_user, book_id):
     if not data:
         return jsonify({'error': 'No data provided'}), 400
 
+    previous = (book.title, book.author, book.genre)
+
     # Update fields if provided
     title = data.get('title', '').strip()
     author = data.get('author', '').strip()
@@ -174,6 +244,9 @@ def update_book(current_user, book_id):
         book.genre = genre
 
     db.session.commit()
+    get_prefix_index().book_changed(
+        previous, (book.title, book.author, book.genre)
+    )
 
     return jsonify({
         'status': 'success',
@@ -209,9 +282,12 @@ def delete_book(current_user, book_id):
     # Delete all associated borrow requests
     from models import BorrowRequest
     BorrowRequest.query.filter_by(book_id=book_id).delete()
+    waitlist.clear(book_id)
 
+    previous = (book.title, book.author, book.genre)
     db.session.delete(book)
     db.session.commit()
+    get_prefix_index().book_removed(*previous)
 
     return jsonify({
         'status': 'success',
@@ -227,16 +303,25 @@ def delete_book(current_user, book_id):
 def get_my_books(current_user):
     status_filter = request.args.get('status', '').strip()
 
-    query = Book.query.filter_by(owner_id=current_user.id)
+    try:
+        fields = Book.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = Book.query.options(
+        *Book.serializer.query_options(Book, fields)
+    ).filter_by(owner_id=current_user.id)
 
     if status_filter:
         query = query.filter(Book.status == status_filter)
 
     query = query.order_by(Book.created_at.desc())
     books = query.all()
+    prime_users_for(books, 'borrower_id')
 
     books_data = [
-        book.to_dict(include_owner=False, include_borrower=True)
+        book.to_dict(include_owner=False, include_borrower=True,
+                     fields=fields)
         for book in books
     ]
 
@@ -253,13 +338,22 @@ def get_my_books(current_user):
 @books_bp.route('/my-borrowed', methods=['GET'])
 @token_required
 def get_my_borrowed_books(current_user):
-    books = Book.query.filter_by(
+    try:
+        fields = Book.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    books = Book.query.options(
+        *Book.serializer.query_options(Book, fields)
+    ).filter_by(
         borrower_id=current_user.id,
         status='borrowed'
     ).order_by(Book.updated_at.desc()).all()
+    prime_users_for(books, 'owner_id')
 
     books_data = [
-        book.to_dict(include_owner=True, include_borrower=False)
+        book.to_dict(include_owner=True, include_borrower=False,
+                     fields=fields)
         for book in books
     ]
 
@@ -291,35 +385,55 @@ def mark_returned(current_user, book_id):
             'error': 'This book is not currently borrowed'
         }), 400
 
-    # Create notification for borrower
-    from models import Notification, BorrowRequest
+    from models import BorrowRequest
+    from outbox import notify
+    from transitions import compare_and_set
+    from borrow_events import record_event, RETURNED
+    import notification_templates as templates
     from datetime import datetime
 
     borrower_id = book.borrower_id
 
-    # Update the borrow request status
+    # Update the borrow request status (same order as return_book: request
+    # first, then book) unless the borrower returned it concurrently
     active_request = BorrowRequest.query.filter_by(
         book_id=book_id,
         borrower_id=borrower_id,
         status='approved'
     ).first()
 
+    if active_request and not compare_and_set(
+            BorrowRequest, active_request.id, 'approved',
+            status='returned', returned_at=datetime.utcnow()):
+        db.session.rollback()
+        return jsonify({
+            'error': 'This book is not currently borrowed'
+        }), 409
+
     if active_request:
-        active_request.status = 'returned'
-        active_request.returned_at = datetime.utcnow()
+        record_event(RETURNED, active_request, actor_id=current_user.id)
 
     # Reset book status
-    book.status = 'available'
-    book.borrower_id = None
+    if not compare_and_set(Book, book_id, 'borrowed',
+                           Book.borrower_id == borrower_id,
+                           status='available', borrower_id=None):
+        db.session.rollback()
+        return jsonify({
+            'error': 'This book is not currently borrowed'
+        }), 409
 
     # Notify borrower
-    notification = Notification(
+    notify(
         user_id=borrower_id,
-        message=f'"{book.title}" has been marked as returned by '
-                f'Apt {current_user.apartment_number}.',
-        notification_type='return'
+        template=templates.MARKED_RETURNED,
+        book_id=book.id,
+        actor_id=current_user.id,
+        request_id=active_request.id if active_request else None
     )
-    db.session.add(notification)
+
+    # Offer the book to the next resident in line
+    waitlist.promote_next(book_id)
+
     db.session.commit()
 
     return jsonify({
@@ -329,10 +443,39 @@ def mark_returned(current_user, book_id):
     }), 200
 
 
+# ──────────────────────────────────────────────
+# Autocomplete titles, authors and genres
+# ──────────────────────────────────────────────
+@books_bp.route('/suggest', methods=['GET'])
+@token_required
+def suggest(current_user):
+    prefix = request.args.get('prefix', '')
+    limit = request.args.get('limit', 8, type=int)
+    limit = max(1, min(limit, MAX_SUGGESTIONS))
+
+    kinds = tuple(
+        kind for kind in request.args.get('types', '').split(',') if kind
+    ) or SUGGESTION_KINDS
+
+    index = get_prefix_index()
+    return jsonify({
+        'status': 'success',
+        'data': [
+            {'text': text, 'type': kind, 'count': count}
+            for kind, text, count in index.suggest(
+                prefix, limit=limit, kinds=kinds
+            )
+        ],
+        # False while the index is still being built for the first time
+        'ready': index.ready
+    }), 200
+
+
 # ──────────────────────────────────────────────
 # Get all genres (for filter dropdown)
 # ──────────────────────────────────────────────
 @books_bp.route('/genres', methods=['GET'])
+@read_replica
 @token_required
 def get_genres(current_user):
     genres = db.session.query(Book.genre).distinct().all()
@@ -341,4 +484,93 @@ def get_genres(current_user):
     return jsonify({
         'status': 'success',
         'data': genre_list
-    }), 200
\ No newline at end of file
+    }), 200
+
+
+def _scored_books(results):
+    prime_users_for([book for book, _ in results], 'owner_id')
+    data = []
+    for book, score in results:
+        item = book.to_dict(include_owner=True)
+        item['score'] = round(score, 4)
+        data.append(item)
+    return data
+
+
+# ──────────────────────────────────────────────
+# Books often borrowed by the same residents
+# ──────────────────────────────────────────────
+@books_bp.route('/<int:book_id>/similar', methods=['GET'])
+@read_replica
+@token_required
+def get_similar_books(current_user, book_id):
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, MAX_RECOMMENDATIONS))
+
+    if not db.session.get(Book, book_id):
+        return jsonify({'error': 'Book not found'}), 404
+
+    return jsonify({
+        'status': 'success',
+        'data': _scored_books(similar_books(book_id, limit))
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Personal recommendations from borrowing history
+# ──────────────────────────────────────────────
+@books_bp.route('/recommended', methods=['GET'])
+@read_replica
+@token_required
+def get_recommended_books(current_user):
+    limit = request.args.get('limit', 10, type=int)
+    limit = max(1, min(limit, MAX_RECOMMENDATIONS))
+
+    return jsonify({
+        'status': 'success',
+        'data': _scored_books(recommended_books(current_user.id, limit))
+    }), 200
+
+
+# ──────────────────────────────────────────────
+# Waitlist for a book
+# ──────────────────────────────────────────────
+@books_bp.route('/<int:book_id>/waitlist', methods=['GET'])
+@token_required
+def get_waitlist(current_user, book_id):
+    book = db.session.get(Book, book_id)
+
+    if not book:
+        return jsonify({'error': 'Book not found'}), 404
+
+    queue = waitlist.queue_for(book_id)
+    my_position = next(
+        (index for index, entry in enumerate(queue, start=1)
+         if entry.user_id == current_user.id),
+        None
+    )
+
+    data = {
+        'length': len(queue),
+        'my_position': my_position
+    }
+
+    # Only the owner sees who is waiting
+    if book.owner_id == current_user.id:
+        users = prime_users(entry.user_id for entry in queue)
+        data['entries'] = [
+            {
+                'position': index,
+                'request_id': entry.request_id,
+                'user': USER_SUMMARY.dump(users[entry.user_id])
+                if users.get(entry.user_id) else None,
+                'joined_at': entry.joined_at.isoformat()
+                if entry.joined_at else None
+            }
+            for index, entry in enumerate(queue, start=1)
+        ]
+
+    return jsonify({
+        'status': 'success',
+        'data': data
+    }), 200
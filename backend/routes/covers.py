@@ -0,0 +1,74 @@
+from flask import Blueprint, request, jsonify, send_file
+from database import db
+from models import Book
+from cover_cache import (
+    get_cover_cache, CoverError, THUMBNAIL_SIZES, THUMBNAILS_ENABLED
+)
+
+covers_bp = Blueprint('covers', __name__)
+
+# A book's cover URL can change, so responses are revalidated daily; the
+# ETag is the content hash, making revalidation a cheap 304.
+COVER_MAX_AGE = 86400
+# Served while a thumbnail is still being generated in the background
+PENDING_THUMBNAIL_MAX_AGE = 60
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF8', 'image/gif'),
+    (b'RIFF', 'image/webp'),
+)
+
+
+def _sniff_mimetype(path):
+    with open(path, 'rb') as f:
+        head = f.read(12)
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mimetype
+    return 'application/octet-stream'
+
+
+# ──────────────────────────────────────────────
+# Cached cover image (optionally resized)
+# ──────────────────────────────────────────────
+@covers_bp.route('/<int:book_id>', methods=['GET'])
+def get_cover(book_id):
+    # No token: covers are loaded through <img> tags
+    size = request.args.get('size', 'original')
+    if size != 'original' and size not in THUMBNAIL_SIZES:
+        return jsonify({
+            'error': f'Invalid size. Use one of: original, '
+                     f'{", ".join(THUMBNAIL_SIZES)}'
+        }), 400
+
+    cover_url = db.session.execute(
+        db.select(Book.cover_image).where(Book.id == book_id)
+    ).scalar()
+    if not cover_url:
+        return jsonify({'error': 'Cover not found'}), 404
+
+    cache = get_cover_cache()
+    try:
+        digest = cache.get_original(cover_url)
+    except CoverError as e:
+        return jsonify({'error': 'Cover unavailable', 'message': str(e)}), 502
+
+    path, max_age, etag = cache.object_path(digest), COVER_MAX_AGE, digest
+    if size != 'original' and THUMBNAILS_ENABLED:
+        thumbnail = cache.get_thumbnail(digest, size)
+        if thumbnail:
+            path, etag = thumbnail, f'{digest}-{size}'
+        else:
+            max_age = PENDING_THUMBNAIL_MAX_AGE
+
+    response = send_file(
+        path,
+        mimetype=_sniff_mimetype(path),
+        etag=etag,
+        conditional=True,
+        max_age=max_age
+    )
+    response.cache_control.public = True
+    return response
@@ -0,0 +1,105 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy.orm import joinedload
+from database import db
+from models import Book, BorrowRequest, Notification
+from middleware import token_required
+from replicas import read_replica
+from user_cache import prime_users_for
+
+dashboard_bp = Blueprint('dashboard', __name__)
+
+MAX_RECENT_ITEMS = 20
+
+
+def _counts_by_status(column, owner_column, user_id):
+    """
+    Count rows per status for one user with a single grouped query.
+
+    Returns:
+        Dictionary with 'total' and a 'by_status' breakdown
+    """
+    rows = db.session.execute(
+        db.select(column, db.func.count())
+        .where(owner_column == user_id)
+        .group_by(column)
+    ).all()
+
+    by_status = {status: count for status, count in rows}
+    return {
+        'total': sum(by_status.values()),
+        'by_status': by_status
+    }
+
+
+# ──────────────────────────────────────────────
+# Dashboard summary (counts + a few recent items)
+# ──────────────────────────────────────────────
+@dashboard_bp.route('/summary', methods=['GET'])
+@read_replica
+@token_required
+def get_summary(current_user):
+    limit = request.args.get('limit', 4, type=int)
+    limit = max(0, min(limit, MAX_RECENT_ITEMS))
+
+    # Aggregates: one indexed, grouped query each
+    my_books = _counts_by_status(Book.status, Book.owner_id, current_user.id)
+    incoming = _counts_by_status(
+        BorrowRequest.status, BorrowRequest.lender_id, current_user.id
+    )
+    outgoing = _counts_by_status(
+        BorrowRequest.status, BorrowRequest.borrower_id, current_user.id
+    )
+
+    borrowed_count = db.session.execute(
+        db.select(db.func.count()).select_from(Book).where(
+            Book.borrower_id == current_user.id,
+            Book.status == 'borrowed'
+        )
+    ).scalar()
+
+    unread_count = db.session.execute(
+        db.select(db.func.count()).select_from(Notification).where(
+            Notification.user_id == current_user.id,
+            Notification.is_read.is_(False)
+        )
+    ).scalar()
+
+    # Recent items, bounded by limit
+    recent_books = Book.query.filter(
+        Book.status == 'available'
+    ).order_by(Book.created_at.desc()).limit(limit).all()
+
+    my_recent_books = Book.query.filter(
+        Book.owner_id == current_user.id
+    ).order_by(Book.created_at.desc()).limit(limit).all()
+
+    pending_incoming = BorrowRequest.query.options(
+        joinedload(BorrowRequest.book)
+    ).filter(
+        BorrowRequest.lender_id == current_user.id,
+        BorrowRequest.status == 'pending'
+    ).order_by(BorrowRequest.requested_at.desc()).limit(limit).all()
+
+    # Every user the three lists mention, in one query
+    # (attributes a row doesn't have are skipped)
+    prime_users_for(recent_books + my_recent_books + pending_incoming,
+                    'owner_id', 'borrower_id', 'lender_id')
+
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'my_books': my_books,
+            'borrowed_count': borrowed_count,
+            'incoming_requests': incoming,
+            'outgoing_requests': outgoing,
+            'unread_notifications': unread_count,
+            'recent_books': [
+                book.to_dict(include_owner=True) for book in recent_books
+            ],
+            'my_recent_books': [
+                book.to_dict(include_owner=False, include_borrower=True)
+                for book in my_recent_books
+            ],
+            'pending_incoming': [req.to_dict() for req in pending_incoming]
+        }
+    }), 200
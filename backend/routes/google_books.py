@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from middleware import token_required
+from ratelimit import rate_limit
 import urllib.request
 import urllib.parse
 import json
@@ -8,11 +9,14 @@ import os
 
 google_books_bp = Blueprint('google_books', __name__)
 
-GOOGLE_BOOKS_API = 'https://www.googleapis.com/books/v1/volumes'
+GOOGLE_BOOKS_API = os.environ.get(
+    'GOOGLE_BOOKS_API_URL', 'https://www.googleapis.com/books/v1/volumes'
+)
 
 
 @google_books_bp.route('/search', methods=['GET'])
 @token_required
+@rate_limit('google_books', '30/minute', key='user')
 def search_books(current_user):
     query = request.args.get('q', '').strip()
 
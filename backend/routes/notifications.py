@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from database import db
 from models import Notification
 from middleware import token_required
+from notification_templates import serialize_notifications
 
 notifications_bp = Blueprint('notifications', __name__)
 
@@ -17,8 +18,15 @@ def get_notifications(current_user):
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)
 
+    try:
+        fields = Notification.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Build query
-    query = Notification.query.filter_by(user_id=current_user.id)
+    query = Notification.query.options(
+        *Notification.serializer.query_options(Notification, fields)
+    ).filter_by(user_id=current_user.id)
 
     if unread_only:
         query = query.filter_by(is_read=False)
@@ -31,7 +39,7 @@ def get_notifications(current_user):
         page=page, per_page=per_page, error_out=False
     )
 
-    notifications_data = [n.to_dict() for n in paginated.items]
+    notifications_data = serialize_notifications(paginated.items, fields)
 
     # Get unread count
     unread_count = Notification.query.filter_by(
@@ -1,8 +1,17 @@
 from flask import Blueprint, request, jsonify
 from database import db
-from models import Book, BorrowRequest, Notification
+from models import Book, BorrowRequest
 from middleware import token_required
-from datetime import datetime
+from replicas import read_replica
+from user_cache import prime_users_for
+from outbox import notify, notify_many
+from recommendations import queue_borrow
+from transitions import compare_and_set, current_status
+import notification_templates as templates
+import waitlist
+import borrow_events
+import reminders
+from datetime import datetime, timedelta
 
 requests_bp = Blueprint('requests', __name__)
 
@@ -36,44 +45,60 @@ def create_request(current_user):
             'error': 'You cannot borrow your own book'
         }), 400
 
-    # Book must be available
-    if book.status != 'available':
-        return jsonify({
-            'error': 'This book is not available for borrowing'
-        }), 400
-
-    # Check if user already has a pending request for this book
-    existing_request = BorrowRequest.query.filter_by(
-        book_id=book_id,
-        borrower_id=current_user.id,
-        status='pending'
+    # Check if user already has an open request for this book
+    existing_request = BorrowRequest.query.filter(
+        BorrowRequest.book_id == book_id,
+        BorrowRequest.borrower_id == current_user.id,
+        BorrowRequest.status.in_(('pending', 'waitlisted'))
     ).first()
 
     if existing_request:
         return jsonify({
-            'error': 'You already have a pending request for this book'
+            'error': f'You already have a {existing_request.status} '
+                     f'request for this book'
         }), 409
 
+    # Lent out, or others are already queued: join the back of the line
+    queued = book.status != 'available' or waitlist.has_waiters(book.id)
+
     # Create the borrow request
     new_request = BorrowRequest(
         book_id=book_id,
         borrower_id=current_user.id,
         lender_id=book.owner_id,
         message=message,
-        status='pending'
+        status='waitlisted' if queued else 'pending'
     )
 
     db.session.add(new_request)
+    db.session.flush()
+
+    if queued:
+        borrow_events.record_event(borrow_events.WAITLISTED, new_request,
+                                   actor_id=current_user.id)
+        waitlist.append(book.id, [(new_request.id, current_user.id)])
+        position = waitlist.position_of(new_request.id)
+        db.session.commit()
+
+        return jsonify({
+            'status': 'success',
+            'message': f'This book is not available right now. You are '
+                       f'#{position} on the waitlist.',
+            'data': new_request.to_dict(),
+            'position': position
+        }), 202
+
+    borrow_events.record_event(borrow_events.REQUESTED, new_request,
+                               actor_id=current_user.id)
 
     # Notify the lender
-    notification = Notification(
+    notify(
         user_id=book.owner_id,
-        message=f'{current_user.name} (Apt {current_user.apartment_number}) '
-                f'wants to borrow "{book.title}".',
-        notification_type='borrow_request'
+        template=templates.BORROW_REQUEST,
+        book_id=book.id,
+        actor_id=current_user.id,
+        request_id=new_request.id
     )
-
-    db.session.add(notification)
     db.session.commit()
 
     return jsonify({
@@ -91,7 +116,14 @@ def create_request(current_user):
 def get_incoming_requests(current_user):
     status_filter = request.args.get('status', '').strip()
 
-    query = BorrowRequest.query.filter_by(lender_id=current_user.id)
+    try:
+        fields = BorrowRequest.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = BorrowRequest.query.options(
+        *BorrowRequest.serializer.query_options(BorrowRequest, fields)
+    ).filter_by(lender_id=current_user.id)
 
     if status_filter:
         query = query.filter(BorrowRequest.status == status_filter)
@@ -99,7 +131,8 @@ def get_incoming_requests(current_user):
     query = query.order_by(BorrowRequest.requested_at.desc())
     requests_list = query.all()
 
-    requests_data = [req.to_dict() for req in requests_list]
+    prime_users_for(requests_list, 'borrower_id', 'lender_id')
+    requests_data = [req.to_dict(fields=fields) for req in requests_list]
 
     return jsonify({
         'status': 'success',
@@ -116,7 +149,14 @@ def get_incoming_requests(current_user):
 def get_outgoing_requests(current_user):
     status_filter = request.args.get('status', '').strip()
 
-    query = BorrowRequest.query.filter_by(borrower_id=current_user.id)
+    try:
+        fields = BorrowRequest.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = BorrowRequest.query.options(
+        *BorrowRequest.serializer.query_options(BorrowRequest, fields)
+    ).filter_by(borrower_id=current_user.id)
 
     if status_filter:
         query = query.filter(BorrowRequest.status == status_filter)
@@ -124,7 +164,8 @@ def get_outgoing_requests(current_user):
     query = query.order_by(BorrowRequest.requested_at.desc())
     requests_list = query.all()
 
-    requests_data = [req.to_dict() for req in requests_list]
+    prime_users_for(requests_list, 'borrower_id', 'lender_id')
+    requests_data = [req.to_dict(fields=fields) for req in requests_list]
 
     return jsonify({
         'status': 'success',
@@ -133,6 +174,53 @@ def get_outgoing_requests(current_user):
     }), 200
 
 
+def _conflict(action, request_id):
+    """Response for a transition that lost a race with another request."""
+    return jsonify({
+        'error': f'Cannot {action}. Request status is: '
+                 f'{current_status(BorrowRequest, request_id)}'
+    }), 409
+
+
+def _waitlist_competing_requests(book_id, approved_request_id):
+    """
+    Move every other pending request for a book onto its waitlist.
+
+    The requests change status in a single UPDATE and join the queue in
+    the order they were made, ahead of nobody already waiting.
+
+    Args:
+        book_id: The book that was just lent out
+        approved_request_id: The request that won and must be left alone
+
+    Returns:
+        List of (request_id, borrower_id) rows that were queued
+    """
+    competing = db.and_(
+        BorrowRequest.book_id == book_id,
+        BorrowRequest.id != approved_request_id,
+        BorrowRequest.status == 'pending'
+    )
+    queue = db.update(BorrowRequest).where(competing).values(
+        status='waitlisted'
+    ).execution_options(synchronize_session=False)
+    columns = (BorrowRequest.id, BorrowRequest.borrower_id,
+               BorrowRequest.requested_at)
+
+    if db.session.get_bind().dialect.update_returning:
+        queued = db.session.execute(queue.returning(*columns)).all()
+    else:
+        # Older SQLite builds have no RETURNING; read the ids first instead
+        queued = db.session.execute(db.select(*columns).where(competing)).all()
+        db.session.execute(queue)
+
+    # RETURNING order is unspecified; first come, first served
+    queued = sorted(queued, key=lambda row: (row.requested_at, row.id))
+    entries = [(row.id, row.borrower_id) for row in queued]
+    waitlist.append(book_id, entries)
+    return entries
+
+
 # ──────────────────────────────────────────────
 # Approve a borrow request (Lender)
 # ──────────────────────────────────────────────
@@ -156,6 +244,16 @@ def approve_request(current_user, request_id):
             'error': f'Cannot approve. Request status is: {borrow_request.status}'
         }), 400
 
+    # The lender may pick the loan period
+    data = request.get_json(silent=True) or {}
+    loan_days = data.get('loan_days', reminders.default_loan_days())
+    if (not isinstance(loan_days, int) or isinstance(loan_days, bool)
+            or not 1 <= loan_days <= reminders.MAX_LOAN_DAYS):
+        return jsonify({
+            'error': f'loan_days must be a whole number from 1 to '
+                     f'{reminders.MAX_LOAN_DAYS}'
+        }), 400
+
     # Get the book
     book = db.session.get(Book, borrow_request.book_id)
 
@@ -167,42 +265,59 @@ def approve_request(current_user, request_id):
             'error': 'Book is no longer available'
         }), 400
 
-    # Approve the request
-    borrow_request.status = 'approved'
-    borrow_request.responded_at = datetime.utcnow()
-
-    # Update book status
-    book.status = 'borrowed'
-    book.borrower_id = borrow_request.borrower_id
-
-    # Reject all other pending requests for this book
-    other_requests = BorrowRequest.query.filter(
-        BorrowRequest.book_id == book.id,
-        BorrowRequest.id != request_id,
-        BorrowRequest.status == 'pending'
-    ).all()
-
-    for other_req in other_requests:
-        other_req.status = 'rejected'
-        other_req.responded_at = datetime.utcnow()
+    # Lend the book out, but only if it is still available
+    if not compare_and_set(Book, book.id, 'available',
+                           status='borrowed',
+                           borrower_id=borrow_request.borrower_id):
+        db.session.rollback()
+        return jsonify({
+            'error': 'Book is no longer available'
+        }), 409
 
-        # Notify other borrowers that their request was rejected
-        reject_notification = Notification(
-            user_id=other_req.borrower_id,
-            message=f'Your request to borrow "{book.title}" was declined '
-                    f'because the book was lent to someone else.',
-            notification_type='request_rejected'
+    # Approve the request, but only if it is still pending
+    approved_at = datetime.utcnow()
+    if not compare_and_set(BorrowRequest, request_id, 'pending',
+                           status='approved',
+                           responded_at=approved_at,
+                           due_at=approved_at + timedelta(days=loan_days)):
+        db.session.rollback()
+        return _conflict('approve', request_id)
+
+    borrow_events.record_event(borrow_events.APPROVED, borrow_request,
+                               actor_id=current_user.id)
+
+    # Queue all other pending requests for this book behind the borrower
+    queued = _waitlist_competing_requests(book.id, request_id)
+    for queued_id, borrower_id in queued:
+        borrow_events.record_event(
+            borrow_events.WAITLISTED, borrow_request,
+            actor_id=current_user.id,
+            request_id=queued_id, borrower_id=borrower_id
         )
-        db.session.add(reject_notification)
+
+    # Tell the other borrowers they are now waiting
+    notify_many([
+        {
+            'user_id': borrower_id,
+            'template': templates.MOVED_TO_WAITLIST,
+            'book_id': book.id,
+            'actor_id': current_user.id,
+            'request_id': queued_id
+        }
+        for queued_id, borrower_id in queued
+    ])
 
     # Notify the approved borrower
-    approve_notification = Notification(
+    notify(
         user_id=borrow_request.borrower_id,
-        message=f'Your request to borrow "{book.title}" has been approved! '
-                f'Pick it up from Apt {current_user.apartment_number}.',
-        notification_type='request_approved'
+        template=templates.REQUEST_APPROVED,
+        book_id=book.id,
+        actor_id=current_user.id,
+        request_id=borrow_request.id
     )
-    db.session.add(approve_notification)
+
+    # Feed the co-borrowing recommender
+    queue_borrow(borrow_request)
 
     db.session.commit()
 
@@ -236,21 +351,27 @@ def reject_request(current_user, request_id):
             'error': f'Cannot reject. Request status is: {borrow_request.status}'
         }), 400
 
-    # Get the book
-    book = db.session.get(Book, borrow_request.book_id)
+    # Reject the request, but only if it is still pending
+    if not compare_and_set(BorrowRequest, request_id, 'pending',
+                           status='rejected',
+                           responded_at=datetime.utcnow()):
+        db.session.rollback()
+        return _conflict('reject', request_id)
 
-    # Reject the request
-    borrow_request.status = 'rejected'
-    borrow_request.responded_at = datetime.utcnow()
+    borrow_events.record_event(borrow_events.REJECTED, borrow_request,
+                               actor_id=current_user.id)
 
     # Notify the borrower
-    notification = Notification(
+    notify(
         user_id=borrow_request.borrower_id,
-        message=f'Your request to borrow "{book.title}" has been declined '
-                f'by Apt {current_user.apartment_number}.',
-        notification_type='request_rejected'
+        template=templates.REQUEST_REJECTED,
+        book_id=borrow_request.book_id,
+        actor_id=current_user.id,
+        request_id=borrow_request.id
     )
-    db.session.add(notification)
+
+    # Offer the book to the next resident in line
+    waitlist.promote_next(borrow_request.book_id)
 
     db.session.commit()
 
@@ -284,28 +405,33 @@ def return_book(current_user, request_id):
             'error': f'Cannot return. Request status is: {borrow_request.status}'
         }), 400
 
-    # Get the book
-    book = db.session.get(Book, borrow_request.book_id)
-
-    if not book:
-        return jsonify({'error': 'Book not found'}), 404
+    # Update request status, unless the lender marked it returned first
+    if not compare_and_set(BorrowRequest, request_id, 'approved',
+                           status='returned',
+                           returned_at=datetime.utcnow()):
+        db.session.rollback()
+        return _conflict('return', request_id)
 
-    # Update request status
-    borrow_request.status = 'returned'
-    borrow_request.returned_at = datetime.utcnow()
+    borrow_events.record_event(borrow_events.RETURNED, borrow_request,
+                               actor_id=current_user.id)
 
     # Update book status
-    book.status = 'available'
-    book.borrower_id = None
+    compare_and_set(Book, borrow_request.book_id, 'borrowed',
+                    Book.borrower_id == borrow_request.borrower_id,
+                    status='available',
+                    borrower_id=None)
 
     # Notify the lender
-    notification = Notification(
+    notify(
         user_id=borrow_request.lender_id,
-        message=f'{current_user.name} (Apt {current_user.apartment_number}) '
-                f'has returned "{book.title}".',
-        notification_type='book_returned'
+        template=templates.BOOK_RETURNED,
+        book_id=borrow_request.book_id,
+        actor_id=current_user.id,
+        request_id=borrow_request.id
     )
-    db.session.add(notification)
+
+    # Offer the book to the next resident in line
+    waitlist.promote_next(borrow_request.book_id)
 
     db.session.commit()
 
@@ -333,27 +459,38 @@ def cancel_request(current_user, request_id):
             'error': 'Unauthorized. Only the borrower can cancel the request'
         }), 403
 
-    # Must be pending
-    if borrow_request.status != 'pending':
+    # Must be pending or waiting in line
+    status = borrow_request.status
+    if status not in ('pending', 'waitlisted'):
         return jsonify({
-            'error': f'Cannot cancel. Request status is: {borrow_request.status}'
+            'error': f'Cannot cancel. Request status is: {status}'
         }), 400
 
-    # Get the book
-    book = db.session.get(Book, borrow_request.book_id)
-
-    # Update request status
-    borrow_request.status = 'cancelled'
-    borrow_request.responded_at = datetime.utcnow()
+    # Update request status, but only if it has not moved on meanwhile
+    if not compare_and_set(BorrowRequest, request_id, status,
+                           status='cancelled',
+                           responded_at=datetime.utcnow()):
+        db.session.rollback()
+        return _conflict('cancel', request_id)
+
+    borrow_events.record_event(borrow_events.CANCELLED, borrow_request,
+                               actor_id=current_user.id)
+
+    if status == 'waitlisted':
+        # The lender never saw a queued request; just leave the line
+        waitlist.remove(request_id)
+    else:
+        # Notify the lender
+        notify(
+            user_id=borrow_request.lender_id,
+            template=templates.REQUEST_CANCELLED,
+            book_id=borrow_request.book_id,
+            actor_id=current_user.id,
+            request_id=borrow_request.id
+        )
 
-    # Notify the lender
-    notification = Notification(
-        user_id=borrow_request.lender_id,
-        message=f'{current_user.name} (Apt {current_user.apartment_number}) '
-                f'cancelled their request to borrow "{book.title}".',
-        notification_type='request_cancelled'
-    )
-    db.session.add(notification)
+        # Offer the book to the next resident in line
+        waitlist.promote_next(borrow_request.book_id)
 
     db.session.commit()
 
@@ -392,15 +529,24 @@ def get_request(current_user, request_id):
 # Get borrowing history (Borrower)
 # ──────────────────────────────────────────────
 @requests_bp.route('/history', methods=['GET'])
+@read_replica
 @token_required
 def get_borrow_history(current_user):
-    requests_list = BorrowRequest.query.filter_by(
+    try:
+        fields = BorrowRequest.serializer.fields_from_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    requests_list = BorrowRequest.query.options(
+        *BorrowRequest.serializer.query_options(BorrowRequest, fields)
+    ).filter_by(
         borrower_id=current_user.id
     ).order_by(
         BorrowRequest.requested_at.desc()
     ).all()
 
-    requests_data = [req.to_dict() for req in requests_list]
+    prime_users_for(requests_list, 'borrower_id', 'lender_id')
+    requests_data = [req.to_dict(fields=fields) for req in requests_list]
 
     return jsonify({
         'status': 'success',
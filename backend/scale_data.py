@@ -0,0 +1,410 @@
+import random
+import time
+from datetime import datetime, timedelta
+from database import db
+from duplicates import fingerprint
+import notification_templates as templates
+
+
+# Fixed reference point so the generated timestamps only depend on the seed
+BASE_DATE = datetime(2024, 1, 1)
+HISTORY_DAYS = 365
+
+FIRST_NAMES = [
+    'Alice', 'Bob', 'Charlie', 'Diana', 'Eve', 'Frank', 'Grace', 'Henry',
+    'Isla', 'Jack', 'Kavya', 'Liam', 'Maya', 'Noah', 'Olivia', 'Priya',
+    'Quinn', 'Rahul', 'Sofia', 'Tom', 'Uma', 'Victor', 'Wen', 'Yusuf', 'Zara'
+]
+
+LAST_NAMES = [
+    'Johnson', 'Smith', 'Brown', 'Prince', 'Williams', 'Garcia', 'Lee',
+    'Nair', 'Okafor', 'Rossi', 'Schmidt', 'Tanaka', 'Khan', 'Silva', 'Ivanova'
+]
+
+# Genre -> (weight, authors ordered by popularity)
+GENRES = {
+    'Fiction': (30, [
+        'Harper Lee', 'F. Scott Fitzgerald', 'Paulo Coelho', 'Toni Morrison',
+        'Haruki Murakami', 'Chimamanda Ngozi Adichie', 'John Steinbeck'
+    ]),
+    'Mystery': (14, [
+        'Agatha Christie', 'Arthur Conan Doyle', 'Tana French',
+        'Raymond Chandler', 'Louise Penny'
+    ]),
+    'Science Fiction': (12, [
+        'Frank Herbert', 'George Orwell', 'Isaac Asimov', 'Ursula K. Le Guin',
+        'Liu Cixin', 'Octavia E. Butler'
+    ]),
+    'Non-Fiction': (11, [
+        'Yuval Noah Harari', 'Malcolm Gladwell', 'Rebecca Skloot',
+        'Bill Bryson', 'Michelle Obama'
+    ]),
+    'Romance': (9, [
+        'Jane Austen', 'Nicholas Sparks', 'Emily Henry', 'Nora Roberts'
+    ]),
+    'Self-Help': (8, [
+        'James Clear', 'Dale Carnegie', 'Brene Brown', 'Stephen R. Covey'
+    ]),
+    'Fantasy': (8, [
+        'J.R.R. Tolkien', 'Brandon Sanderson', 'N.K. Jemisin', 'Terry Pratchett'
+    ]),
+    'Biography': (5, [
+        'Walter Isaacson', 'Ron Chernow', 'Tara Westover'
+    ]),
+    'Children': (3, [
+        'Roald Dahl', 'Dr. Seuss', 'Julia Donaldson'
+    ]),
+}
+
+TITLE_ADJECTIVES = [
+    'Silent', 'Hidden', 'Last', 'Golden', 'Broken', 'Distant', 'Secret',
+    'Burning', 'Quiet', 'Endless', 'Forgotten', 'Wild', 'Little', 'Midnight'
+]
+
+TITLE_NOUNS = [
+    'River', 'Garden', 'Empire', 'Letters', 'Harbor', 'Kingdom', 'Orchard',
+    'Library', 'Storm', 'Island', 'Promise', 'Mountain', 'Station', 'House'
+]
+
+# Final status of a generated borrow request and its relative frequency
+REQUEST_STATUSES = [
+    ('returned', 45), ('rejected', 18), ('cancelled', 10),
+    ('pending', 17), ('approved', 10)
+]
+
+NOTIFICATION_TEMPLATES = [
+    (templates.BORROW_REQUEST, 30), (templates.REQUEST_APPROVED, 20),
+    (templates.REQUEST_REJECTED, 10), (templates.REQUEST_LENT_ELSEWHERE, 5),
+    (templates.BOOK_RETURNED, 15), (templates.MARKED_RETURNED, 10),
+    (templates.REQUEST_CANCELLED, 10)
+]
+
+
+def _zipf_weights(n, exponent=1.0):
+    """Popularity weights where the k-th item is 1/k^exponent as likely."""
+    return [1.0 / ((rank + 1) ** exponent) for rank in range(n)]
+
+
+def _cumulative(weights):
+    total = 0
+    cumulative = []
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def _building_code(index):
+    """Turn a 0-based building index into a code like A, B, ..., Z, AA."""
+    code = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        code = chr(ord('A') + remainder) + code
+    return code
+
+
+def _apartment_number(user_id, buildings):
+    """
+    Deterministic, globally unique apartment number for a user id.
+
+    The number part comes from the user id alone and is unique by itself,
+    so re-running the generator with another building count never
+    produces a number that is already taken.
+    """
+    building = _building_code(user_id % buildings)
+    floor, unit = divmod(user_id, 20)
+    return f'{building}-{floor + 1}{unit + 1:02d}'
+
+
+def _sql_value(value):
+    # Same text layout SQLAlchemy uses for DateTime columns on SQLite
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ', timespec='microseconds')
+    return value
+
+
+def _insert_in_batches(model, rows, batch_size):
+    """
+    Insert plain dict rows with DB-API executemany, one batch at a time.
+
+    Going through exec_driver_sql skips SQLAlchemy's per-value bind
+    processing, which dominates the cost at millions of rows.
+    """
+    if not rows:
+        return
+
+    columns = list(rows[0])
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        model.__tablename__,
+        ', '.join(columns),
+        ', '.join('?' for _ in columns)
+    )
+    connection = db.session.connection()
+    for start in range(0, len(rows), batch_size):
+        connection.exec_driver_sql(sql, [
+            tuple(_sql_value(row[column]) for column in columns)
+            for row in rows[start:start + batch_size]
+        ])
+
+
+def generate_scale_data(users=1000, books=5000, requests=20000,
+                        notifications=50000, buildings=10, seed=42,
+                        batch_size=10000, password='password123'):
+    """
+    Bulk-insert a large, reproducible dataset for load and query testing.
+
+    Rows are built in memory from a seeded random generator and written with
+    executemany batches, bypassing the ORM unit of work. All generated users
+    share one precomputed password hash so hashing cost is paid once.
+
+    Args:
+        users: Number of users to create
+        books: Number of books to create
+        requests: Number of borrow requests to create
+        notifications: Number of notifications to create
+        buildings: Number of buildings the users are spread across
+        seed: Random seed; the same seed always produces the same rows
+        batch_size: Rows per executemany call
+        password: Plain-text password shared by all generated users
+
+    Returns:
+        Dictionary with the number of rows inserted per table and the
+        elapsed time in seconds
+    """
+    if users < 2:
+        raise ValueError('At least two users are needed to generate borrowing')
+
+    started = time.perf_counter()
+
+    # Loading is a one-off bulk job; trade durability for speed, then put
+    # the pooled connection back the way it was
+    synchronous = db.session.execute(db.text('PRAGMA synchronous')).scalar()
+    db.session.execute(db.text('PRAGMA synchronous = OFF'))
+    try:
+        counts = _generate(users, books, requests, notifications, buildings,
+                           seed, batch_size, password)
+    finally:
+        db.session.rollback()
+        db.session.execute(db.text(f'PRAGMA synchronous = {int(synchronous)}'))
+        db.session.commit()
+
+    counts['seconds'] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def _generate(users, books, requests, notifications, buildings, seed,
+              batch_size, password):
+    from models import User, Book, BorrowRequest, Notification, WaitlistEntry
+    from reminders import default_loan_days
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+
+    # Continue after any existing rows so the generator can be re-run
+    user_offset = db.session.query(db.func.max(User.id)).scalar() or 0
+    book_offset = db.session.query(db.func.max(Book.id)).scalar() or 0
+    request_offset = db.session.query(
+        db.func.max(BorrowRequest.id)
+    ).scalar() or 0
+
+    password_hash = generate_password_hash(password)
+
+    # ── Users ──
+    user_ids = list(range(user_offset + 1, user_offset + users + 1))
+    user_rows = []
+    for user_id in user_ids:
+        user_rows.append({
+            'id': user_id,
+            'apartment_number': _apartment_number(user_id, buildings),
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'password_hash': password_hash,
+            'created_at': BASE_DATE + timedelta(
+                seconds=rng.randrange(HISTORY_DAYS * 86400)
+            )
+        })
+
+    # A few residents are far more active than the rest
+    user_cum_weights = _cumulative(_zipf_weights(users, 0.6))
+
+    # ── Books ──
+    genre_names = list(GENRES)
+    genre_cum_weights = _cumulative([GENRES[g][0] for g in genre_names])
+    author_cum_weights = {
+        genre: _cumulative(_zipf_weights(len(GENRES[genre][1])))
+        for genre in genre_names
+    }
+
+    book_ids = list(range(book_offset + 1, book_offset + books + 1))
+    book_genres = rng.choices(genre_names, cum_weights=genre_cum_weights,
+                              k=books)
+    book_owners = rng.choices(user_ids, cum_weights=user_cum_weights, k=books)
+    book_rows = []
+    for book_id, genre, owner_id in zip(book_ids, book_genres, book_owners):
+        author = rng.choices(
+            GENRES[genre][1], cum_weights=author_cum_weights[genre]
+        )[0]
+        created_at = BASE_DATE + timedelta(
+            seconds=rng.randrange(HISTORY_DAYS * 86400)
+        )
+        title = (f'The {rng.choice(TITLE_ADJECTIVES)} '
+                 f'{rng.choice(TITLE_NOUNS)} {book_id}')
+        book_rows.append({
+            'id': book_id,
+            'title': title,
+            'author': author,
+            'fingerprint': fingerprint(title, author),
+            'cover_image': '',
+            'genre': genre,
+            'status': 'available',
+            'owner_id': owner_id,
+            'borrower_id': None,
+            'created_at': created_at,
+            'updated_at': created_at
+        })
+
+    # ── Borrow requests ──
+    book_cum_weights = _cumulative(_zipf_weights(books, 0.8))
+    status_names = [s for s, _ in REQUEST_STATUSES]
+    status_cum_weights = _cumulative([w for _, w in REQUEST_STATUSES])
+
+    # Draw every random column up front; one choices() call per column is
+    # much cheaper than one per row
+    requested_books = rng.choices(
+        book_rows, cum_weights=book_cum_weights, k=requests
+    )
+    requesters = rng.choices(user_ids, cum_weights=user_cum_weights, k=requests)
+    statuses = rng.choices(
+        status_names, cum_weights=status_cum_weights, k=requests
+    )
+
+    request_rows = []
+    request_id = request_offset
+    for book, borrower_id, status in zip(requested_books, requesters,
+                                         statuses):
+        if borrower_id == book['owner_id']:
+            continue
+
+        # A book can only be out with one borrower at a time
+        if status == 'approved':
+            if book['status'] == 'borrowed':
+                status = 'returned'
+            else:
+                book['status'] = 'borrowed'
+                book['borrower_id'] = borrower_id
+
+        requested_at = book['created_at'] + timedelta(
+            seconds=rng.randrange(HISTORY_DAYS * 86400)
+        )
+        responded_at = None
+        returned_at = None
+        due_at = None
+        if status != 'pending':
+            responded_at = requested_at + timedelta(
+                minutes=rng.randrange(10, 3 * 1440)
+            )
+        if status in ('approved', 'returned'):
+            # Loan periods around the default, so reminder scans see loans
+            # spread over every due date
+            due_at = responded_at + timedelta(
+                days=rng.randrange(7, 2 * default_loan_days() + 1)
+            )
+        if status == 'returned':
+            returned_at = responded_at + timedelta(
+                hours=rng.randrange(24, 45 * 24)
+            )
+
+        request_id += 1
+        request_rows.append({
+            'id': request_id,
+            'book_id': book['id'],
+            'borrower_id': borrower_id,
+            'lender_id': book['owner_id'],
+            'status': status,
+            'message': '',
+            'requested_at': requested_at,
+            'responded_at': responded_at,
+            'returned_at': returned_at,
+            'due_at': due_at
+        })
+
+    # ── Waitlists ──
+    # As the API does: a resident has one open request per book, and a
+    # request for a book that is out joins the back of its queue
+    book_by_id = {book['id']: book for book in book_rows}
+    open_requests = set()
+    queues = {}
+    for row in sorted(request_rows, key=lambda row: row['requested_at']):
+        if row['status'] != 'pending':
+            continue
+        key = (row['book_id'], row['borrower_id'])
+        if key in open_requests:
+            row['status'] = 'cancelled'
+            row['responded_at'] = row['requested_at']
+            continue
+        open_requests.add(key)
+        if book_by_id[row['book_id']]['status'] == 'borrowed':
+            row['status'] = 'waitlisted'
+            queues.setdefault(row['book_id'], []).append(row)
+
+    waitlist_rows = [
+        {
+            'book_id': book_id,
+            'position': position,
+            'request_id': row['id'],
+            'user_id': row['borrower_id'],
+            'created_at': row['requested_at']
+        }
+        for book_id, queue in queues.items()
+        for position, row in enumerate(queue, start=1)
+    ]
+
+    # ── Notifications ──
+    template_codes = [t for t, _ in NOTIFICATION_TEMPLATES]
+    template_cum_weights = _cumulative([w for _, w in NOTIFICATION_TEMPLATES])
+    history_seconds = HISTORY_DAYS * 86400
+
+    notified_books = rng.choices(
+        book_rows, cum_weights=book_cum_weights, k=notifications
+    )
+    recipients = rng.choices(
+        user_ids, cum_weights=user_cum_weights, k=notifications
+    )
+    codes = rng.choices(template_codes, cum_weights=template_cum_weights,
+                        k=notifications)
+    actors = rng.choices(user_ids, cum_weights=user_cum_weights,
+                         k=notifications)
+
+    notification_rows = []
+    for book, user_id, code, actor_id in zip(notified_books, recipients,
+                                             codes, actors):
+        age = rng.randrange(history_seconds)
+        # Old notifications have almost all been read, recent ones mostly not
+        read_probability = 0.3 + 0.65 * (age / history_seconds)
+        notification_rows.append({
+            'user_id': user_id,
+            'message': '',
+            'is_read': rng.random() < read_probability,
+            'notification_type': None,
+            'template': code,
+            'book_id': book['id'],
+            'actor_id': actor_id,
+            'created_at': BASE_DATE + timedelta(
+                seconds=history_seconds - age
+            )
+        })
+
+    _insert_in_batches(User, user_rows, batch_size)
+    _insert_in_batches(Book, book_rows, batch_size)
+    _insert_in_batches(BorrowRequest, request_rows, batch_size)
+    _insert_in_batches(WaitlistEntry, waitlist_rows, batch_size)
+    _insert_in_batches(Notification, notification_rows, batch_size)
+    db.session.commit()
+
+    return {
+        'users': len(user_rows),
+        'books': len(book_rows),
+        'requests': len(request_rows),
+        'waitlisted': len(waitlist_rows),
+        'notifications': len(notification_rows)
+    }
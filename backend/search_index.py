@@ -0,0 +1,260 @@
+import math
+import os
+import re
+import time
+import unicodedata
+from sqlalchemy import event, inspect
+from database import db
+from models import Book, BookTrigram
+
+_NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def fuzzy_threshold():
+    """Dice similarity a match needs (SEARCH_FUZZY_THRESHOLD)."""
+    return float(os.environ.get('SEARCH_FUZZY_THRESHOLD', 0.3))
+
+
+def max_postings():
+    """
+    Posting list length above which a trigram is too common to scan
+    (SEARCH_MAX_POSTINGS).
+    """
+    return int(os.environ.get('SEARCH_MAX_POSTINGS', 10000))
+
+
+def normalize(text):
+    """Casefold, drop accents and reduce punctuation to single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(' ', text.casefold()).strip()
+
+
+def trigrams(text):
+    """
+    Trigram set of a string, built per word.
+
+    Words are padded with two leading spaces and one trailing space, so
+    beginnings of words weigh more and short words still produce trigrams.
+    """
+    grams = set()
+    for word in normalize(text).split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def book_trigrams(title, author):
+    return trigrams(f'{title} {author}')
+
+
+# ── Incremental maintenance ──
+
+def _index_rows(book_id, title, author):
+    return [
+        {'trigram': gram, 'book_id': book_id}
+        for gram in book_trigrams(title, author)
+    ]
+
+
+@event.listens_for(Book, 'before_insert')
+@event.listens_for(Book, 'before_update')
+def _count_trigrams(mapper, connection, book):
+    state = inspect(book)
+    if (book.trigram_count is None
+            or state.attrs.title.history.has_changes()
+            or state.attrs.author.history.has_changes()):
+        book.trigram_count = len(book_trigrams(book.title, book.author))
+
+
+@event.listens_for(Book, 'after_insert')
+def _index_new_book(mapper, connection, book):
+    rows = _index_rows(book.id, book.title, book.author)
+    if rows:
+        connection.execute(db.insert(BookTrigram), rows)
+
+
+@event.listens_for(Book, 'after_update')
+def _reindex_book(mapper, connection, book):
+    state = inspect(book)
+    if not (state.attrs.title.history.has_changes()
+            or state.attrs.author.history.has_changes()):
+        return
+    connection.execute(
+        db.delete(BookTrigram).where(BookTrigram.book_id == book.id)
+    )
+    rows = _index_rows(book.id, book.title, book.author)
+    if rows:
+        connection.execute(db.insert(BookTrigram), rows)
+
+
+@event.listens_for(Book, 'after_delete')
+def _unindex_book(mapper, connection, book):
+    connection.execute(
+        db.delete(BookTrigram).where(BookTrigram.book_id == book.id)
+    )
+
+
+# ── Querying ──
+
+def _common_trigrams(grams, limit):
+    """
+    The trigrams whose posting list is longer than limit.
+
+    Each probe stops after limit + 1 postings, so checking costs at most
+    that much per trigram however common it is.
+    """
+    return {
+        gram for gram in grams
+        if db.session.execute(
+            db.select(BookTrigram.book_id)
+            .where(BookTrigram.trigram == gram)
+            .limit(1).offset(limit)
+        ).first()
+    }
+
+
+def fuzzy_matches(search, threshold=None):
+    """
+    Subquery of books whose trigrams are similar enough to the search text.
+
+    Similarity is the Dice coefficient 2 * shared / (query + book
+    trigrams), so a long title that merely contains the query's trigrams
+    ranks below a close match. Candidates are found through the posting
+    lists of the query's rarer trigrams only; trigrams too common to scan
+    (see max_postings) are then checked per candidate with primary key
+    lookups. The cost depends on the query, not on the size of the
+    catalogue.
+
+    Args:
+        search: Raw search text
+        threshold: Minimum Dice similarity
+
+    Returns:
+        Subquery with book_id and similarity columns, or None if the text
+        has no trigrams or only very common ones
+    """
+    grams = trigrams(search)
+    if not grams:
+        return None
+    threshold = fuzzy_threshold() if threshold is None else threshold
+
+    common = _common_trigrams(sorted(grams), max_postings())
+    rare = grams - common
+    if not rare:
+        return None
+
+    # A book can't reach the threshold sharing fewer than t*q/(2-t) of the
+    # query's trigrams (its own count is at least what it shares), and at
+    # most all the common ones are among them
+    min_shared = math.ceil(threshold * len(grams) / (2 - threshold))
+    min_shared = max(1, min_shared - len(common))
+
+    candidates = db.select(
+        BookTrigram.book_id,
+        db.func.count().label('shared')
+    ).where(
+        BookTrigram.trigram.in_(sorted(rare))
+    ).group_by(
+        BookTrigram.book_id
+    ).having(
+        db.func.count() >= min_shared
+    ).subquery()
+
+    shared = candidates.c.shared
+    if common:
+        posting = db.aliased(BookTrigram)
+        shared = shared + db.select(db.func.count()).where(
+            posting.book_id == candidates.c.book_id,
+            posting.trigram.in_(sorted(common))
+        ).scalar_subquery()
+
+    similarity = 2.0 * shared / (len(grams) + Book.trigram_count)
+    return db.select(
+        candidates.c.book_id,
+        similarity.label('similarity')
+    ).join(
+        Book, Book.id == candidates.c.book_id
+    ).where(
+        similarity >= threshold
+    ).subquery()
+
+
+# ── Full rebuild ──
+
+def rebuild_search_index(batch_size=100000):
+    """
+    Recreate the trigram index for every book.
+
+    Needed once for databases created before the index existed, and after
+    bulk inserts that bypass the ORM (e.g. seed-scale). The book_id index
+    is dropped during the load and rebuilt once at the end, which is much
+    cheaper than maintaining it row by row.
+
+    Returns:
+        Dictionary with books, trigrams and seconds
+    """
+    started = time.perf_counter()
+    connection = db.session.connection()
+    book_index = next(
+        index for index in BookTrigram.__table__.indexes
+        if index.name == 'ix_book_trigrams_book'
+    )
+
+    db.session.execute(db.delete(BookTrigram))
+    book_index.drop(connection, checkfirst=True)
+
+    def flush(rows, counts):
+        # Sorted batches land in neighbouring b-tree pages
+        rows.sort()
+        if rows:
+            connection.exec_driver_sql(
+                'INSERT INTO book_trigrams (trigram, book_id) '
+                'VALUES (?, ?)', rows
+            )
+        connection.exec_driver_sql(
+            'UPDATE books SET trigram_count = ? WHERE id = ?', counts
+        )
+
+    books = total = 0
+    rows = []
+    counts = []
+    for book_id, title, author in db.session.execute(
+        db.select(Book.id, Book.title, Book.author)
+    ).all():
+        books += 1
+        grams = book_trigrams(title, author)
+        rows.extend((gram, book_id) for gram in grams)
+        counts.append((len(grams), book_id))
+        if len(rows) >= batch_size:
+            flush(rows, counts)
+            total += len(rows)
+            rows = []
+            counts = []
+    if counts:
+        flush(rows, counts)
+        total += len(rows)
+
+    book_index.create(connection)
+    db.session.commit()
+    return {
+        'books': books,
+        'trigrams': total,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+
+
+def ensure_search_index():
+    """
+    Build the index on first start if books exist but none are indexed, or
+    some books predate the trigram_count column.
+    """
+    has_books = db.session.execute(db.select(Book.id).limit(1)).first()
+    indexed = db.session.execute(db.select(BookTrigram.book_id).limit(1)).first()
+    uncounted = db.session.execute(
+        db.select(Book.id).where(Book.trigram_count.is_(None)).limit(1)
+    ).first()
+    if has_books and (not indexed or uncounted):
+        print("🔎 Building book search index...")
+        result = rebuild_search_index()
+        print(f"✅ Indexed {result['books']} books in {result['seconds']}s.")
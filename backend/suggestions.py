@@ -0,0 +1,308 @@
+import heapq
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from flask import current_app, g
+from search_index import normalize
+
+# Separates the searchable text from the term id inside an index key
+_SEP = '\x1f'
+
+# Rankings are memoized per prefix until a write touches them
+MAX_MEMOIZED_PREFIXES = 10000
+# Ranked terms kept per kind for a memoized prefix
+TOP_PER_KIND = 20
+
+KINDS = ('title', 'author', 'genre')
+
+
+def _term_values(title, author, genre):
+    return (('title', title), ('author', author), ('genre', genre))
+
+
+class PrefixIndex:
+    """
+    In-memory autocomplete over book titles, authors and genres.
+
+    Every distinct (kind, normalized text) is a term with a display string
+    and a weight (the number of listed books carrying it). Terms are found
+    through one sorted list of plain string keys, one per word start, so
+    "gats" finds "The Great Gatsby". A lookup is a bisect plus a scan of
+    the matching range; the ranking is memoized per prefix, so repeated
+    keystrokes cost a dictionary hit. Lookups never touch the database.
+
+    Each process keeps its own copy. Writes in this process update it
+    immediately; changes made by other workers are picked up by the
+    periodic rebuild (SUGGEST_INDEX_TTL seconds, default 300). Rebuilds
+    scan the books table, so they run on a background thread, one at a
+    time, while lookups keep using the previous index. Until the first
+    build finishes, lookups find nothing.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._built_at = None
+        self._rebuilding = False
+        # Writes made while a rebuild reads the table, replayed onto it
+        self._replay = None
+        self._reset()
+
+    def _reset(self):
+        self._keys = []
+        self._terms = {}      # term id -> [kind, display, weight]
+        self._term_ids = {}   # (kind, normalized) -> term id
+        self._next_id = 0
+        self._ranked = OrderedDict()  # prefix -> {kind: [(weight, display)]}
+
+    # ── Building ──
+
+    def _term_keys(self, term_id, normalized):
+        words = normalized.split()
+        return [
+            f'{" ".join(words[i:])}{_SEP}{term_id}'
+            for i in range(len(words))
+        ]
+
+    def _add(self, kind, display, count=1, bulk=False):
+        normalized = normalize(display)
+        if not normalized:
+            return
+        if not bulk:
+            self._invalidate(normalized)
+        term_id = self._term_ids.get((kind, normalized))
+        if term_id is not None:
+            self._terms[term_id][2] += count
+            return
+
+        term_id = self._next_id
+        self._next_id += 1
+        self._term_ids[(kind, normalized)] = term_id
+        self._terms[term_id] = [kind, display.strip(), count]
+        for key in self._term_keys(term_id, normalized):
+            if bulk:
+                self._keys.append(key)
+            else:
+                insort(self._keys, key)
+
+    def _invalidate(self, normalized):
+        # Forget memoized rankings of every prefix of every word start
+        if not self._ranked:
+            return
+        for word_start in self._term_keys(0, normalized):
+            word_start = word_start.split(_SEP, 1)[0]
+            for length in range(1, len(word_start) + 1):
+                self._ranked.pop(word_start[:length], None)
+
+    def _remove(self, kind, display):
+        normalized = normalize(display)
+        term_id = self._term_ids.get((kind, normalized))
+        if term_id is None:
+            return
+        self._invalidate(normalized)
+        term = self._terms[term_id]
+        term[2] -= 1
+        if term[2] > 0:
+            return
+
+        del self._terms[term_id]
+        del self._term_ids[(kind, normalized)]
+        for key in self._term_keys(term_id, normalized):
+            position = bisect_left(self._keys, key)
+            if position < len(self._keys) and self._keys[position] == key:
+                del self._keys[position]
+
+    def rebuild(self):
+        """Reload every term from the books table (blocking)."""
+        from database import db
+        from models import Book
+
+        with self._lock:
+            self._replay = []
+        try:
+            fresh = PrefixIndex(self.ttl)
+            for column, kind in ((Book.title, 'title'),
+                                 (Book.author, 'author'),
+                                 (Book.genre, 'genre')):
+                for value, count in db.session.execute(
+                    db.select(column, db.func.count()).group_by(column)
+                ).all():
+                    if value:
+                        fresh._add(kind, value, count, bulk=True)
+            fresh._keys.sort()
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+
+        with self._lock:
+            # A write that landed just before the scan may be counted
+            # twice; weights only order suggestions, and the next rebuild
+            # settles it
+            for method, kind, value in self._replay:
+                getattr(fresh, method)(kind, value)
+            self._replay = None
+            self._keys = fresh._keys
+            self._terms = fresh._terms
+            self._term_ids = fresh._term_ids
+            self._next_id = fresh._next_id
+            self._ranked = OrderedDict()
+            self._built_at = time.monotonic()
+
+    @property
+    def ready(self):
+        return self._built_at is not None
+
+    def refresh_in_background(self, app, tenant=None):
+        """Start a rebuild on its own thread unless one is running."""
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(
+            target=self._rebuild_in_context, args=(app, tenant),
+            name='suggest-index', daemon=True
+        ).start()
+
+    def _rebuild_in_context(self, app, tenant):
+        from tenancy import use_tenant
+
+        try:
+            with app.app_context():
+                if tenant:
+                    use_tenant(tenant)
+                self.rebuild()
+        except Exception as e:
+            where = f' ({tenant})' if tenant else ''
+            print(f"❌ Suggestion index rebuild failed{where}: {str(e)}")
+        finally:
+            self._rebuilding = False
+
+    def ensure_fresh(self):
+        """Schedule a rebuild if the index was never built or is stale."""
+        if (self._built_at is None
+                or time.monotonic() - self._built_at > self.ttl):
+            self.refresh_in_background(current_app._get_current_object(),
+                                       g.get('tenant'))
+
+    # ── Incremental updates ──
+
+    def _apply(self, method, title, author, genre):
+        with self._lock:
+            for kind, value in _term_values(title, author, genre):
+                if not value:
+                    continue
+                if self._replay is not None:
+                    self._replay.append((method, kind, value))
+                if self._built_at is not None:
+                    getattr(self, method)(kind, value)
+
+    def book_added(self, title, author, genre):
+        self._apply('_add', title, author, genre)
+
+    def book_removed(self, title, author, genre):
+        self._apply('_remove', title, author, genre)
+
+    def book_changed(self, old, new):
+        """old and new are (title, author, genre) tuples."""
+        if old != new:
+            self.book_removed(*old)
+            self.book_added(*new)
+
+    # ── Lookup ──
+
+    def suggest(self, prefix, limit=8, kinds=KINDS):
+        """
+        Best terms with a word starting with prefix, heaviest first.
+
+        Returns:
+            List of (kind, display, weight) tuples
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        self.ensure_fresh()
+
+        with self._lock:
+            ranked = self._ranked.get(prefix)
+            if ranked is None:
+                ranked = self._ranked[prefix] = self._rank(prefix)
+                if len(self._ranked) > MAX_MEMOIZED_PREFIXES:
+                    self._ranked.popitem(last=False)
+            else:
+                self._ranked.move_to_end(prefix)
+
+        found = [
+            (kind, display, weight)
+            for kind in kinds
+            for weight, display in ranked.get(kind, ())
+        ]
+        found.sort(key=lambda term: (-term[2], len(term[1]), term[1]))
+        return found[:limit]
+
+    def _rank(self, prefix):
+        """Top terms per kind among keys starting with prefix."""
+        keys, terms = self._keys, self._terms
+        position = bisect_left(keys, prefix)
+
+        seen = set()
+        by_kind = {}
+        while position < len(keys) and keys[position].startswith(prefix):
+            term_id = int(keys[position].rsplit(_SEP, 1)[1])
+            position += 1
+            if term_id not in seen:
+                seen.add(term_id)
+                kind, display, weight = terms[term_id]
+                by_kind.setdefault(kind, []).append((weight, display))
+
+        return {
+            kind: heapq.nsmallest(
+                TOP_PER_KIND, candidates,
+                key=lambda term: (-term[0], len(term[1]), term[1])
+            )
+            for kind, candidates in by_kind.items()
+        }
+
+
+# One index per database, keyed by building code (None for the primary).
+# At most SUGGEST_MAX_INDEXES are kept; the least recently used is dropped
+# and rebuilt if its building comes back.
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_prefix_index():
+    tenant = g.get('tenant')
+    with _indexes_lock:
+        index = _indexes.get(tenant)
+        if index is None:
+            index = _indexes[tenant] = PrefixIndex(
+                ttl=int(os.environ.get('SUGGEST_INDEX_TTL', 300))
+            )
+            while len(_indexes) > int(
+                    os.environ.get('SUGGEST_MAX_INDEXES', 32)):
+                _indexes.popitem(last=False)
+        else:
+            _indexes.move_to_end(tenant)
+    return index
+
+
+def warm_prefix_index():
+    """before_request hook: start building this database's index early."""
+    get_prefix_index().ensure_fresh()
+
+
+def init_suggestions(app):
+    """
+    Build each database's suggestion index in the background from its
+    first request, so the first autocomplete lookup does not wait for it
+    (SUGGEST_INDEX_WARMUP=off leaves it to the first lookup).
+
+    Args:
+        app: Flask application instance
+    """
+    if os.environ.get('SUGGEST_INDEX_WARMUP', 'on').lower() == 'off':
+        return
+    app.before_request(warm_prefix_index)
@@ -0,0 +1,252 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request
+import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+from database import db, get_db_stats, upgrade_schema
+
+# Building codes double as file names
+TENANT_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,31}$')
+
+# Label of the primary database in tenant-aware output
+PRIMARY = 'default'
+
+
+class UnknownTenant(Exception):
+    """Raised for a building code that has no database."""
+
+
+class TenantEngines:
+    """
+    Per-building SQLite engines, created on first use.
+
+    Each building lives in ``<directory>/<code>.db``. At most max_open
+    engines (and their connection pools) are kept; the least recently used
+    one is disposed when another is needed. Requests still holding a
+    connection from a disposed engine finish normally.
+
+    Args:
+        directory: Folder holding one database file per building
+        max_open: Engines kept open per process
+        engine_options: Extra create_engine() arguments, e.g. pool sizes
+    """
+
+    def __init__(self, directory, max_open=32, engine_options=None):
+        self.directory = os.path.abspath(directory)
+        self.max_open = max_open
+        self.engine_options = engine_options or {}
+        self._engines = OrderedDict()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def path(self, tenant):
+        if not tenant or not TENANT_PATTERN.match(tenant):
+            raise UnknownTenant(tenant)
+        return os.path.join(self.directory, f'{tenant}.db')
+
+    def exists(self, tenant):
+        try:
+            return os.path.exists(self.path(tenant))
+        except UnknownTenant:
+            return False
+
+    def tenants(self):
+        """Codes of every building with a database, sorted."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            name[:-3] for name in os.listdir(self.directory)
+            if name.endswith('.db') and TENANT_PATTERN.match(name[:-3])
+        )
+
+    def get(self, tenant):
+        """The engine of an existing building, opening it if needed."""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Pooled connections must not cross a fork
+                for engine in self._engines.values():
+                    engine.dispose(close=False)
+                self._engines.clear()
+                self._pid = os.getpid()
+
+            engine = self._engines.get(tenant)
+            if engine is not None:
+                self._engines.move_to_end(tenant)
+                return engine
+
+            if not self.exists(tenant):
+                raise UnknownTenant(tenant)
+            engine = create_engine(f'sqlite:///{self.path(tenant)}',
+                                   **self.engine_options)
+            self._engines[tenant] = engine
+            while len(self._engines) > self.max_open:
+                _, evicted = self._engines.popitem(last=False)
+                evicted.dispose()
+            return engine
+
+    def create(self, tenant):
+        """Create (or bring up to date) a building's database file."""
+        os.makedirs(self.directory, exist_ok=True)
+        engine = create_engine(f'sqlite:///{self.path(tenant)}',
+                               poolclass=NullPool)
+        try:
+            journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', '').strip()
+            if journal_mode:
+                with engine.connect() as connection:
+                    connection.exec_driver_sql(
+                        f'PRAGMA journal_mode = {journal_mode}'
+                    )
+            db.metadata.create_all(engine)
+            upgrade_schema(engine)
+        finally:
+            engine.dispose()
+
+    def connect(self, tenant):
+        """
+        A connection for a one-off job (such as stats across every
+        building) that does not push busy engines out of the LRU.
+        """
+        engine = self._engines.get(tenant)
+        if engine is None:
+            engine = create_engine(f'sqlite:///{self.path(tenant)}',
+                                   poolclass=NullPool)
+        return engine.connect()
+
+    def open_count(self):
+        return len(self._engines)
+
+
+def tenant_engines():
+    """This app's TenantEngines, or None when tenancy is off."""
+    return current_app.extensions.get('tenants')
+
+
+def tenancy_enabled():
+    return tenant_engines() is not None
+
+
+def current_tenant():
+    """Building code of the current request/job, None for the primary."""
+    return g.get('tenant')
+
+
+def use_tenant(tenant):
+    """
+    Route the rest of this app context's queries to a building.
+
+    Raises:
+        UnknownTenant: If tenancy is off or the building has no database
+    """
+    engines = tenant_engines()
+    if engines is None:
+        raise UnknownTenant(tenant)
+    g.db_tenant = engines.get(tenant)
+    g.tenant = tenant
+
+
+def _requested_tenant():
+    """Building named by the verified token, X-Tenant or ?tenant=."""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            payload = jwt.decode(
+                auth_header.split(' ')[1],
+                current_app.config['SECRET_KEY'],
+                algorithms=['HS256']
+            )
+        except jwt.InvalidTokenError:
+            payload = None
+        # A valid token decides alone (no claim means the primary), so a
+        # header cannot point a user id at another building's users
+        if payload is not None:
+            return payload.get('tenant')
+    return (request.headers.get('X-Tenant')
+            or request.args.get('tenant') or None)
+
+
+def select_tenant():
+    """before_request hook: bind the request to its building."""
+    tenant = _requested_tenant()
+    if tenant is None:
+        return None
+    try:
+        use_tenant(tenant)
+    except UnknownTenant:
+        return jsonify({
+            'error': 'Unknown building',
+            'message': f'No building is registered as "{tenant}"'
+        }), 404
+    return None
+
+
+def each_database(app):
+    """
+    Enter an app context once per database: the primary, then every
+    building. Background jobs loop over this so each building gets its
+    own outbox, leases and backups.
+
+    Yields:
+        None for the primary, then each building code
+    """
+    with app.app_context():
+        yield None
+    engines = app.extensions.get('tenants')
+    if engines is None:
+        return
+    for tenant in engines.tenants():
+        with app.app_context():
+            try:
+                use_tenant(tenant)
+            except UnknownTenant:
+                # Removed since it was listed
+                continue
+            yield tenant
+
+
+def aggregate_stats():
+    """
+    Database statistics summed over the primary and every building.
+
+    Returns:
+        The usual stats keys with totals, plus 'buildings' mapping each
+        database to its own figures
+    """
+    engines = tenant_engines()
+    with db.engine.connect() as connection:
+        per_database = {PRIMARY: get_db_stats(connection)}
+    for tenant in engines.tenants():
+        with engines.connect(tenant) as connection:
+            per_database[tenant] = get_db_stats(connection)
+
+    totals = {}
+    for stats in per_database.values():
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+    return {**totals, 'buildings': per_database}
+
+
+def init_tenancy(app):
+    """
+    Serve many buildings from one deployment when TENANT_DB_DIR is set.
+
+    Each building gets its own SQLite file in that directory (created with
+    ``flask create-tenant``). Requests are routed by the token's tenant
+    claim, or by X-Tenant / ?tenant= before login. Requests naming no
+    building use the primary database.
+
+    Args:
+        app: Flask application instance
+    """
+    directory = os.environ.get('TENANT_DB_DIR', '').strip()
+    if not directory:
+        return
+    app.extensions['tenants'] = TenantEngines(
+        directory,
+        max_open=int(os.environ.get('TENANT_MAX_OPEN', 32)),
+        engine_options=app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+    )
+    app.before_request(select_tenant)
+    print(f"✅ Multi-building mode: databases in {directory}")
@@ -0,0 +1,86 @@
+"""
+Shared fixtures: one app per test session on a scratch SQLite file, reset
+to the seed data before every test.
+
+Run from the backend directory:
+    python -m pytest -q
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import g, request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix='lend_a_read_tests_')
+
+# Set before the app module is imported, since it builds the app on import
+os.environ['SQLALCHEMY_DATABASE_URI'] = (
+    f"sqlite:///{os.path.join(SCRATCH_DIR, 'test.db')}"
+)
+os.environ['OUTBOX_DISPATCHER'] = 'off'
+os.environ['LOAN_REMINDER_INTERVAL_MINUTES'] = '0'
+os.environ['BACKUP_INTERVAL_HOURS'] = '0'
+os.environ['RATELIMIT_LOGIN'] = 'off'
+os.environ['SUGGEST_INDEX_WARMUP'] = 'off'
+os.environ['BACKUP_DIR'] = os.path.join(SCRATCH_DIR, 'backups')
+for name in ('TENANT_DB_DIR', 'DATABASE_REPLICAS', 'ADMIN_APARTMENTS',
+             'TRUSTED_PROXY_HOPS', 'SQLITE_JOURNAL_MODE',
+             'MAX_CONCURRENT_REQUESTS'):
+    os.environ.pop(name, None)
+
+sys.path.insert(0, BACKEND_DIR)
+
+with contextlib.redirect_stdout(io.StringIO()):
+    from app import application
+    from database import db, reset_db
+    from ratelimit import SUBREQUEST_ENVIRON_KEY
+
+PASSWORD = 'password123'
+
+
+@application.teardown_request
+def _forget_request_state(exc=None):
+    # Test client requests share the test's app context (see app), so drop
+    # what each one leaves in g and the session; in production every
+    # request starts with neither. Batch sub-requests share their parent's.
+    if request.environ.get(SUBREQUEST_ENVIRON_KEY):
+        return
+    for name in ('tenant', 'db_tenant', 'auth_cache'):
+        g.pop(name, None)
+    db.session.expunge_all()
+
+
+@pytest.fixture
+def app():
+    import suggestions
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        reset_db(application)
+    # Per-process indexes would outlive the reset database
+    suggestions._indexes.clear()
+    with application.app_context():
+        yield application
+        db.session.rollback()
+        db.session.remove()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def login(client):
+    """Log a seed resident in and return their Authorization header."""
+    def login_as(apartment_number):
+        response = client.post('/api/auth/login', json={
+            'apartment_number': apartment_number,
+            'password': PASSWORD
+        })
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return login_as
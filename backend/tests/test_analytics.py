@@ -0,0 +1,113 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import outbox
+from analytics import rebuild_rollups, roll_up_batch
+from database import db
+from models import BookLendingDaily, BuildingLendingDaily, UserLendingDaily
+
+
+def _lend(client, login, borrower, lender, book_id, returned=True):
+    request_id = client.post('/api/requests', json={'book_id': book_id},
+                             headers=login(borrower)).get_json()['data']['id']
+    assert client.put(f'/api/requests/{request_id}/approve',
+                      headers=login(lender)).status_code == 200
+    if returned:
+        assert client.put(f'/api/requests/{request_id}/return',
+                          headers=login(borrower)).status_code == 200
+
+
+def _lend_seed_books(client, login):
+    # 102 borrows book 1 twice and book 4 once; 202 still has book 1
+    _lend(client, login, '102', '101', 1)
+    _lend(client, login, '102', '201', 4)
+    _lend(client, login, '102', '101', 1)
+    _lend(client, login, '202', '101', 1, returned=False)
+    outbox.dispatch_pending()
+
+
+def _rollups():
+    return {
+        model.__tablename__: sorted(
+            tuple(getattr(row, column.name) for column in model.__table__.c)
+            for row in db.session.execute(db.select(model)).scalars()
+        )
+        for model in (UserLendingDaily, BuildingLendingDaily,
+                      BookLendingDaily)
+    }
+
+
+def test_user_totals_count_loans_and_returns(client, login):
+    _lend_seed_books(client, login)
+
+    borrower = client.get('/api/analytics/users/2',
+                          headers=login('102')).get_json()['data']
+    assert (borrower['lent'], borrower['borrowed']) == (0, 3)
+    assert borrower['avg_loan_days']['borrowed'] is not None
+    assert sum(day['borrowed'] for day in borrower['daily']) == 3
+
+    lender = client.get('/api/analytics/users/1',
+                        headers=login('101')).get_json()['data']
+    assert (lender['lent'], lender['borrowed']) == (3, 0)
+
+    # Residents only see their own history
+    assert client.get('/api/analytics/users/1',
+                      headers=login('102')).status_code == 403
+
+
+def test_building_and_book_totals(client, login):
+    _lend_seed_books(client, login)
+    headers = login('101')
+
+    buildings = client.get('/api/analytics/buildings',
+                           headers=headers).get_json()['data']['buildings']
+    # Seed apartments have no building prefix
+    assert [(b['building'], b['lent'], b['borrowed'])
+            for b in buildings] == [('main', 4, 4)]
+
+    books = client.get('/api/analytics/top-books',
+                       headers=headers).get_json()['data']['books']
+    assert [(book['book_id'], book['loans']) for book in books] == [
+        (1, 3), (4, 1)
+    ]
+
+
+def test_rebuild_matches_the_incremental_rollups(client, login):
+    _lend_seed_books(client, login)
+    incremental = _rollups()
+
+    result = rebuild_rollups()
+
+    assert result['logged'] == 0
+    assert _rollups() == incremental
+
+
+def test_racing_roll_ups_count_each_event_once(app, client, login,
+                                             monkeypatch):
+    # Roll up by hand instead of through the outbox
+    monkeypatch.delitem(outbox._handlers, 'lending_rollup')
+    _lend(client, login, '102', '101', 1)
+    roll_up_batch()
+    db.session.commit()
+    _lend(client, login, '202', '201', 4)
+    _lend(client, login, '301', '101', 2)
+
+    workers = 4
+    barrier = threading.Barrier(workers)
+
+    def roll_up(_):
+        with app.app_context():
+            barrier.wait()
+            applied = roll_up_batch(batch_size=2)
+            db.session.commit()
+            return applied
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(roll_up, range(workers)))
+    while roll_up_batch():
+        db.session.commit()
+
+    assert db.session.execute(
+        db.select(db.func.sum(UserLendingDaily.loans))
+        .where(UserLendingDaily.role == 'borrower')
+    ).scalar() == 3
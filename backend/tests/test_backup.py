@@ -0,0 +1,122 @@
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from backup import (BackupError, backup_database, copy_database,
+                    database_path, list_backups, rotate_backups,
+                    verify_backup)
+
+
+def _count(path, table):
+    connection = sqlite3.connect(path)
+    try:
+        return connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _damage(path, page=3, page_size=4096):
+    with open(path, 'r+b') as f:
+        f.seek(page * page_size)
+        f.write(b'\xde\xad\xbe\xef' * (page_size // 4))
+
+
+def test_snapshot_is_verified_and_restorable(app, tmp_path):
+    result = backup_database(directory=str(tmp_path), sleep=0, keep=5)
+
+    assert result['verification']['ok']
+    assert result['verification']['rows']['users'] == 5
+    assert list_backups(str(tmp_path)) == [result['path']]
+    assert not os.path.exists(f"{result['path']}.partial")
+    assert _count(result['path'], 'books') == _count(database_path(), 'books')
+
+
+def test_damaged_snapshot_fails_verification(app, tmp_path):
+    path = backup_database(directory=str(tmp_path), sleep=0, keep=5)['path']
+    damaged = str(tmp_path / 'damaged.db')
+    shutil.copy(path, damaged)
+    _damage(damaged)
+
+    result = verify_backup(damaged)
+
+    assert not result['ok']
+    assert result['integrity'] != 'ok'
+    # The rehearsal cleans up after itself
+    assert not os.path.exists(f'{damaged}.verify')
+
+
+def test_snapshot_missing_tables_fails_verification(app, tmp_path):
+    path = str(tmp_path / 'partial-schema.db')
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE users (id INTEGER PRIMARY KEY)')
+    connection.close()
+
+    result = verify_backup(path)
+
+    assert not result['ok']
+    assert result['integrity'] == 'ok'
+    assert 'books' in result['missing_tables']
+    assert 'users' not in result['missing_tables']
+
+
+def test_unverified_snapshot_is_never_kept(app, tmp_path, monkeypatch):
+    import backup
+
+    def copy_and_damage(source, target, **kwargs):
+        stats = copy_database(source, target, **kwargs)
+        _damage(target)
+        return stats
+
+    monkeypatch.setattr(backup, 'copy_database', copy_and_damage)
+    with pytest.raises(BackupError):
+        backup_database(directory=str(tmp_path), sleep=0)
+    assert os.listdir(tmp_path) == []
+
+
+def test_rotation_keeps_the_newest_snapshots(app, tmp_path):
+    prefix = os.path.splitext(os.path.basename(database_path()))[0]
+    names = [f'{prefix}-20240101-00000{i}.db' for i in range(4)]
+    for name in names + ['other-20240101-000000.db']:
+        (tmp_path / name).write_bytes(b'')
+
+    removed = rotate_backups(str(tmp_path), keep=2)
+
+    assert [os.path.basename(path) for path in removed] == names[:2]
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        names[2:] + ['other-20240101-000000.db']
+    )
+
+
+def test_copy_under_concurrent_writes_is_consistent(app, tmp_path):
+    source = database_path()
+    stop = threading.Event()
+
+    def write():
+        connection = sqlite3.connect(source, timeout=5)
+        try:
+            while not stop.is_set():
+                connection.execute(
+                    "INSERT INTO notifications (user_id, message, is_read) "
+                    "VALUES (1, 'busy', 0)"
+                )
+                connection.commit()
+                time.sleep(0.002)
+        finally:
+            connection.close()
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        target = str(tmp_path / 'busy.db')
+        stats = copy_database(source, target, pages=1, sleep=0.001,
+                              max_restarts=3)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert stats['restarts'] <= 4
+    assert verify_backup(target)['ok']
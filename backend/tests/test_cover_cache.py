@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+import cover_cache
+from cover_cache import CoverCache, CoverError
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CoverCache(str(tmp_path), failure_ttl=60)
+
+
+def _fetch_failing(cache, monkeypatch, wait=None):
+    """Make every download fail, optionally after wait is set."""
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        if wait is not None:
+            wait.wait(5)
+        raise CoverError('Failed to fetch cover: HTTP 404')
+
+    monkeypatch.setattr(cache, '_fetch', fetch)
+    return calls
+
+
+def test_cover_is_fetched_once_and_shared(cache, monkeypatch):
+    calls = []
+
+    def fetch(url):
+        calls.append(url)
+        return b'same image bytes'
+
+    monkeypatch.setattr(cache, '_fetch', fetch)
+
+    first = cache.get_original('http://covers.example/a.jpg')
+    assert cache.get_original('http://covers.example/a.jpg') == first
+    # A different URL with the same bytes shares the stored object
+    assert cache.get_original('http://covers.example/b.jpg') == first
+    assert len(calls) == 2
+    assert cache._fetch_locks == {}
+
+
+def test_failed_fetch_is_remembered_until_the_ttl(cache, monkeypatch):
+    url = 'http://covers.example/missing.jpg'
+    calls = _fetch_failing(cache, monkeypatch)
+    now = [1000.0]
+    monkeypatch.setattr(cover_cache.time, 'monotonic', lambda: now[0])
+
+    for _ in range(3):
+        with pytest.raises(CoverError, match='HTTP 404'):
+            cache.get_original(url)
+    assert len(calls) == 1
+
+    now[0] += 61
+    with pytest.raises(CoverError):
+        cache.get_original(url)
+    assert len(calls) == 2
+
+
+def test_waiters_share_a_failed_download(cache, monkeypatch):
+    release = threading.Event()
+    calls = _fetch_failing(cache, monkeypatch, wait=release)
+    errors = []
+
+    def get():
+        try:
+            cache.get_original('http://covers.example/slow.jpg')
+        except CoverError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=get) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(errors) == 4
+    assert len(calls) == 1
+    # The per-URL lock is dropped even though the download raised
+    assert cache._fetch_locks == {}
+
+
+def test_remembered_failures_are_bounded(cache, monkeypatch):
+    monkeypatch.setattr(cover_cache, 'MAX_REMEMBERED_FAILURES', 3)
+    _fetch_failing(cache, monkeypatch)
+
+    for n in range(5):
+        with pytest.raises(CoverError):
+            cache.get_original(f'http://covers.example/{n}.jpg')
+
+    assert list(cache._failures) == [
+        f'http://covers.example/{n}.jpg' for n in (2, 3, 4)
+    ]
@@ -0,0 +1,94 @@
+import pytest
+
+from database import db
+from duplicates import (backfill_fingerprints, find_duplicates, fingerprint,
+                        normalize_isbn)
+from models import Book
+
+
+def _add(client, headers, **book):
+    return client.post('/api/books', headers=headers, json=book)
+
+
+@pytest.mark.parametrize('title, author', [
+    ('1984', 'George Orwell'),
+    ('1984', 'Orwell, George'),
+    ('1984: A Novel', 'george orwell'),
+])
+def test_editions_share_a_fingerprint(title, author):
+    assert fingerprint(title, author) == '1984|george orwell'
+
+
+def test_leading_article_is_dropped():
+    assert fingerprint('The Great Gatsby', 'F. Scott Fitzgerald') == (
+        fingerprint('Great Gatsby', 'F Scott Fitzgerald')
+    )
+
+
+@pytest.mark.parametrize('raw, isbn', [
+    ('0-306-40615-2', '9780306406157'),
+    ('978-0-306-40615-7', '9780306406157'),
+    ('978-0-306-40615-8', None),
+    ('12345', None),
+])
+def test_isbns_are_normalized_to_isbn13(raw, isbn):
+    assert normalize_isbn(raw) == isbn
+
+
+def test_own_copy_is_refused_unless_allowed(client, login):
+    headers = login('101')
+
+    response = _add(client, headers, title='1984: A Novel',
+                    author='Orwell, George')
+    assert response.status_code == 409
+    assert response.get_json()['duplicate']['id'] == 2
+
+    response = _add(client, headers, title='1984', author='George Orwell',
+                    allow_duplicate=True)
+    assert response.status_code == 201
+
+
+def test_other_residents_copies_are_reported(client, login):
+    response = _add(client, login('201'), title='Nineteen Eighty-Four',
+                    author='George Orwell', isbn='0-306-40615-2')
+    assert response.status_code == 201
+    assert response.get_json()['possible_duplicates'] == []
+
+    response = _add(client, login('102'), title='1984',
+                    author='Orwell, George', isbn='9780306406157')
+    assert response.status_code == 201
+    matches = [(book['id'], book['match'])
+               for book in response.get_json()['possible_duplicates']]
+    assert matches == [(9, 'isbn'), (2, 'exact')]
+
+    response = _add(client, login('202'), title='1984',
+                    author='Someone Else')
+    assert response.status_code == 201
+    assert {book['match'] for book in
+            response.get_json()['possible_duplicates']} == {'title'}
+
+
+def test_duplicate_groups_are_found_in_batches(app):
+    for owner_id, title, author in ((3, '1984', 'Orwell, George'),
+                                    (4, 'Dune', 'Frank Herbert'),
+                                    (5, 'Dune', 'Herbert, Frank')):
+        db.session.add(Book(title=title, author=author, owner_id=owner_id))
+    db.session.commit()
+
+    groups = list(find_duplicates(batch_size=1))
+
+    assert [(group['key'], [book['id'] for book in group['books']])
+            for group in groups] == [
+        ('1984|george orwell', [2, 9]),
+        ('dune|frank herbert', [7, 10, 11]),
+    ]
+
+
+def test_backfill_fills_missing_fingerprints(app):
+    db.session.execute(db.update(Book).values(fingerprint=None))
+    db.session.commit()
+
+    assert backfill_fingerprints(batch_size=3) == 8
+    assert db.session.get(Book, 3).fingerprint == (
+        'great gatsby|f fitzgerald scott'
+    )
@@ -0,0 +1,213 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+
+import notification_templates as templates
+import outbox
+from database import db
+from leases import acquire_lease, release_lease
+from models import Lease, Notification, OutboxEvent
+
+
+@pytest.fixture
+def failing_handler():
+    """Register a 'test-fail' handler that fails while calls['fail'] is set."""
+    calls = {'fail': True, 'payloads': []}
+
+    @outbox.outbox_handler('test-fail')
+    def handler(payloads):
+        if calls['fail']:
+            raise RuntimeError('delivery failed')
+        calls['payloads'].extend(payloads)
+
+    yield calls
+    outbox._handlers.pop('test-fail', None)
+
+
+@pytest.fixture
+def handler_for():
+    """Register outbox handlers for test event types, removed afterwards."""
+    registered = []
+
+    def register(event_type, handler):
+        registered.append(event_type)
+        return outbox.outbox_handler(event_type)(handler)
+
+    yield register
+    for event_type in registered:
+        outbox._handlers.pop(event_type, None)
+
+
+def _try_lease_from_another_worker(app):
+    # A separate session, as another process would have
+    result = []
+
+    def attempt():
+        with app.app_context():
+            result.append(
+                acquire_lease(outbox.DISPATCHER_LEASE, 'worker-b', 30)
+            )
+
+    thread = threading.Thread(target=attempt)
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def _notification_count(user_id):
+    return db.session.execute(
+        db.select(db.func.count()).select_from(Notification)
+        .where(Notification.user_id == user_id)
+    ).scalar()
+
+
+def test_lease_is_exclusive_until_it_expires(app):
+    assert acquire_lease('job', 'worker-a', 30)
+    assert not acquire_lease('job', 'worker-b', 30)
+    # The holder renews its own lease
+    assert acquire_lease('job', 'worker-a', 30)
+
+    db.session.execute(db.update(Lease).where(Lease.name == 'job').values(
+        expires_at=datetime.utcnow() - timedelta(seconds=1)
+    ))
+    db.session.commit()
+    assert acquire_lease('job', 'worker-b', 30)
+    assert not acquire_lease('job', 'worker-a', 30)
+
+
+def test_released_lease_can_be_taken_at_once(app):
+    assert acquire_lease('job', 'worker-a', 30)
+    release_lease('job', 'worker-a')
+    assert acquire_lease('job', 'worker-b', 30)
+
+
+def test_concurrent_lease_acquisition_has_one_winner(app):
+    workers = 8
+    barrier = threading.Barrier(workers)
+
+    def acquire(holder):
+        with app.app_context():
+            barrier.wait()
+            return acquire_lease(outbox.DISPATCHER_LEASE, holder, 30)
+
+    holders = [f'worker-{i}' for i in range(workers)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(acquire, holders))
+
+    assert results.count(True) == 1
+    winner = holders[results.index(True)]
+    assert db.session.get(Lease, outbox.DISPATCHER_LEASE).holder == winner
+
+
+def test_events_are_delivered_once_after_commit(app):
+    outbox.notify(user_id=2, template=templates.BORROW_REQUEST, book_id=1,
+                  actor_id=1)
+    db.session.commit()
+    # Nothing reaches the inbox until the dispatcher runs
+    assert _notification_count(2) == 0
+
+    assert outbox.dispatch_pending() == 1
+    assert outbox.dispatch_pending() == 0
+    assert _notification_count(2) == 1
+    assert db.session.execute(
+        db.select(OutboxEvent.status)
+    ).scalars().all() == ['done']
+
+
+def test_rolled_back_events_are_never_delivered(app):
+    outbox.notify(user_id=2, template=templates.BORROW_REQUEST, book_id=1)
+    db.session.rollback()
+
+    assert outbox.dispatch_pending() == 0
+    assert _notification_count(2) == 0
+
+
+def test_failed_event_blocks_later_events_and_backs_off(app, failing_handler):
+    outbox.enqueue('test-fail', [{'n': 1}])
+    outbox.notify(user_id=2, template=templates.BORROW_REQUEST, book_id=1)
+    db.session.commit()
+
+    assert outbox.dispatch_batch() == 0
+    failed = db.session.execute(
+        db.select(OutboxEvent).where(OutboxEvent.event_type == 'test-fail')
+    ).scalar_one()
+    assert failed.status == 'pending'
+    assert failed.attempts == 1
+    assert failed.available_at > datetime.utcnow()
+    # The notification queued behind it waits its turn
+    assert _notification_count(2) == 0
+
+    # Once the backoff is over and delivery works, both go out in order
+    failing_handler['fail'] = False
+    failed.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert outbox.dispatch_pending() == 2
+    assert failing_handler['payloads'] == [{'n': 1}]
+    assert _notification_count(2) == 1
+
+
+def test_event_is_parked_after_max_attempts(app, failing_handler):
+    outbox.enqueue('test-fail', [{'n': 1}])
+    outbox.notify(user_id=2, template=templates.BORROW_REQUEST, book_id=1)
+    db.session.commit()
+
+    for _ in range(outbox.MAX_ATTEMPTS):
+        db.session.execute(db.update(OutboxEvent).values(
+            available_at=datetime.utcnow() - timedelta(seconds=1)
+        ))
+        db.session.commit()
+        outbox.dispatch_batch()
+
+    failed = db.session.execute(
+        db.select(OutboxEvent).where(OutboxEvent.event_type == 'test-fail')
+    ).scalar_one()
+    assert failed.status == 'failed'
+    assert failed.attempts == outbox.MAX_ATTEMPTS
+    # No longer in the way of the events behind it
+    assert outbox.dispatch_pending() == 1
+    assert _notification_count(2) == 1
+
+
+def test_long_drain_keeps_its_lease_past_the_ttl(app, handler_for):
+    outbox.enqueue('test-slow', [{'n': n} for n in range(4)])
+    db.session.commit()
+    takeovers = []
+
+    def slow(payloads):
+        time.sleep(0.4)
+        takeovers.append(_try_lease_from_another_worker(app))
+
+    handler_for('test-slow', slow)
+
+    # Four batches take well over the one second lease
+    assert outbox.dispatch_with_lease('worker-a', batch_size=1,
+                                      lease_seconds=1) == 4
+    assert takeovers == [False] * 4
+
+
+def test_drain_stops_once_the_lease_is_lost(app, handler_for):
+    outbox.enqueue('test-stall', [{'n': n} for n in range(3)])
+    db.session.commit()
+    delivered = []
+
+    def stall(payloads):
+        delivered.extend(payloads)
+        if len(delivered) == 1:
+            # Stalled past the TTL, and another worker took over
+            db.session.execute(db.update(Lease).values(
+                expires_at=datetime.utcnow() - timedelta(seconds=1)
+            ))
+            db.session.commit()
+            assert _try_lease_from_another_worker(app)
+
+    handler_for('test-stall', stall)
+
+    assert outbox.dispatch_with_lease('worker-a', batch_size=1) == 1
+    assert delivered == [{'n': 0}]
+    assert db.session.get(Lease, outbox.DISPATCHER_LEASE).holder == 'worker-b'
+    assert db.session.execute(
+        db.select(db.func.count()).where(OutboxEvent.status == 'pending')
+    ).scalar() == 2
@@ -0,0 +1,144 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from flask import Flask, jsonify
+
+import ratelimit
+from ratelimit import (MemoryBackend, SQLiteBackend, init_proxy_fix,
+                       parse_limit, rate_limit)
+
+
+@pytest.fixture
+def limited_client(monkeypatch):
+    """A bare app with one route allowed 3 requests a minute per client."""
+    def build(trusted_hops=0):
+        monkeypatch.setattr(ratelimit, '_backend', MemoryBackend())
+        monkeypatch.setenv('TRUSTED_PROXY_HOPS', str(trusted_hops))
+        app = Flask(__name__)
+        init_proxy_fix(app)
+
+        @app.route('/limited')
+        @rate_limit('probe', '3/minute')
+        def limited():
+            return jsonify({'status': 'success'})
+
+        return app.test_client()
+    return build
+
+
+def _get(client, forwarded_for, remote_addr='203.0.113.7'):
+    return client.get('/limited', headers={'X-Forwarded-For': forwarded_for},
+                      environ_base={'REMOTE_ADDR': remote_addr})
+
+
+def test_parse_limit():
+    assert parse_limit('10/minute') == (10, 10 / 60)
+    assert parse_limit('5/second') == (5, 5)
+    assert parse_limit('off') is None
+    with pytest.raises(ValueError):
+        parse_limit('10/fortnight')
+
+
+@pytest.mark.parametrize('make_backend', [
+    lambda tmp_path: MemoryBackend(),
+    lambda tmp_path: SQLiteBackend(str(tmp_path / 'buckets.db')),
+], ids=['memory', 'sqlite'])
+def test_bucket_empties_and_refills(tmp_path, make_backend):
+    backend = make_backend(tmp_path)
+    # 3 tokens, one more every 2 seconds
+    waits = [backend.take('k', 3, 0.5, now=100.0) for _ in range(4)]
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(2.0)
+
+    assert backend.take('k', 3, 0.5, now=101.0) > 0
+    assert backend.take('k', 3, 0.5, now=102.0) == 0
+    # Other keys have their own bucket
+    assert backend.take('other', 3, 0.5, now=102.0) == 0
+
+
+def test_memory_backend_forgets_least_recently_used_keys():
+    backend = MemoryBackend(max_keys=2)
+    backend.take('a', 1, 0.001, now=0)
+    backend.take('b', 1, 0.001, now=0)
+    backend.take('c', 1, 0.001, now=0)
+    # 'a' was dropped, so it starts again with a full bucket
+    assert backend.take('a', 1, 0.001, now=0) == 0
+    assert backend.take('c', 1, 0.001, now=0) > 0
+
+
+def test_sqlite_backend_is_shared_between_workers(tmp_path):
+    path = str(tmp_path / 'buckets.db')
+    workers = [SQLiteBackend(path) for _ in range(4)]
+    barrier = threading.Barrier(16)
+
+    def take(i):
+        barrier.wait()
+        return workers[i % len(workers)].take('login:ip:1', 5, 0.001,
+                                              now=100.0)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        waits = list(pool.map(take, range(16)))
+
+    assert waits.count(0) == 5
+
+
+def test_forwarded_for_cannot_pick_a_bucket(limited_client):
+    client = limited_client()
+    codes = [_get(client, f'198.51.100.{i}').status_code for i in range(5)]
+    assert codes == [200, 200, 200, 429, 429]
+
+
+def test_only_trusted_proxy_hops_are_used(limited_client):
+    client = limited_client(trusted_hops=1)
+    # The proxy appends the real client; anything before it is the client's
+    codes = [
+        _get(client, f'198.51.100.{i}, 192.0.2.10',
+             remote_addr='10.0.0.1').status_code
+        for i in range(4)
+    ]
+    assert codes == [200, 200, 200, 429]
+
+    response = _get(client, '198.51.100.1, 192.0.2.11', remote_addr='10.0.0.1')
+    assert response.status_code == 200
+
+
+def test_rejection_says_when_to_retry(limited_client):
+    client = limited_client()
+    for _ in range(3):
+        _get(client, '')
+    response = _get(client, '')
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+
+@pytest.fixture
+def one_slot(app, monkeypatch):
+    control = app.extensions['admission_control']
+    monkeypatch.setattr(control, '_slots', threading.BoundedSemaphore(1))
+    return control._slots
+
+
+def test_busy_process_turns_requests_away(client, one_slot):
+    assert one_slot.acquire(blocking=False)
+    try:
+        response = client.get('/api/health')
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+    finally:
+        one_slot.release()
+    assert client.get('/api/health').status_code == 200
+
+
+def test_parallel_batch_uses_one_admission_slot(client, login, one_slot):
+    headers = login('101')
+    response = client.post('/api/batch', headers=headers, json={
+        'requests': [{'path': '/api/auth/profile'}] * 4,
+        'max_parallel': 4
+    })
+
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()['data']] == [200] * 4
+    # The batch gave its slot back
+    assert one_slot.acquire(blocking=False)
+    one_slot.release()
@@ -0,0 +1,68 @@
+import outbox
+import recommendations
+from database import db
+from models import BookCooccurrence
+
+
+def _matrix():
+    return {
+        (row.book_id, row.other_book_id): row.count
+        for row in db.session.execute(db.select(BookCooccurrence)).scalars()
+    }
+
+
+def _borrow(client, login, borrower, book_id):
+    return client.post('/api/requests', json={'book_id': book_id},
+                       headers=login(borrower)).get_json()['data']['id']
+
+
+def test_pairs_are_counted_once_whatever_the_order(client, login):
+    # Resident 102 borrows book 1 (from 101) and book 4 (from 201); the
+    # later request is approved first
+    first = _borrow(client, login, '102', 1)
+    second = _borrow(client, login, '102', 4)
+    for request_id, lender in ((second, '201'), (first, '101')):
+        assert client.put(f'/api/requests/{request_id}/approve',
+                          headers=login(lender)).status_code == 200
+
+    outbox.dispatch_pending()
+
+    assert _matrix() == {(1, 1): 1, (4, 4): 1, (1, 4): 1, (4, 1): 1}
+
+
+def test_redelivered_borrows_change_nothing(client, login):
+    first = _borrow(client, login, '102', 1)
+    second = _borrow(client, login, '102', 4)
+    for request_id, lender in ((first, '101'), (second, '201')):
+        client.put(f'/api/requests/{request_id}/approve',
+                   headers=login(lender))
+    outbox.dispatch_pending()
+    before = _matrix()
+
+    recommendations._apply_borrows([
+        {'request_id': first, 'book_id': 1, 'borrower_id': 2},
+        {'request_id': second, 'book_id': 4, 'borrower_id': 2}
+    ])
+    db.session.commit()
+
+    assert _matrix() == before
+
+
+def test_incremental_matrix_matches_a_rebuild(client, login):
+    loans = [('102', '101', 1), ('102', '201', 4), ('202', '101', 1),
+             ('202', '201', 4), ('202', '301', 7), ('301', '101', 2)]
+    # Each loan ends before the next starts, so every request is granted
+    for borrower, lender, book_id in reversed(loans):
+        request_id = _borrow(client, login, borrower, book_id)
+        assert client.put(f'/api/requests/{request_id}/approve',
+                          headers=login(lender)).status_code == 200
+        assert client.put(f'/api/requests/{request_id}/return',
+                          headers=login(borrower)).status_code == 200
+    outbox.dispatch_pending()
+    incremental = _matrix()
+
+    recommendations.rebuild_recommendations()
+
+    assert incremental == _matrix()
+    assert incremental[(1, 4)] == 2
+    assert incremental[(1, 1)] == 2
@@ -0,0 +1,105 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import notification_templates as templates
+from database import db
+from models import BorrowRequest, OutboxEvent
+from reminders import DUE_SOON, OVERDUE, send_due_reminders
+
+
+def _loan(due_in_hours, borrower_id=2, lender_id=1, book_id=1, now=None):
+    now = now or datetime.utcnow()
+    loan = BorrowRequest(book_id=book_id, borrower_id=borrower_id,
+                         lender_id=lender_id, status='approved',
+                         responded_at=now - timedelta(days=14),
+                         due_at=now + timedelta(hours=due_in_hours))
+    db.session.add(loan)
+    db.session.commit()
+    return loan.id
+
+
+def _reminders():
+    return [
+        (payload['template'], payload['user_id'], payload['request_id'])
+        for payload in map(json.loads, db.session.execute(
+            db.select(OutboxEvent.payload).order_by(OutboxEvent.id)
+        ).scalars())
+    ]
+
+
+def _stage(loan_id):
+    return db.session.execute(
+        db.select(BorrowRequest.reminder_stage)
+        .where(BorrowRequest.id == loan_id)
+    ).scalar()
+
+
+def test_each_stage_is_sent_once(app):
+    now = datetime.utcnow()
+    loan_id = _loan(due_in_hours=24, now=now)
+
+    assert send_due_reminders(now=now) == {'due_soon': 1, 'overdue': 0}
+    assert send_due_reminders(now=now) == {'due_soon': 0, 'overdue': 0}
+    assert _stage(loan_id) == DUE_SOON
+
+    later = now + timedelta(hours=25)
+    assert send_due_reminders(now=later) == {'due_soon': 0, 'overdue': 1}
+    assert send_due_reminders(now=later) == {'due_soon': 0, 'overdue': 0}
+    assert _stage(loan_id) == OVERDUE
+
+    assert _reminders() == [
+        (templates.LOAN_DUE_SOON, 2, loan_id),
+        (templates.LOAN_OVERDUE, 2, loan_id),
+        (templates.LOAN_OVERDUE_LENDER, 1, loan_id)
+    ]
+
+
+def test_loan_first_seen_overdue_skips_due_soon(app):
+    loan_id = _loan(due_in_hours=-1)
+
+    assert send_due_reminders() == {'due_soon': 0, 'overdue': 1}
+    assert send_due_reminders() == {'due_soon': 0, 'overdue': 0}
+    assert [template for template, _, _ in _reminders()] == [
+        templates.LOAN_OVERDUE, templates.LOAN_OVERDUE_LENDER
+    ]
+    assert _stage(loan_id) == OVERDUE
+
+
+def test_returned_and_distant_loans_are_left_alone(app):
+    _loan(due_in_hours=24 * 10)
+    returned = _loan(due_in_hours=-1)
+    db.session.execute(db.update(BorrowRequest).where(
+        BorrowRequest.id == returned
+    ).values(status='returned'))
+    db.session.commit()
+
+    assert send_due_reminders() == {'due_soon': 0, 'overdue': 0}
+    assert _reminders() == []
+
+
+def test_batches_cover_every_due_loan(app):
+    loan_ids = [_loan(due_in_hours=-hours) for hours in range(1, 8)]
+
+    assert send_due_reminders(batch_size=3)['overdue'] == len(loan_ids)
+    assert {_stage(loan_id) for loan_id in loan_ids} == {OVERDUE}
+
+
+def test_overlapping_schedulers_remind_once(app):
+    loan_ids = [_loan(due_in_hours=-hours) for hours in range(1, 21)]
+    runs = 4
+    barrier = threading.Barrier(runs)
+
+    def run(_):
+        with app.app_context():
+            barrier.wait()
+            return send_due_reminders(batch_size=5)['overdue']
+
+    with ThreadPoolExecutor(max_workers=runs) as pool:
+        sent = list(pool.map(run, range(runs)))
+
+    assert sum(sent) == len(loan_ids)
+    reminded = [request_id for template, _, request_id in _reminders()
+                if template == templates.LOAN_OVERDUE]
+    assert sorted(reminded) == sorted(loan_ids)
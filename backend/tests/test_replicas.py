@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+import replicas
+from database import db
+from models import User
+from replicas import ReplicaSet
+
+
+def _snapshot_set(app, tmp_path):
+    return ReplicaSet(app.config['SQLALCHEMY_DATABASE_URI'],
+                      [f"snapshot:{tmp_path / 'snapshot.db'}"])
+
+
+def _users(replica):
+    with replica.engine.connect() as connection:
+        return connection.execute(text('SELECT COUNT(*) FROM users')).scalar()
+
+
+def test_refresh_replaces_the_snapshot_in_one_step(app, tmp_path):
+    replica_set = _snapshot_set(app, tmp_path)
+    replica = replica_set.replicas[0]
+
+    started = time.time()
+    replica_set.refresh_snapshots()
+
+    assert _users(replica) == 5
+    assert not os.path.exists(f'{replica.snapshot_path}.partial')
+    assert abs(os.path.getmtime(replica.snapshot_path) - started) < 2
+
+
+def test_refreshed_rows_are_visible_to_open_engines(app, tmp_path):
+    replica_set = _snapshot_set(app, tmp_path)
+    replica = replica_set.replicas[0]
+    replica_set.refresh_snapshots()
+    assert _users(replica) == 5
+
+    db.session.add(User(apartment_number='999', name='New',
+                        password_hash='x'))
+    db.session.commit()
+    replica_set.refresh_snapshots()
+
+    # Same engine, new file: no connection is left on the old copy
+    assert _users(replica) == 6
+
+
+def test_readers_never_see_a_partial_snapshot(app, tmp_path):
+    replica_set = _snapshot_set(app, tmp_path)
+    replica = replica_set.replicas[0]
+    replica_set.refresh_snapshots()
+    stop = threading.Event()
+    errors = []
+    counts = set()
+
+    def read():
+        while not stop.is_set():
+            try:
+                counts.add(_users(replica))
+            except Exception as e:
+                errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for _ in range(20):
+            replica_set.refresh_snapshots()
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+
+    assert errors == []
+    assert counts == {5}
+
+
+def test_refresh_interval_grows_with_copy_time(app, tmp_path):
+    replica_set = _snapshot_set(app, tmp_path)
+    assert replica_set.refresh_interval() == replica_set.snapshot_interval
+
+    replica_set.copy_seconds = 2.0
+    assert replica_set.refresh_interval() == 2.0 * replicas.SNAPSHOT_COPY_RATIO
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import retention
+from database import db
+from models import Notification, NotificationArchive
+from retention import prune_notifications
+
+
+def _add(user_id, days_old, is_read=True, message=''):
+    notification = Notification(
+        user_id=user_id,
+        message=message,
+        is_read=is_read,
+        created_at=datetime.utcnow() - timedelta(days=days_old)
+    )
+    db.session.add(notification)
+    db.session.commit()
+    return notification.id
+
+
+def _remaining(user_id=None):
+    query = db.select(Notification.message).order_by(Notification.id)
+    if user_id is not None:
+        query = query.where(Notification.user_id == user_id)
+    return db.session.execute(query).scalars().all()
+
+
+def test_removes_only_notifications_past_the_cutoff(app):
+    _add(2, 40, message='old')
+    _add(2, 5, message='recent')
+
+    result = prune_notifications(max_age_days=30, pause=0)
+
+    assert result['removed'] == 1
+    assert _remaining() == ['recent']
+
+
+def test_only_read_keeps_unread_notifications(app):
+    _add(2, 40, is_read=False, message='unread')
+    _add(2, 40, is_read=True, message='read')
+
+    prune_notifications(max_age_days=30, only_read=True, pause=0)
+
+    assert _remaining() == ['unread']
+
+
+def test_keeps_each_users_newest(app):
+    for user_id in (2, 3):
+        for days_old in range(4):
+            _add(user_id, days_old, message=f'{user_id}:{days_old}')
+
+    result = prune_notifications(keep_per_user=2, pause=0)
+
+    assert result['removed'] == 4
+    assert _remaining(2) == ['2:0', '2:1']
+    assert _remaining(3) == ['3:0', '3:1']
+
+
+def test_per_user_limit_pages_through_users(app, monkeypatch):
+    monkeypatch.setattr(retention, 'USER_PAGE_SIZE', 2)
+    for user_id in range(1, 6):
+        for days_old in range(3):
+            _add(user_id, days_old, message=f'{user_id}:{days_old}')
+    # The last user, alone on the last page, is two over the limit
+    _add(5, 0, message='extra')
+
+    result = prune_notifications(keep_per_user=2, batch_size=3, pause=0)
+
+    assert result['removed'] == 6
+    assert result['batches'] == 2
+    for user_id in range(1, 5):
+        assert _remaining(user_id) == [f'{user_id}:0', f'{user_id}:1']
+    assert _remaining(5) == ['5:0', 'extra']
+
+
+def test_archive_survives_reused_notification_ids(app):
+    first_id = _add(2, 40, message='first')
+    prune_notifications(max_age_days=30, archive=True, pause=0)
+
+    # SQLite hands out the same id again once the newest row is gone
+    reused_id = _add(2, 40, message='second')
+    assert reused_id == first_id
+    result = prune_notifications(max_age_days=30, archive=True, pause=0)
+
+    assert result['archived'] == 1
+    archived = db.session.execute(
+        db.select(NotificationArchive.original_id, NotificationArchive.message)
+        .order_by(NotificationArchive.id)
+    ).all()
+    assert [tuple(row) for row in archived] == [(first_id, 'first'),
+                                                (first_id, 'second')]
+    assert _remaining() == []
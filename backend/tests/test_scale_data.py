@@ -0,0 +1,44 @@
+from database import db
+from models import Book, BorrowRequest, WaitlistEntry
+from scale_data import generate_scale_data
+
+
+def test_generated_requests_respect_the_waitlist(app):
+    result = generate_scale_data(users=40, books=60, requests=800,
+                                 notifications=0, seed=7)
+    assert result['waitlisted'] > 0
+
+    # Nothing is left pending on a book that is out
+    assert db.session.execute(
+        db.select(db.func.count()).select_from(BorrowRequest)
+        .join(Book, Book.id == BorrowRequest.book_id)
+        .where(BorrowRequest.status == 'pending', Book.status == 'borrowed')
+    ).scalar() == 0
+
+    # Every waitlisted request has an entry, queued first come first served
+    queues = {}
+    for book_id, position, requested_at, status in db.session.execute(
+        db.select(WaitlistEntry.book_id, WaitlistEntry.position,
+                  BorrowRequest.requested_at, BorrowRequest.status)
+        .join(BorrowRequest, BorrowRequest.id == WaitlistEntry.request_id)
+        .order_by(WaitlistEntry.book_id, WaitlistEntry.position)
+    ).all():
+        assert status == 'waitlisted'
+        queues.setdefault(book_id, []).append((position, requested_at))
+    assert sum(map(len, queues.values())) == result['waitlisted']
+    for queue in queues.values():
+        assert [position for position, _ in queue] == list(
+            range(1, len(queue) + 1)
+        )
+        assert [at for _, at in queue] == sorted(at for _, at in queue)
+
+    # One open request per resident and book
+    assert db.session.execute(
+        db.select(db.func.count()).select_from(
+            db.select(BorrowRequest.book_id, BorrowRequest.borrower_id)
+            .where(BorrowRequest.status.in_(('pending', 'waitlisted')))
+            .group_by(BorrowRequest.book_id, BorrowRequest.borrower_id)
+            .having(db.func.count() > 1)
+            .subquery()
+        )
+    ).scalar() == 0
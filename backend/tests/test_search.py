@@ -0,0 +1,102 @@
+import pytest
+
+import search_index
+from database import db
+from models import Book
+from search_index import book_trigrams, fuzzy_matches, rebuild_search_index
+
+
+def _search(client, headers, text, match='auto'):
+    response = client.get('/api/books', headers=headers, query_string={
+        'search': text, 'match': match, 'status': 'all'
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    return body['match'], [book['title'] for book in body['data']]
+
+
+def _similarities(text, **kwargs):
+    matches = fuzzy_matches(text, **kwargs)
+    return {
+        book_id: round(similarity, 6)
+        for book_id, similarity in db.session.execute(
+            db.select(matches.c.book_id, matches.c.similarity)
+        ).all()
+    }
+
+
+def test_misspelt_search_falls_back_to_fuzzy(client, login):
+    headers = login('101')
+
+    assert _search(client, headers, 'mockingbrd') == (
+        'fuzzy', ['To Kill a Mockingbird']
+    )
+    assert _search(client, headers, 'Mockingbird') == (
+        'exact', ['To Kill a Mockingbird']
+    )
+    assert _search(client, headers, 'xyzzy') == ('fuzzy', [])
+
+
+def test_close_match_ranks_above_a_long_title_containing_it(client, login,
+                                                            monkeypatch):
+    monkeypatch.setenv('SEARCH_FUZZY_THRESHOLD', '0.1')
+    headers = login('101')
+    client.post('/api/books', headers=headers, json={
+        'title': 'Dune Messiah and the Complete Chronicles of Arrakis',
+        'author': 'Frank Herbert'
+    })
+
+    # Both contain every trigram of the query; the shorter one is closer
+    assert _search(client, headers, 'dune', match='fuzzy')[1] == [
+        'Dune', 'Dune Messiah and the Complete Chronicles of Arrakis'
+    ]
+
+
+def test_book_trigram_counts_follow_edits(app):
+    book = db.session.get(Book, 7)
+    assert book.trigram_count == len(book_trigrams('Dune', 'Frank Herbert'))
+
+    book.title = 'Dune Messiah'
+    db.session.commit()
+
+    assert book.trigram_count == len(
+        book_trigrams('Dune Messiah', 'Frank Herbert')
+    )
+
+
+def test_rebuild_backfills_missing_counts(app):
+    db.session.execute(db.update(Book).values(trigram_count=None))
+    db.session.commit()
+
+    rebuild_search_index()
+
+    assert db.session.execute(
+        db.select(db.func.count()).where(Book.trigram_count.is_(None))
+    ).scalar() == 0
+
+
+def test_common_trigrams_are_not_scanned_but_still_scored(app, monkeypatch):
+    expected = _similarities('the alchemist')
+
+    monkeypatch.setenv('SEARCH_MAX_POSTINGS', '1')
+    scanned = []
+    real_common = search_index._common_trigrams
+
+    def spy(grams, limit):
+        common = real_common(grams, limit)
+        scanned.extend(set(grams) - common)
+        return common
+
+    monkeypatch.setattr(search_index, '_common_trigrams', spy)
+
+    assert _similarities('the alchemist') == expected
+    # "The" opens two titles, so its postings are skipped
+    assert 'the' not in scanned
+    assert 'alc' in scanned
+
+
+@pytest.mark.parametrize('text', ['', '!!', 'the'])
+def test_queries_without_rare_trigrams_match_nothing(app, monkeypatch, text):
+    monkeypatch.setenv('SEARCH_MAX_POSTINGS', '1')
+
+    assert fuzzy_matches(text) is None
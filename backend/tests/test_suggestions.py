@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pytest
+from flask import g
+
+import suggestions
+from suggestions import PrefixIndex, get_prefix_index
+
+
+def _texts(found):
+    return [display for _, display, _ in found]
+
+
+def _built_index(app):
+    index = get_prefix_index()
+    index.rebuild()
+    return index
+
+
+@pytest.fixture
+def slow_rebuild(monkeypatch):
+    """Make rebuilds wait for release.set(), counting how many start."""
+    release = threading.Event()
+    started = []
+    original = PrefixIndex.rebuild
+
+    def rebuild(self):
+        started.append(self)
+        release.wait(5)
+        original(self)
+
+    monkeypatch.setattr(PrefixIndex, 'rebuild', rebuild)
+    yield started, release
+    release.set()
+
+
+def _wait_for_rebuild(index):
+    for _ in range(500):
+        if not index._rebuilding:
+            return
+        time.sleep(0.01)
+    raise AssertionError('rebuild did not finish')
+
+
+def test_first_lookup_builds_in_the_background(app, slow_rebuild):
+    started, release = slow_rebuild
+    index = get_prefix_index()
+
+    # Not built yet: answers at once instead of scanning books
+    assert index.suggest('gats') == []
+    assert not index.ready
+
+    release.set()
+    _wait_for_rebuild(index)
+    assert _texts(index.suggest('gats')) == ['The Great Gatsby']
+
+
+def test_concurrent_lookups_start_one_rebuild(app, slow_rebuild):
+    started, release = slow_rebuild
+    index = get_prefix_index()
+
+    def lookup():
+        with app.test_request_context():
+            index.suggest('dune')
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    release.set()
+    _wait_for_rebuild(index)
+    assert len(started) == 1
+
+
+def test_stale_index_keeps_answering_during_rebuild(app, slow_rebuild):
+    started, release = slow_rebuild
+    index = PrefixIndex(ttl=0)
+    release.set()
+    index.rebuild()
+    release.clear()
+
+    # Stale: schedules a rebuild, but answers from the old index meanwhile
+    assert _texts(index.suggest('dune')) == ['Dune']
+    assert index._rebuilding
+
+    release.set()
+    _wait_for_rebuild(index)
+
+
+def test_writes_during_a_rebuild_are_kept(app, monkeypatch):
+    index = PrefixIndex()
+    index.rebuild()
+
+    # Pause the next rebuild in the middle of reading the table
+    scanning, release = threading.Event(), threading.Event()
+    original_add = PrefixIndex._add
+
+    def add(self, kind, display, count=1, bulk=False):
+        if bulk and not scanning.is_set():
+            scanning.set()
+            release.wait(5)
+        return original_add(self, kind, display, count, bulk)
+
+    monkeypatch.setattr(PrefixIndex, '_add', add)
+    thread = threading.Thread(target=index._rebuild_in_context,
+                              args=(app, None))
+    thread.start()
+    assert scanning.wait(5)
+    index.book_added('Gathering Storm', 'Someone', 'History')
+    release.set()
+    thread.join()
+
+    assert 'Gathering Storm' in _texts(index.suggest('gath'))
+
+
+def test_incremental_updates(app):
+    index = _built_index(app)
+
+    index.book_added('Dune Messiah', 'Frank Herbert', 'Science Fiction')
+    found = index.suggest('frank')
+    assert found == [('author', 'Frank Herbert', 2)]
+
+    index.book_removed('Dune', 'Frank Herbert', 'Science Fiction')
+    index.book_removed('Dune Messiah', 'Frank Herbert', 'Science Fiction')
+    assert index.suggest('frank') == []
+
+
+def test_indexes_per_database_are_bounded(app, monkeypatch):
+    monkeypatch.setenv('SUGGEST_MAX_INDEXES', '2')
+    for tenant in ('a', 'b', 'c'):
+        g.tenant = tenant
+        get_prefix_index()
+    g.pop('tenant')
+
+    assert list(suggestions._indexes) == ['b', 'c']
+
+
+def test_suggest_endpoint(client, login):
+    headers = login('101')
+    with client.application.test_request_context():
+        get_prefix_index().rebuild()
+
+    response = client.get('/api/books/suggest?prefix=orw', headers=headers)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['ready']
+    assert body['data'] == [
+        {'text': 'George Orwell', 'type': 'author', 'count': 1}
+    ]
+
+    client.post('/api/books', headers=headers,
+                json={'title': 'Animal Farm', 'author': 'George Orwell'})
+    data = client.get('/api/books/suggest?prefix=orw',
+                      headers=headers).get_json()['data']
+    assert data == [{'text': 'George Orwell', 'type': 'author', 'count': 2}]
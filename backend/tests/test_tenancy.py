@@ -0,0 +1,90 @@
+import pytest
+from flask import g
+
+from conftest import PASSWORD
+from database import db
+from middleware import admin_apartments, auth_cache_key, token_required
+from models import User
+from tenancy import TenantEngines, select_tenant
+
+
+@pytest.fixture
+def buildings(app, tmp_path, monkeypatch):
+    """Turn on multi-building mode with 'north' and 'south' buildings."""
+    engines = TenantEngines(str(tmp_path))
+    monkeypatch.setitem(app.extensions, 'tenants', engines)
+    hooks = app.before_request_funcs.get(None, [])
+    monkeypatch.setitem(app.before_request_funcs, None,
+                        [select_tenant, *hooks])
+    for code in ('north', 'south'):
+        engines.create(code)
+    yield engines
+    for code in ('north', 'south'):
+        engines.get(code).dispose()
+
+
+@pytest.fixture
+def building_login(client, buildings):
+    """Register apartment 101 in a building and return its auth header."""
+    def login_as(tenant):
+        body = {'apartment_number': '101', 'password': PASSWORD,
+                'tenant': tenant}
+        client.post('/api/auth/register',
+                    json={**body, 'name': f'Resident of {tenant}'})
+        response = client.post('/api/auth/login', json=body)
+        assert response.status_code == 200, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['token']}"}
+    return login_as
+
+
+def test_admin_apartments_are_per_building(monkeypatch):
+    monkeypatch.setenv('ADMIN_APARTMENTS', '101, north:101,north:202')
+
+    assert admin_apartments() == {'101'}
+    assert admin_apartments('north') == {'101', '202'}
+    assert admin_apartments('south') == set()
+
+
+def test_admin_in_one_building_only(client, login, building_login,
+                                    monkeypatch):
+    monkeypatch.setenv('ADMIN_APARTMENTS', '101,north:101')
+
+    def export(headers):
+        return client.get('/api/admin/export/books', headers=headers)
+
+    assert export(login('101')).status_code == 200
+    assert export(building_login('north')).status_code == 200
+    assert export(building_login('south')).status_code == 403
+
+
+def test_cached_user_is_not_reused_across_buildings(app, building_login):
+    token = building_login('north')['Authorization'].split(' ')[1]
+    primary_user = User.query.filter_by(apartment_number='101').one()
+    # Resolved by an earlier request, not by this request's session
+    db.session.expunge(primary_user)
+
+    @token_required
+    def whoami(current_user):
+        return current_user.name
+
+    with app.test_request_context(
+            headers={'Authorization': f'Bearer {token}'}):
+        # A user cached for the same token in the primary database
+        g.auth_cache = ((None, token), primary_user)
+        select_tenant()
+
+        assert auth_cache_key(token) == ('north', token)
+        assert whoami() == 'Resident of north'
+
+
+def test_parallel_batch_stays_in_the_callers_building(client, building_login):
+    response = client.post('/api/batch', headers=building_login('south'),
+                           json={
+                               'requests': [{'path': '/api/auth/profile'}] * 3,
+                               'max_parallel': 3
+                           })
+
+    assert response.status_code == 200
+    names = {result['body']['user']['name']
+             for result in response.get_json()['data']}
+    assert names == {'Resident of south'}
@@ -0,0 +1,114 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import db
+from models import Book, BorrowRequest
+from transitions import compare_and_set, current_status
+
+
+def _pending_request(book_id, borrower_id, lender_id):
+    borrow_request = BorrowRequest(book_id=book_id, borrower_id=borrower_id,
+                                   lender_id=lender_id, status='pending')
+    db.session.add(borrow_request)
+    db.session.commit()
+    return borrow_request.id
+
+
+def test_second_transition_from_same_status_fails(app):
+    request_id = _pending_request(book_id=1, borrower_id=2, lender_id=1)
+
+    assert compare_and_set(BorrowRequest, request_id, 'pending',
+                           status='approved')
+    assert not compare_and_set(BorrowRequest, request_id, 'pending',
+                               status='rejected')
+    db.session.commit()
+
+    assert current_status(BorrowRequest, request_id) == 'approved'
+
+
+def test_extra_conditions_must_hold(app):
+    db.session.execute(db.update(Book).where(Book.id == 1).values(
+        status='borrowed', borrower_id=2
+    ))
+    db.session.commit()
+
+    # Returned by someone who does not hold the book: no change
+    assert not compare_and_set(Book, 1, 'borrowed', Book.borrower_id == 3,
+                               status='available', borrower_id=None)
+    assert compare_and_set(Book, 1, 'borrowed', Book.borrower_id == 2,
+                           status='available', borrower_id=None)
+
+
+def test_concurrent_transitions_have_one_winner(app):
+    request_id = _pending_request(book_id=1, borrower_id=2, lender_id=1)
+    contenders = 8
+    barrier = threading.Barrier(contenders)
+
+    def transition(new_status):
+        with app.app_context():
+            barrier.wait()
+            won = compare_and_set(BorrowRequest, request_id, 'pending',
+                                  status=new_status)
+            db.session.commit()
+            return new_status if won else None
+
+    statuses = ['approved', 'rejected', 'cancelled', 'approved'] * 2
+    with ThreadPoolExecutor(max_workers=contenders) as pool:
+        winners = [s for s in pool.map(transition, statuses) if s]
+
+    assert len(winners) == 1
+    assert current_status(BorrowRequest, request_id) == winners[0]
+
+
+def test_concurrent_approvals_lend_the_book_once(client, login):
+    # Residents 102, 201 and 202 all ask for Alice's (101) first book
+    request_ids = []
+    for apartment in ('102', '201', '202'):
+        response = client.post('/api/requests', json={'book_id': 1},
+                               headers=login(apartment))
+        assert response.status_code == 201
+        request_ids.append(response.get_json()['data']['id'])
+
+    lender = login('101')
+    barrier = threading.Barrier(len(request_ids))
+
+    def approve(request_id):
+        barrier.wait()
+        return client.put(f'/api/requests/{request_id}/approve',
+                          headers=lender).status_code
+
+    with ThreadPoolExecutor(max_workers=len(request_ids)) as pool:
+        codes = list(pool.map(approve, request_ids))
+
+    assert codes.count(200) == 1
+    winner = request_ids[codes.index(200)]
+
+    db.session.expire_all()
+    book = db.session.get(Book, 1)
+    approved = db.session.execute(
+        db.select(BorrowRequest.id).where(
+            BorrowRequest.book_id == 1, BorrowRequest.status == 'approved'
+        )
+    ).scalars().all()
+    assert book.status == 'borrowed'
+    assert approved == [winner]
+    assert book.borrower_id == db.session.get(BorrowRequest,
+                                              winner).borrower_id
+
+
+def test_approving_a_waitlisted_request_is_refused(client, login):
+    first = client.post('/api/requests', json={'book_id': 1},
+                        headers=login('102')).get_json()['data']['id']
+    second = client.post('/api/requests', json={'book_id': 1},
+                         headers=login('201')).get_json()['data']['id']
+    lender = login('101')
+
+    assert client.put(f'/api/requests/{first}/approve',
+                      headers=lender).status_code == 200
+    # The competing request was queued behind the borrower
+    assert current_status(BorrowRequest, second) == 'waitlisted'
+    assert client.put(f'/api/requests/{second}/approve',
+                      headers=lender).status_code == 400
+
+    db.session.expire_all()
+    assert db.session.get(Book, 1).borrower_id == 2
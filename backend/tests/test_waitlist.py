@@ -0,0 +1,201 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import event
+
+import notification_templates as templates
+import waitlist
+from database import db
+from models import Book, BorrowRequest, OutboxEvent
+from transitions import current_status
+
+
+def _request(client, headers, book_id=1):
+    response = client.post('/api/requests', json={'book_id': book_id},
+                           headers=headers)
+    assert response.status_code in (201, 202), response.get_json()
+    return response.get_json()['data']['id']
+
+
+def _queued_notifications():
+    return [
+        json.loads(payload) for payload in db.session.execute(
+            db.select(OutboxEvent.payload)
+            .where(OutboxEvent.event_type == 'notification')
+            .order_by(OutboxEvent.id)
+        ).scalars()
+    ]
+
+
+def test_approval_queues_competing_requests_in_order(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+
+    assert client.put(f'/api/requests/{first}/approve',
+                      headers=login('101')).status_code == 200
+
+    assert [row.request_id for row in waitlist.queue_for(1)] == [second,
+                                                                 third]
+    assert waitlist.position_of(second) == 1
+    assert waitlist.position_of(third) == 2
+
+
+@pytest.mark.parametrize('update_returning', [True, False])
+def test_approval_moves_the_other_requests_to_the_waitlist(
+        client, login, monkeypatch, update_returning):
+    monkeypatch.setattr(db.engine.dialect, 'update_returning',
+                        update_returning)
+    statements = []
+
+    def record(connection, cursor, statement, *args):
+        statements.append(statement)
+
+    first = _request(client, login('102'))
+    winner = _request(client, login('201'))
+    third = _request(client, login('202'))
+    other_book = _request(client, login('102'), book_id=2)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        assert client.put(f'/api/requests/{winner}/approve',
+                          headers=login('101')).status_code == 200
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert current_status(BorrowRequest, winner) == 'approved'
+    assert current_status(BorrowRequest, first) == 'waitlisted'
+    assert current_status(BorrowRequest, third) == 'waitlisted'
+    assert current_status(BorrowRequest, other_book) == 'pending'
+    # Queued in the order the requests were made
+    assert waitlist.position_of(first) == 1
+    assert waitlist.position_of(third) == 2
+    assert waitlist.position_of(winner) is None
+
+    moved = [n for n in _queued_notifications()
+             if n['template'] == templates.MOVED_TO_WAITLIST]
+    assert sorted((n['user_id'], n['request_id']) for n in moved) == [
+        (2, first), (4, third)
+    ]
+    assert {n['actor_id'] for n in moved} == {1}
+    assert any('RETURNING' in statement
+               for statement in statements) == update_returning
+
+
+def test_request_for_a_lent_book_joins_the_back_of_the_line(client, login):
+    first = _request(client, login('102'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+
+    response = client.post('/api/requests', json={'book_id': 1},
+                           headers=login('201'))
+    assert response.status_code == 202
+    assert response.get_json()['position'] == 1
+    assert response.get_json()['data']['status'] == 'waitlisted'
+
+
+def test_return_promotes_the_head_of_the_line(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+
+    assert client.put(f'/api/requests/{first}/return',
+                      headers=login('102')).status_code == 200
+
+    assert current_status(BorrowRequest, second) == 'pending'
+    assert current_status(BorrowRequest, third) == 'waitlisted'
+    assert waitlist.position_of(second) is None
+    assert waitlist.position_of(third) == 1
+    assert db.session.get(Book, 1).status == 'available'
+
+    promoted = [n for n in _queued_notifications()
+                if n['template'] == templates.WAITLIST_PROMOTED]
+    assert [(n['user_id'], n['request_id']) for n in promoted] == [
+        (3, second)
+    ]
+
+
+def test_new_request_cannot_jump_the_queue(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+    client.put(f'/api/requests/{first}/return', headers=login('102'))
+
+    # The book is available again, but resident 202 is still waiting
+    response = client.post('/api/requests', json={'book_id': 1},
+                           headers=login('301'))
+    assert response.status_code == 202
+    assert response.get_json()['position'] == 2
+    assert current_status(BorrowRequest, second) == 'pending'
+    assert waitlist.position_of(third) == 1
+
+
+def test_cancelled_waiter_leaves_the_line(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+
+    assert client.put(f'/api/requests/{second}/cancel',
+                      headers=login('201')).status_code == 200
+    client.put(f'/api/requests/{first}/return', headers=login('102'))
+
+    assert current_status(BorrowRequest, second) == 'cancelled'
+    assert current_status(BorrowRequest, third) == 'pending'
+
+
+def test_promotion_skips_requests_that_left_the_queue(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+
+    # The head's status moved on without its queue entry being removed
+    db.session.execute(db.update(BorrowRequest).where(
+        BorrowRequest.id == second
+    ).values(status='cancelled'))
+    db.session.commit()
+
+    client.put(f'/api/requests/{first}/return', headers=login('102'))
+
+    assert current_status(BorrowRequest, second) == 'cancelled'
+    assert current_status(BorrowRequest, third) == 'pending'
+    assert waitlist.queue_for(1) == []
+
+
+def test_no_promotion_while_a_request_is_pending(client, login):
+    first = _request(client, login('102'))
+    second = _request(client, login('201'))
+    third = _request(client, login('202'))
+    client.put(f'/api/requests/{first}/approve', headers=login('101'))
+    client.put(f'/api/requests/{first}/return', headers=login('102'))
+    assert current_status(BorrowRequest, second) == 'pending'
+
+    # Promoting again must not add a second pending request
+    assert waitlist.promote_next(1) is None
+    assert current_status(BorrowRequest, third) == 'waitlisted'
+    assert waitlist.position_of(third) == 1
+
+
+def test_concurrent_joins_get_distinct_positions(app):
+    joiners = 8
+    barrier = threading.Barrier(joiners)
+
+    def join(request_id):
+        with app.app_context():
+            barrier.wait()
+            waitlist.append(1, [(request_id, 2)])
+            db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=joiners) as pool:
+        list(pool.map(join, range(100, 100 + joiners)))
+
+    positions = sorted(
+        waitlist.position_of(request_id)
+        for request_id in range(100, 100 + joiners)
+    )
+    assert positions == list(range(1, joiners + 1))
+    assert len(waitlist.queue_for(1)) == joiners
@@ -0,0 +1,37 @@
+from database import db
+
+
+def compare_and_set(model, row_id, expected_status, *conditions, **values):
+    """
+    Atomically move a row from one status to another.
+
+    Runs a single ``UPDATE ... WHERE id = :id AND status = :expected``.
+    The status check and the write cannot be interleaved with another
+    transaction, so when several requests race for the same transition
+    exactly one of them matches the row.
+
+    Args:
+        model: Mapped class with ``id`` and ``status`` columns
+        row_id: Primary key of the row to update
+        expected_status: Status the row must currently have
+        *conditions: Extra WHERE clauses that must also hold
+        **values: Columns to set, normally including the new ``status``
+
+    Returns:
+        True if the row was updated, False if the precondition failed
+    """
+    updated = db.session.execute(
+        db.update(model).where(
+            model.id == row_id,
+            model.status == expected_status,
+            *conditions
+        ).values(**values).execution_options(synchronize_session=False)
+    ).rowcount
+    return updated == 1
+
+
+def current_status(model, row_id):
+    """Read a row's status, e.g. to explain why a transition failed."""
+    return db.session.execute(
+        db.select(model.status).where(model.id == row_id)
+    ).scalar()
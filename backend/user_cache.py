@@ -0,0 +1,86 @@
+from flask import g, has_app_context
+from sqlalchemy.orm.util import identity_key
+from database import db
+
+
+def _users():
+    """The {id: User} map of the current app context (one per request)."""
+    if not has_app_context():
+        return {}
+    users = g.get('user_cache')
+    if users is None:
+        users = g.user_cache = {}
+    return users
+
+
+def remember_user(user):
+    """Seed the cache, e.g. with the authenticated user."""
+    if user is not None:
+        _users()[user.id] = user
+    return user
+
+
+def prime_users(user_ids):
+    """
+    Make sure every given user is cached, loading the missing ones with a
+    single ``IN (...)`` query.
+
+    Users the session has already loaded (the current user, joined
+    relationships) are taken from its identity map without any SQL.
+
+    Args:
+        user_ids: Iterable of user ids; None values are ignored
+
+    Returns:
+        The request's {id: User} map
+    """
+    from models import User
+
+    users = _users()
+    missing = set()
+    for user_id in user_ids:
+        if user_id is None or user_id in users:
+            continue
+        user = db.session.identity_map.get(identity_key(User, user_id))
+        if user is not None:
+            users[user_id] = user
+        else:
+            missing.add(user_id)
+
+    if missing:
+        for user in db.session.execute(
+            db.select(User).where(User.id.in_(missing))
+        ).scalars():
+            users[user.id] = user
+        # Remember misses too, so a deleted user is not looked up per row
+        for user_id in missing:
+            users.setdefault(user_id, None)
+    return users
+
+
+def prime_users_for(rows, *attributes):
+    """
+    Cache the users referenced by a result set before serializing it.
+
+    Only attributes that were actually loaded are read, so rows fetched
+    with a ?fields= projection never trigger extra column loads.
+
+    Args:
+        rows: Model instances about to be serialized
+        *attributes: Foreign key attribute names, e.g. 'owner_id'
+    """
+    prime_users(
+        row.__dict__.get(attribute)
+        for row in rows
+        for attribute in attributes
+    )
+
+
+def get_user(user_id):
+    """A user by id from the request cache, loading it if needed."""
+    if user_id is None:
+        return None
+    users = _users()
+    if user_id not in users:
+        users = prime_users([user_id])
+    return users.get(user_id)
@@ -0,0 +1,175 @@
+from datetime import datetime
+from database import db
+from outbox import notify
+from transitions import compare_and_set
+from borrow_events import record_event, PROMOTED
+import notification_templates as templates
+
+
+def has_waiters(book_id):
+    from models import WaitlistEntry
+
+    return db.session.execute(
+        db.select(WaitlistEntry.id)
+        .where(WaitlistEntry.book_id == book_id)
+        .limit(1)
+    ).first() is not None
+
+
+def append(book_id, entries):
+    """
+    Append requests to the end of a book's waitlist, in the given order.
+
+    The next position is read and written in the same INSERT ... SELECT,
+    so concurrent joins cannot be handed the same position.
+
+    Args:
+        book_id: Book being waited for
+        entries: List of (request_id, user_id) tuples
+    """
+    from models import WaitlistEntry
+
+    for request_id, user_id in entries:
+        next_position = db.select(
+            db.literal(book_id),
+            db.func.coalesce(db.func.max(WaitlistEntry.position), 0) + 1,
+            db.literal(request_id),
+            db.literal(user_id),
+            db.literal(datetime.utcnow())
+        ).where(WaitlistEntry.book_id == book_id)
+        db.session.execute(
+            db.insert(WaitlistEntry).from_select(
+                ['book_id', 'position', 'request_id', 'user_id',
+                 'created_at'],
+                next_position
+            )
+        )
+
+
+def remove(request_id):
+    """Take a request off its waitlist. Returns True if it was queued."""
+    from models import WaitlistEntry
+
+    return db.session.execute(
+        db.delete(WaitlistEntry).where(WaitlistEntry.request_id == request_id)
+    ).rowcount == 1
+
+
+def position_of(request_id):
+    """1-based place in the queue, or None if the request is not waiting."""
+    from models import WaitlistEntry
+
+    entry = db.session.execute(
+        db.select(WaitlistEntry.book_id, WaitlistEntry.position)
+        .where(WaitlistEntry.request_id == request_id)
+    ).first()
+    if entry is None:
+        return None
+
+    ahead = db.session.execute(
+        db.select(db.func.count()).select_from(WaitlistEntry).where(
+            WaitlistEntry.book_id == entry.book_id,
+            WaitlistEntry.position < entry.position
+        )
+    ).scalar()
+    return ahead + 1
+
+
+def queue_for(book_id):
+    """
+    A book's waitlist in order, as rows of (request_id, user_id, joined_at).
+    """
+    from models import WaitlistEntry
+
+    return db.session.execute(
+        db.select(
+            WaitlistEntry.request_id,
+            WaitlistEntry.user_id,
+            WaitlistEntry.created_at.label('joined_at')
+        )
+        .where(WaitlistEntry.book_id == book_id)
+        .order_by(WaitlistEntry.position)
+    ).all()
+
+
+def clear(book_id):
+    """Drop a book's whole waitlist, e.g. when the book is removed."""
+    from models import WaitlistEntry
+
+    db.session.execute(
+        db.delete(WaitlistEntry).where(WaitlistEntry.book_id == book_id)
+    )
+
+
+def promote_next(book_id):
+    """
+    Turn the head of a book's waitlist into a pending request.
+
+    Does nothing unless the book is available and nobody already holds a
+    pending request for it, so calling it after any transition that may
+    free the book is safe. Only the promoted resident and the lender are
+    notified.
+
+    Returns:
+        The promoted BorrowRequest, or None
+    """
+    from models import Book, BorrowRequest, WaitlistEntry
+
+    book = db.session.execute(
+        db.select(Book.status, Book.owner_id).where(Book.id == book_id)
+    ).first()
+    if book is None or book.status != 'available':
+        return None
+
+    pending = db.session.execute(
+        db.select(BorrowRequest.id).where(
+            BorrowRequest.book_id == book_id,
+            BorrowRequest.status == 'pending'
+        ).limit(1)
+    ).first()
+    if pending:
+        return None
+
+    while True:
+        head = db.session.execute(
+            db.select(WaitlistEntry.id, WaitlistEntry.request_id)
+            .where(WaitlistEntry.book_id == book_id)
+            .order_by(WaitlistEntry.position)
+            .limit(1)
+        ).first()
+        if head is None:
+            return None
+
+        # Claim the head; a concurrent promotion that got there first
+        # makes this delete match nothing
+        claimed = db.session.execute(
+            db.delete(WaitlistEntry).where(WaitlistEntry.id == head.id)
+        ).rowcount
+        if not claimed:
+            return None
+
+        if compare_and_set(BorrowRequest, head.request_id, 'waitlisted',
+                           status='pending',
+                           requested_at=datetime.utcnow()):
+            break
+        # The request left the queue some other way; try the next one
+
+    promoted = db.session.get(BorrowRequest, head.request_id)
+    db.session.refresh(promoted)
+    record_event(PROMOTED, promoted)
+
+    notify(
+        user_id=promoted.borrower_id,
+        template=templates.WAITLIST_PROMOTED,
+        book_id=book_id,
+        actor_id=book.owner_id,
+        request_id=promoted.id
+    )
+    notify(
+        user_id=book.owner_id,
+        template=templates.BORROW_REQUEST,
+        book_id=book_id,
+        actor_id=promoted.borrower_id,
+        request_id=promoted.id
+    )
+    return promoted
@@ -2,6 +2,7 @@ import React from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import { FiUser, FiMapPin, FiBook } from 'react-icons/fi';
+import { coversAPI } from '../services/api';
 
 const BookCard = ({ book, showActions = true }) => {
     const navigate = useNavigate();
@@ -25,7 +26,7 @@ const BookCard = ({ book, showActions = true }) => {
                 <div style={{ display: 'flex', gap: '14px', marginBottom: '12px' }}>
                     {book.cover_image ? (
                         <img
-                            src={book.cover_image}
+                            src={coversAPI.url(book.id, 'thumb')}
                             alt={book.title}
                             style={{
                                 width: '60px',
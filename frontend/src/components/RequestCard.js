@@ -20,6 +20,7 @@ const RequestCard = ({
     const getStatusIcon = (status) => {
         switch (status) {
             case 'pending':
+            case 'waitlisted':
                 return <FiClock />;
             case 'approved':
                 return <FiCheck />;
@@ -87,6 +88,11 @@ const RequestCard = ({
                         Responded: {formatDate(request.responded_at)}
                     </span>
                 )}
+                {request.status === 'approved' && request.due_at && (
+                    <span style={{ marginLeft: '16px' }}>
+                        Due: {formatDate(request.due_at)}
+                    </span>
+                )}
                 {request.returned_at && (
                     <span style={{ marginLeft: '16px' }}>
                         Returned: {formatDate(request.returned_at)}
@@ -113,13 +119,17 @@ const RequestCard = ({
                     </>
                 )}
 
-                {/* Borrower actions for outgoing pending requests */}
-                {type === 'outgoing' && request.status === 'pending' && (
+                {/* Borrower actions for outgoing pending or queued requests */}
+                {type === 'outgoing' &&
+                    ['pending', 'waitlisted'].includes(request.status) && (
                     <button
                         className="btn btn-sm btn-outline"
                         onClick={() => onCancel && onCancel(request.id)}
                     >
-                        <FiX /> Cancel Request
+                        <FiX />{' '}
+                        {request.status === 'waitlisted'
+                            ? 'Leave Waitlist'
+                            : 'Cancel Request'}
                     </button>
                 )}
 
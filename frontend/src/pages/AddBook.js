@@ -142,6 +142,7 @@ const AddBook = () => {
                 author: author.trim(),
                 cover_image: coverImage.trim(),
                 genre,
+                isbn: selectedBook?.isbn || undefined,
             });
 
             setSuccess('Book added successfully! Redirecting...');
@@ -176,6 +177,7 @@ const AddBook = () => {
                 author: author.trim(),
                 cover_image: coverImage.trim(),
                 genre,
+                isbn: selectedBook?.isbn || undefined,
             });
 
             setSuccess('Book added successfully! Add another one.');
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
-import { booksAPI, requestsAPI } from '../services/api';
+import { booksAPI, requestsAPI, coversAPI } from '../services/api';
 import {
     FiArrowLeft,
     FiUser,
@@ -14,6 +14,7 @@ import {
     FiEdit,
     FiTrash2,
     FiRotateCcw,
+    FiClock,
 } from 'react-icons/fi';
 
 const BookDetails = () => {
@@ -22,6 +23,7 @@ const BookDetails = () => {
     const { user } = useAuth();
 
     const [book, setBook] = useState(null);
+    const [waitlist, setWaitlist] = useState(null);
     const [loading, setLoading] = useState(true);
     const [error, setError] = useState('');
     const [success, setSuccess] = useState('');
@@ -57,6 +59,7 @@ const BookDetails = () => {
             setEditTitle(bookData.title);
             setEditAuthor(bookData.author);
             setEditGenre(bookData.genre || 'General');
+            fetchWaitlist();
         } catch (error) {
             setError('Failed to load book details');
         } finally {
@@ -64,6 +67,15 @@ const BookDetails = () => {
         }
     };
 
+    const fetchWaitlist = async () => {
+        try {
+            const response = await booksAPI.getWaitlist(id);
+            setWaitlist(response.data.data);
+        } catch (error) {
+            setWaitlist(null);
+        }
+    };
+
     const handleBorrowRequest = async (e) => {
         e.preventDefault();
         setError('');
@@ -71,12 +83,14 @@ const BookDetails = () => {
         setActionLoading(true);
 
         try {
-            await requestsAPI.create({
+            const response = await requestsAPI.create({
                 book_id: book.id,
                 message: borrowMessage.trim(),
             });
             setSuccess(
-                'Borrow request sent successfully! The lender will review your request.'
+                response.status === 202
+                    ? response.data.message
+                    : 'Borrow request sent successfully! The lender will review your request.'
             );
             setShowBorrowForm(false);
             setBorrowMessage('');
@@ -223,7 +237,7 @@ const BookDetails = () => {
                         {/* Cover Image */}
                         {book.cover_image ? (
                             <img
-                                src={book.cover_image}
+                                src={coversAPI.url(book.id, 'medium')}
                                 alt={book.title}
                                 style={{
                                     width: '150px',
@@ -342,6 +356,35 @@ const BookDetails = () => {
                             </div>
                         )}
 
+                        {/* Borrower: Join the waitlist */}
+                        {!isOwner && book.status === 'borrowed' &&
+                            !waitlist?.my_position && (
+                            <button
+                                className="btn btn-secondary btn-lg"
+                                onClick={() => setShowBorrowForm(true)}
+                            >
+                                <FiClock /> Join Waitlist
+                                {waitlist?.length > 0 && ` (${waitlist.length} waiting)`}
+                            </button>
+                        )}
+
+                        {/* Borrower: Already waiting */}
+                        {!isOwner && waitlist?.my_position && (
+                            <div className="alert alert-info" style={{ margin: 0 }}>
+                                <FiClock />
+                                You are #{waitlist.my_position} on the waitlist.
+                            </div>
+                        )}
+
+                        {/* Owner: Waitlist size */}
+                        {isOwner && waitlist?.length > 0 && (
+                            <div className="alert alert-info" style={{ margin: 0 }}>
+                                <FiClock />
+                                {waitlist.length} resident
+                                {waitlist.length === 1 ? ' is' : 's are'} waiting for this book.
+                            </div>
+                        )}
+
                         {/* Owner: Edit */}
                         {isOwner && book.status !== 'borrowed' && (
                             <button
@@ -382,7 +425,11 @@ const BookDetails = () => {
                 <div className="modal-overlay" onClick={() => setShowBorrowForm(false)}>
                     <div className="modal" onClick={(e) => e.stopPropagation()}>
                         <div className="modal-header">
-                            <h2>Request to Borrow</h2>
+                            <h2>
+                                {book.status === 'available'
+                                    ? 'Request to Borrow'
+                                    : 'Join Waitlist'}
+                            </h2>
                             <button
                                 className="modal-close"
                                 onClick={() => setShowBorrowForm(false)}
@@ -401,7 +448,7 @@ const BookDetails = () => {
                         >
                             {book.cover_image ? (
                                 <img
-                                    src={book.cover_image}
+                                    src={coversAPI.url(book.id, 'thumb')}
                                     alt={book.title}
                                     style={{
                                         width: '50px',
@@ -581,7 +628,7 @@ const BookDetails = () => {
                         >
                             {book.cover_image ? (
                                 <img
-                                    src={book.cover_image}
+                                    src={coversAPI.url(book.id, 'thumb')}
                                     alt={book.title}
                                     style={{
                                         width: '50px',
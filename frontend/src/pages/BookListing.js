@@ -6,7 +6,9 @@ import { FiSearch, FiFilter } from 'react-icons/fi';
 const BookListing = () => {
     const [books, setBooks] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [query, setQuery] = useState('');
     const [search, setSearch] = useState('');
+    const [suggestions, setSuggestions] = useState([]);
     const [genre, setGenre] = useState('');
     const [status, setStatus] = useState('available');
     const [genres, setGenres] = useState([]);
@@ -21,6 +23,32 @@ const BookListing = () => {
         fetchBooks();
     }, [search, genre, status, page]);
 
+    // Suggestions on every keystroke; the full search once typing pauses
+    useEffect(() => {
+        const timer = setTimeout(() => {
+            setSearch(query.trim());
+            setPage(1);
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [query]);
+
+    useEffect(() => {
+        if (!query.trim()) {
+            setSuggestions([]);
+            return;
+        }
+        let cancelled = false;
+        booksAPI
+            .suggest(query, { limit: 8 })
+            .then((response) => {
+                if (!cancelled) setSuggestions(response.data.data);
+            })
+            .catch(() => {});
+        return () => {
+            cancelled = true;
+        };
+    }, [query]);
+
     const fetchGenres = async () => {
         try {
             const response = await booksAPI.getGenres();
@@ -50,8 +78,7 @@ const BookListing = () => {
     };
 
     const handleSearchChange = (e) => {
-        setSearch(e.target.value);
-        setPage(1);
+        setQuery(e.target.value);
     };
 
     const handleGenreChange = (e) => {
@@ -91,9 +118,18 @@ const BookListing = () => {
                     <input
                         type="text"
                         placeholder="Search by title or author..."
-                        value={search}
+                        value={query}
                         onChange={handleSearchChange}
+                        list="book-suggestions"
                     />
+                    <datalist id="book-suggestions">
+                        {suggestions.map((suggestion) => (
+                            <option
+                                key={`${suggestion.type}:${suggestion.text}`}
+                                value={suggestion.text}
+                            />
+                        ))}
+                    </datalist>
                 </div>
 
                 <div className="search-filter">
@@ -186,6 +222,7 @@ const BookListing = () => {
                         <button
                             className="btn btn-outline"
                             onClick={() => {
+                                setQuery('');
                                 setSearch('');
                                 setGenre('');
                                 setStatus('available');
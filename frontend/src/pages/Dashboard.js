@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { Link } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
-import { statsAPI, booksAPI, requestsAPI } from '../services/api';
+import { statsAPI, dashboardAPI } from '../services/api';
 import BookCard from '../components/BookCard';
 import {
     FiBook,
@@ -17,7 +17,7 @@ const Dashboard = () => {
     const [stats, setStats] = useState(null);
     const [recentBooks, setRecentBooks] = useState([]);
     const [myBooks, setMyBooks] = useState([]);
-    const [pendingRequests, setPendingRequests] = useState([]);
+    const [pendingCount, setPendingCount] = useState(0);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
@@ -28,17 +28,16 @@ const Dashboard = () => {
         try {
             setLoading(true);
 
-            const [statsRes, booksRes, myBooksRes, requestsRes] = await Promise.all([
+            const [statsRes, summaryRes] = await Promise.all([
                 statsAPI.getStats(),
-                booksAPI.getAll({ per_page: 4, status: 'available' }),
-                booksAPI.getMyBooks({}),
-                requestsAPI.getIncoming({ status: 'pending' }),
+                dashboardAPI.getSummary({ limit: 4 }),
             ]);
 
+            const summary = summaryRes.data.data;
             setStats(statsRes.data.data);
-            setRecentBooks(booksRes.data.data);
-            setMyBooks(myBooksRes.data.data);
-            setPendingRequests(requestsRes.data.data);
+            setRecentBooks(summary.recent_books);
+            setMyBooks(summary.my_recent_books);
+            setPendingCount(summary.incoming_requests.by_status.pending || 0);
         } catch (error) {
             console.error('Failed to fetch dashboard data:', error);
         } finally {
@@ -111,11 +110,11 @@ const Dashboard = () => {
             )}
 
             {/* Pending Requests Alert */}
-            {pendingRequests.length > 0 && (
+            {pendingCount > 0 && (
                 <div className="alert alert-warning mb-3">
                     <FiInbox />
-                    You have {pendingRequests.length} pending borrow request
-                    {pendingRequests.length > 1 ? 's' : ''}.{' '}
+                    You have {pendingCount} pending borrow request
+                    {pendingCount > 1 ? 's' : ''}.{' '}
                     <Link
                         to="/requests"
                         style={{ color: 'inherit', fontWeight: '600', textDecoration: 'underline' }}
@@ -220,6 +220,9 @@ const MyBorrowedBooks = () => {
                                                     >
                                                         <FiClock style={{ marginRight: '4px' }} />
                                                         Since: {formatDate(activeRequest.responded_at)}
+                                                        {activeRequest.due_at && (
+                                                            <> · Due: {formatDate(activeRequest.due_at)}</>
+                                                        )}
                                                     </p>
                                                 )}
                                             </div>
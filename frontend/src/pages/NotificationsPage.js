@@ -10,7 +10,9 @@ import {
     FiX,
     FiRotateCcw,
     FiInfo,
+    FiClock,
     FiXCircle,
+    FiAlertCircle,
 } from 'react-icons/fi';
 
 const NotificationsPage = () => {
@@ -135,6 +137,11 @@ const NotificationsPage = () => {
                 return <FiBookOpen />;
             case 'request_cancelled':
                 return <FiX />;
+            case 'request_waitlisted':
+            case 'loan_due':
+                return <FiClock />;
+            case 'loan_overdue':
+                return <FiAlertCircle />;
             default:
                 return <FiInfo />;
         }
@@ -192,7 +192,7 @@ const RequestsPage = () => {
                 >
                     Filter:
                 </span>
-                {['', 'pending', 'approved', 'rejected', 'returned', 'cancelled'].map(
+                {['', 'pending', 'waitlisted', 'approved', 'rejected', 'returned', 'cancelled'].map(
                     (s) => (
                         <button
                             key={s}
@@ -53,6 +53,11 @@ export const booksAPI = {
     getMyBorrowed: () => api.get('/books/my-borrowed'),
     markReturned: (id) => api.put(`/books/${id}/return`),
     getGenres: () => api.get('/books/genres'),
+    getSimilar: (id, params) => api.get(`/books/${id}/similar`, { params }),
+    getRecommended: (params) => api.get('/books/recommended', { params }),
+    getWaitlist: (id) => api.get(`/books/${id}/waitlist`),
+    suggest: (prefix, params) =>
+        api.get('/books/suggest', { params: { prefix, ...params } }),
 };
 
 // ──────────────── Requests ────────────────
@@ -85,9 +90,27 @@ export const statsAPI = {
     healthCheck: () => api.get('/health'),
 };
 
+// ──────────────── Dashboard ────────────────
+export const dashboardAPI = {
+    getSummary: (params) => api.get('/dashboard/summary', { params }),
+};
+
 // ──────────────── Google Books ────────────────
 export const googleBooksAPI = {
     search: (query) => api.get('/google-books/search', { params: { q: query } }),
 };
 
+// ──────────────── Batch ────────────────
+export const batchAPI = {
+    // requests: [{ id, path, params }] - GET-only, answered in one round trip
+    run: (requests, options = {}) => api.post('/batch', { requests, ...options }),
+};
+
+// ──────────────── Covers ────────────────
+export const coversAPI = {
+    // Plain URL for <img src>; served from the backend's cover cache
+    url: (bookId, size) =>
+        `${API_BASE_URL}/covers/${bookId}${size ? `?size=${size}` : ''}`,
+};
+
 export default api;
\ No newline at end of file